@@ -1,6 +1,5 @@
 from datetime import datetime, timedelta
 from app.logger.logger import logger, DEBUG
-from selenium.webdriver.common.window import WindowTypes
 from app.configuration.configuration import Config
 import time
 
@@ -133,6 +132,8 @@ class AutoFollow:
             # follow people
             followed_profiles = self.bot.browser.auto_follow(keywords, follow_at_once, total_follow_count, self.follows_done, lambda: self.is_running)
             self.follows_done += followed_profiles
+            if followed_profiles:
+                self.bot.browser.mark_following_changed()
             self.logger.info(f"Followed {followed_profiles} users. Total followed in this time span: {self.follows_done}/{total_follow_count}")
             return followed_profiles
 
@@ -0,0 +1,88 @@
+'''
+This launches the Chrome of the main session on its own, with the remote debugging port open, so the app can attach to it
+(see `Config.CHROME_ATTACH`) instead of booting a new Chrome on every start. The browser keeps running (and stays logged
+in to X) between runs of the app. Run it with:
+python -m app.bot.chrome_launcher
+It launches Chrome if it isn't running on the debugging port yet and relaunches it whenever it goes away, until stopped.
+'''
+
+import json
+import subprocess
+import sys
+import time
+from urllib.request import urlopen
+from app.configuration.configuration import Config
+from app.logger.logger import logger
+
+_logger = logger(__name__)
+
+def get_chrome_arguments():
+    '''This returns the command line of the main session's Chrome: the same profile, user data directory and debugging port that `XController` uses when it launches Chrome itself'''
+    arguments = [
+        Config.CHROME_BINARY_PATH,
+        '--profile-directory=Profile 11', # This profile is for the fake account
+        f"--user-data-dir={Config.CHROME_PROFILES_PATH}/AutoPoster",
+        f"--remote-debugging-port={Config.CHROME_DEBUGGER_ADDRESS.rsplit(':', 1)[1]}",
+        '--no-sandbox',
+        '--disable-dev-shm-usage',
+        '--no-first-run',
+        '--no-default-browser-check',
+    ]
+    if Config.LEAN_BROWSER:
+        arguments += ['--headless=new', f"--window-size={Config.VIEWPORT_WIDTH},{Config.VIEWPORT_HEIGHT}", '--blink-settings=imagesEnabled=false', '--mute-audio']
+    else:
+        arguments.append('--start-maximized')
+    return arguments + ['https://x.com/home']
+
+def is_chrome_running(timeout: float = 1):
+    '''This checks if a Chrome answers on the debugging port (`Config.CHROME_DEBUGGER_ADDRESS`)'''
+    try:
+        with urlopen(f"http://{Config.CHROME_DEBUGGER_ADDRESS}/json/version", timeout=timeout) as response:
+            return 'Browser' in json.loads(response.read())
+    except Exception:
+        return False
+
+def launch_chrome(timeout: float = 30):
+    '''This launches Chrome in its own process (it outlives the app) and waits until the debugging port answers. Returns True if Chrome is running'''
+    if not Config.CHROME_BINARY_PATH:
+        _logger.error("CHROME_BINARY_PATH is not set, so Chrome can't be launched")
+        return False
+    try:
+        if sys.platform == 'win32':
+            subprocess.Popen(get_chrome_arguments(), creationflags=subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            subprocess.Popen(get_chrome_arguments(), start_new_session=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except Exception as e:
+        _logger.exception(f"Failed to launch Chrome. Error: {str(e)}")
+        return False
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if is_chrome_running():
+            _logger.info(f"Launched Chrome on {Config.CHROME_DEBUGGER_ADDRESS}")
+            return True
+        time.sleep(0.5)
+    _logger.error(f"Chrome didn't open the debugging port {Config.CHROME_DEBUGGER_ADDRESS} within {timeout} seconds")
+    return False
+
+def ensure_chrome_running():
+    '''This launches Chrome unless it is already running on the debugging port. Returns True if Chrome is running'''
+    if is_chrome_running():
+        _logger.info(f"Found a running Chrome on {Config.CHROME_DEBUGGER_ADDRESS}")
+        return True
+    return launch_chrome()
+
+def keep_alive(interval: float = Config.CHROME_KEEP_ALIVE_INTERVAL):
+    '''This keeps Chrome running: it is checked every `interval` seconds and relaunched if it went away (eg: it crashed or was closed by hand)'''
+    ensure_chrome_running()
+    while True:
+        time.sleep(interval)
+        if not is_chrome_running():
+            _logger.warning("Chrome went away, relaunching it")
+            launch_chrome()
+
+if __name__ == "__main__":
+    try:
+        keep_alive()
+    except KeyboardInterrupt:
+        _logger.info("Stopped keeping Chrome alive. Chrome keeps running")
@@ -0,0 +1,207 @@
+'''
+This reads the JSON that X's web app loads from its GraphQL API (eg: the Following timeline and the tweets of a profile)
+out of Chrome's performance log, so that users and tweets can be read from the responses instead of from the DOM.
+The parsers are plain functions of the decoded JSON, so they can be run against responses that were recorded with
+`Config.NETWORK_CAPTURE_RECORD_DIR` (see `load_recorded_responses`).
+'''
+
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from app.configuration.configuration import Config
+from app.logger.logger import logger
+
+GRAPHQL_PATH = '/i/api/graphql/'
+
+def _walk(node, pinned=False):
+    '''This yields every dict in `node` together with a flag which is True if the dict is inside a pinned timeline entry'''
+    if isinstance(node, dict):
+        pinned = pinned or node.get('type') == 'TimelinePinEntry'
+        yield node, pinned
+        for value in node.values():
+            yield from _walk(value, pinned)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk(value, pinned)
+
+def _user_record(user: dict):
+    '''This converts a GraphQL User object to the profile format that is stored in MongoDB. Returns None if the object has no screen name.'''
+    legacy = user.get('legacy', {})
+    core = user.get('core', {})
+    username = core.get('screen_name') or legacy.get('screen_name')
+    if not username:
+        return None
+
+    location = user.get('location', {}).get('location') or legacy.get('location', '')
+    urls = legacy.get('entities', {}).get('url', {}).get('urls', [])
+    return {
+        'user_id': user.get('rest_id'),
+        'username': username,
+        'name': core.get('name') or legacy.get('name', ''),
+        'link': f'https://x.com/{username}',
+        'following_count': f"{legacy.get('friends_count', 0):,}",
+        'followers_count': f"{legacy.get('followers_count', 0):,}",
+        'bio': legacy.get('description', ''),
+        'location': location,
+        'website': urls[0].get('expanded_url', '') if urls else '',
+    }
+
+def parse_users(payload: dict) -> list:
+    '''This returns the profile of every user in a GraphQL response'''
+    users = {}
+    for node, _ in _walk(payload):
+        if node.get('__typename') == 'User':
+            record = _user_record(node)
+            if record:
+                users[record['link']] = record
+    return list(users.values())
+
+def parse_tweets(payload: dict) -> list:
+    '''
+    This returns every timeline tweet in a GraphQL response. Each tweet is a dict with tweet_id, tweet_link, username, text, created_at, is_pinned, is_promoted and is_retweet.
+    Quoted tweets and the original tweets of retweets are not timeline entries, so they are not returned.
+    '''
+    tweets = {}
+    for node, pinned in _walk(payload):
+        item_content = node.get('itemContent')
+        if not isinstance(item_content, dict) or 'tweet_results' not in item_content:
+            continue
+
+        tweet = item_content['tweet_results'].get('result', {})
+        if tweet.get('__typename') == 'TweetWithVisibilityResults':
+            tweet = tweet.get('tweet', {})
+        legacy = tweet.get('legacy', {})
+        user = _user_record(tweet.get('core', {}).get('user_results', {}).get('result', {}))
+        tweet_id = tweet.get('rest_id')
+        if not (tweet_id and user):
+            continue
+
+        created_at = legacy.get('created_at')
+        tweets[tweet_id] = {
+            'tweet_id': tweet_id,
+            'tweet_link': f"https://x.com/{user['username']}/status/{tweet_id}",
+            'username': user['username'],
+            'text': legacy.get('full_text', ''),
+            'created_at': datetime.strptime(created_at, '%a %b %d %H:%M:%S %z %Y') if created_at else None,
+            'is_pinned': pinned,
+            'is_promoted': 'promotedMetadata' in item_content,
+            'is_retweet': 'retweeted_status_result' in legacy,
+        }
+    return list(tweets.values())
+
+def load_recorded_responses(directory: str) -> list:
+    '''This loads the responses that were recorded to `directory`. Each item is a dict with 'url' and 'payload'.'''
+    responses = []
+    for file_name in sorted(os.listdir(directory)):
+        if file_name.endswith('.json'):
+            with open(os.path.join(directory, file_name), encoding='utf-8') as file:
+                responses.append(json.load(file))
+    return responses
+
+class NetworkCapture:
+    def __init__(self, driver, record_dir: str = None, max_users: int = Config.NETWORK_CAPTURE_MAX_USERS, max_tweets: int = Config.NETWORK_CAPTURE_MAX_TWEETS):
+        '''
+        `driver` must be started with the 'goog:loggingPrefs' capability set to {'performance': 'ALL'}. If `record_dir` is set, every captured response is also saved there as a JSON file.
+        Only the `max_users` users and `max_tweets` tweets that were captured last are kept, so a long run doesn't keep every response in memory.
+        '''
+        self.driver = driver
+        self.record_dir = record_dir
+        self.max_users = max_users
+        self.max_tweets = max_tweets
+        self.pending_requests = {} # request id -> url of the GraphQL responses that haven't finished loading yet
+        self.users = OrderedDict() # link -> profile, least recently captured first
+        self.tweets = OrderedDict() # tweet id -> tweet, least recently captured first
+        self.tweets_by_author = {} # lowercase username -> {tweet id: tweet} of the kept tweets
+        self.new_tweets = deque(maxlen=max_tweets) # tweets captured since the last `take_new_tweets`
+        self.recorded_count = 0
+        self.logger = logger(__name__)
+
+        if record_dir:
+            os.makedirs(record_dir, exist_ok=True)
+
+    def drain(self):
+        '''This reads the performance log, parses the GraphQL responses that finished loading and adds their users and tweets to `self.users` and `self.tweets`. Returns the number of parsed responses.'''
+        parsed = 0
+        for entry in self.driver.get_log('performance'):
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+
+            method = message.get('method')
+            params = message.get('params', {})
+            if method == 'Network.responseReceived':
+                url = params.get('response', {}).get('url', '')
+                if GRAPHQL_PATH in url:
+                    self.pending_requests[params['requestId']] = url
+            elif method == 'Network.loadingFinished' and params.get('requestId') in self.pending_requests:
+                url = self.pending_requests.pop(params['requestId'])
+                payload = self._get_response_body(params['requestId'], url)
+                if payload is not None:
+                    self.add_response(url, payload)
+                    parsed += 1
+            elif method == 'Network.loadingFailed':
+                self.pending_requests.pop(params.get('requestId'), None)
+
+        if parsed:
+            self.logger.info(f'Parsed {parsed} GraphQL responses ({len(self.users)} users and {len(self.tweets)} tweets captured)')
+        return parsed
+
+    def _get_response_body(self, request_id: str, url: str):
+        '''This fetches and decodes the body of a response. Returns None if the body is no longer available or is not JSON.'''
+        try:
+            body = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            return json.loads(body['body'])
+        except Exception as e:
+            self.logger.warning(f'Could not read the response of {url}: {e}')
+            return None
+
+    def add_response(self, url: str, payload: dict):
+        '''This parses a single response (captured or recorded) and adds its users and tweets'''
+        for user in parse_users(payload):
+            self.users[user['link']] = user
+            self.users.move_to_end(user['link'])
+        while len(self.users) > self.max_users:
+            self.users.popitem(last=False)
+
+        captured_at = time.monotonic()
+        for tweet in parse_tweets(payload):
+            tweet['captured_at'] = captured_at
+            self._add_tweet(tweet)
+
+        if self.record_dir:
+            self.recorded_count += 1
+            path = os.path.join(self.record_dir, f'{datetime.now():%Y%m%d%H%M%S}_{self.recorded_count:05d}.json')
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump({'url': url, 'payload': payload}, file)
+
+    def _add_tweet(self, tweet: dict):
+        '''This keeps a captured tweet (replacing an older capture of it) and drops the least recently captured tweets beyond `max_tweets`'''
+        tweet_id = tweet['tweet_id']
+        self.tweets[tweet_id] = tweet
+        self.tweets.move_to_end(tweet_id)
+        self.tweets_by_author.setdefault(tweet['username'].lower(), {})[tweet_id] = tweet
+        self.new_tweets.append(tweet)
+        while len(self.tweets) > self.max_tweets:
+            _, dropped = self.tweets.popitem(last=False)
+            author = dropped['username'].lower()
+            self.tweets_by_author[author].pop(dropped['tweet_id'], None)
+            if not self.tweets_by_author[author]:
+                del self.tweets_by_author[author]
+
+    def take_new_tweets(self) -> list:
+        '''This returns the tweets that were captured since the last call, so they can be processed once instead of scanning every kept tweet'''
+        tweets = list(self.new_tweets)
+        self.new_tweets.clear()
+        return tweets
+
+    def latest_tweet(self, username: str):
+        '''This returns the newest captured tweet of `username` that isn't pinned, promoted or a retweet, or None if there is no such tweet'''
+        tweets = [
+            tweet for tweet in self.tweets_by_author.get(username.lower(), {}).values()
+            if not (tweet['is_pinned'] or tweet['is_promoted'] or tweet['is_retweet'])
+        ]
+        # Tweet ids grow over time, so the biggest id is the newest tweet
+        return max(tweets, key=lambda tweet: int(tweet['tweet_id']), default=None)
@@ -0,0 +1,107 @@
+'''
+This drives the bot from the notifications page. With post notifications turned on for the bot targets, a new tweet of a
+target shows up in the notifications within seconds, so polling that single page finds new tweets much sooner than
+visiting every profile. Every new tweet of a target is queued and handled before anything else, and the profiles of the
+scheduler are visited in between as low priority work. The time from posting (in the tweet id) to detection and to
+handling is recorded and reported.
+'''
+
+import statistics
+import threading
+import time
+from collections import deque
+from app.configuration.configuration import Config
+from app.bot.scheduler import ProfileScheduler
+from app.bot.tweet_index import TweetIndex, get_tweet_id, get_tweet_time
+from app.logger.logger import logger
+
+class NotificationTrigger:
+    def __init__(self, scheduler: ProfileScheduler, tweet_index: TweetIndex):
+        self.scheduler = scheduler
+        self.tweet_index = tweet_index
+        self.queue = deque() # tweets that are waiting to be handled, as dicts with link, author, profile and detected_at
+        self.queued_links = set()
+        self.polled_at = 0
+        self.polling = False
+        self.detect_latencies = [] # seconds from posting to detection of the handled tweets
+        self.handle_latencies = [] # seconds from posting to handling of the handled tweets
+        self.lock = threading.Lock()
+        self.logger = logger(__name__)
+
+    def add_tweets(self, tweets: list, targets: dict):
+        '''This queues the tweets (from the notifications page) of bot targets that weren't handled yet. `targets` has the profiles by lowercase username. Returns the number of queued tweets'''
+        now = time.time()
+        queued = 0
+        with self.lock:
+            for tweet in tweets:
+                if tweet['ad'] or tweet['retweet'] or tweet['link'] in self.queued_links:
+                    continue
+                profile = targets.get(tweet['author'].lower())
+                tweet_id = get_tweet_id(tweet['link'])
+                # Links without a numeric tweet id (eg: malformed or promoted ones) can't be handled
+                if not profile or not tweet_id or self.tweet_index.is_handled(tweet_id, profile['reply']):
+                    continue
+                self.queue.append({'link': tweet['link'], 'author': tweet['author'], 'profile': profile, 'detected_at': now})
+                self.queued_links.add(tweet['link'])
+                queued += 1
+        if queued:
+            self.logger.info(f"Queued {queued} new tweets of bot targets from the notifications")
+        return queued
+
+    def finish_poll(self):
+        '''This records that a poll of the notifications page is over, so the next one is due after `Config.NOTIFICATIONS_POLL_INTERVAL` seconds'''
+        with self.lock:
+            self.polling = False
+            self.polled_at = time.time()
+
+    def record_handled(self, tweet: dict, handled: bool):
+        '''This removes a tweet from the queue after it was processed and records its latency if it was handled now (it could have been handled meanwhile, eg: by a profile visit)'''
+        now = time.time()
+        posted_at = get_tweet_time(get_tweet_id(tweet['link']))
+        with self.lock:
+            self.queued_links.discard(tweet['link'])
+            if not handled:
+                return
+            self.detect_latencies.append(tweet['detected_at'] - posted_at)
+            self.handle_latencies.append(now - posted_at)
+        self.logger.info(f"Handled the tweet by {tweet['author']} {now - posted_at:.0f} seconds after it was posted (detected after {tweet['detected_at'] - posted_at:.0f} seconds)")
+
+    def get_report(self):
+        '''This returns the median and maximum seconds from posting to detection and to handling of the handled tweets'''
+        with self.lock:
+            detect, handle = list(self.detect_latencies), list(self.handle_latencies)
+            queued = len(self.queue)
+        if not handle:
+            return {'handled': 0, 'queued': queued}
+        return {
+            'handled': len(handle),
+            'queued': queued,
+            'median_post_to_detect': round(statistics.median(detect)),
+            'median_post_to_reply': round(statistics.median(handle)),
+            'max_post_to_reply': round(max(handle)),
+        }
+
+    def iterate(self, should_continue=lambda: True):
+        '''
+        This yields the work of the bot as tuples (kind, item), forever (until `should_continue()` returns False), in order of priority:
+        ('poll', None) when the notifications page is due to be polled (the poll must call `finish_poll`), ('tweet', tweet) for a queued tweet (which must be passed to `record_handled` after it is processed), and ('profile', profile) for the next profile of the scheduler.
+        '''
+        while should_continue():
+            with self.lock:
+                if not self.polling and time.time() - self.polled_at >= Config.NOTIFICATIONS_POLL_INTERVAL:
+                    self.polling = True
+                    item = ('poll', None)
+                elif self.queue:
+                    item = ('tweet', self.queue.popleft())
+                else:
+                    item = None
+            if item:
+                yield item
+                continue
+
+            profile, wait = self.scheduler.pop_due()
+            if profile:
+                yield ('profile', profile)
+            else:
+                # Wake up soon for the next poll
+                time.sleep(min(wait, 1))
@@ -0,0 +1,153 @@
+'''
+This paces the actions that the bot performs on X. Every kind of action (navigate, like, reply, follow, unfollow) has a
+token bucket which allows short bursts but limits the average rate (see `Config.PACING_RATES`). When X pushes back (the
+Retry button or the "unable to follow" snackbar appears), a circuit breaker which is shared by all the sessions opens and
+every action waits for an exponentially growing, jittered delay.
+The buckets are shared by all the sessions too, since X limits the account and every session is logged in to the same
+account: the rates are caps for the whole app, so a bigger session pool hides page load time but can't go above them.
+'''
+
+import random
+import threading
+import time
+from collections import deque
+from app.configuration.configuration import Config
+from app.logger.logger import logger
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, capacity: int):
+        self.rate = rate_per_minute / 60 # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self):
+        '''This adds the tokens that were earned since the last refill'''
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, tokens=1):
+        '''This returns the number of seconds until `tokens` tokens are available'''
+        self.refill()
+        missing = min(tokens, self.capacity) - self.tokens
+        return max(0, missing / self.rate)
+
+class CircuitBreaker:
+    def __init__(self, base_delay: float, max_delay: float):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.pushbacks = 0 # consecutive pushbacks without a successful action in between
+        self.open_until = 0
+
+    def trip(self):
+        '''This opens the breaker for an exponentially growing delay with jitter and returns the delay in seconds'''
+        self.pushbacks += 1
+        delay = min(self.max_delay, self.base_delay * 2 ** (self.pushbacks - 1))
+        delay = random.uniform(delay / 2, delay)
+        self.open_until = max(self.open_until, time.monotonic() + delay)
+        return delay
+
+    def remaining(self):
+        '''This returns the number of seconds until the breaker closes (0 if it is closed)'''
+        return max(0, self.open_until - time.monotonic())
+
+class Pacer:
+    def __init__(self, rates: dict = Config.PACING_RATES):
+        self.buckets = {action: TokenBucket(rate, capacity) for action, (rate, capacity) in rates.items()}
+        self.breaker = CircuitBreaker(Config.BACKOFF_BASE_DELAY, Config.BACKOFF_MAX_DELAY)
+        self.history = {action: deque() for action in rates} # times of the recent actions, for `get_rates`
+        self.lock = threading.Lock()
+        self.logger = logger(__name__)
+
+    def reserve(self, action: str, tokens=1):
+        '''
+        This waits until the circuit breaker is closed and at least one token of `action` is available, then takes up to `tokens` tokens.
+        Returns the number of tokens that were taken. Actions without a bucket only wait for the circuit breaker.
+        '''
+        while True:
+            with self.lock:
+                bucket = self.buckets.get(action)
+                wait = max(self.breaker.remaining(), bucket.wait_time() if bucket else 0)
+                if wait <= 0:
+                    if not bucket:
+                        return tokens
+                    granted = max(1, min(tokens, int(bucket.tokens)))
+                    bucket.tokens -= granted
+                    self._record(action, granted)
+                    return granted
+            time.sleep(wait)
+
+    def acquire(self, action: str):
+        '''This waits until a single `action` is allowed'''
+        self.reserve(action, 1)
+
+    def refund(self, action: str, tokens: int):
+        '''This gives back reserved tokens that weren't used'''
+        if tokens <= 0 or action not in self.buckets:
+            return
+        with self.lock:
+            bucket = self.buckets[action]
+            bucket.tokens = min(bucket.capacity, bucket.tokens + tokens)
+            for _ in range(min(tokens, len(self.history[action]))):
+                self.history[action].pop()
+
+    def _record(self, action: str, count: int):
+        '''This records `count` actions at the current time. Must be called while holding `self.lock`.'''
+        now = time.monotonic()
+        history = self.history[action]
+        history.extend([now] * count)
+        while history and now - history[0] > 60:
+            history.popleft()
+
+    def has_spare(self, action: str, tokens: float):
+        '''This checks if at least `tokens` tokens of `action` are available and the circuit breaker is closed. Low priority work only runs then, so it doesn't slow down the bot'''
+        with self.lock:
+            if self.breaker.remaining() > 0:
+                return False
+            bucket = self.buckets.get(action)
+            if not bucket:
+                return True
+            bucket.refill()
+            return bucket.tokens >= tokens
+
+    def report_pushback(self, reason: str):
+        '''This opens the circuit breaker because X pushed back (eg: the Retry button appeared). Returns the backoff delay in seconds.'''
+        with self.lock:
+            delay = self.breaker.trip()
+            pushbacks = self.breaker.pushbacks
+        self.logger.warning(f"X pushed back ({reason}). Backing off for {delay:.0f} seconds (pushback {pushbacks} in a row)")
+        return delay
+
+    def report_success(self):
+        '''This resets the backoff after an action went through without pushback'''
+        with self.lock:
+            self.breaker.pushbacks = 0
+
+    def wait_until_closed(self):
+        '''This blocks until the circuit breaker is closed'''
+        while True:
+            with self.lock:
+                remaining = self.breaker.remaining()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def get_rates(self):
+        '''This returns the current pacing state: the number of actions of every kind in the last minute, the allowed rate, the available tokens and the circuit breaker state'''
+        with self.lock:
+            now = time.monotonic()
+            rates = {}
+            for action, bucket in self.buckets.items():
+                bucket.refill()
+                rates[action] = {
+                    'last_minute': sum(1 for t in self.history[action] if now - t <= 60),
+                    'limit_per_minute': bucket.rate * 60,
+                    'tokens': round(bucket.tokens, 2),
+                }
+            rates['circuit_open_for'] = round(self.breaker.remaining(), 1)
+            rates['consecutive_pushbacks'] = self.breaker.pushbacks
+            return rates
+
+# All the sessions of the app share this pacer
+pacer = Pacer()
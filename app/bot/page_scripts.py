@@ -0,0 +1,269 @@
+'''
+These are the JavaScript snippets that are injected into X pages with `execute_script`/`execute_async_script`.
+Doing the work inside the page replaces many WebDriver round trips (one per element and attribute) with a single call.
+'''
+
+# Collects the cells that match a CSS selector while scrolling the page.
+# A MutationObserver (installed once per page and selector) records every cell that is rendered, even the ones that X
+# removes from the DOM again when they are scrolled out of view. Each call scrolls the page, then returns the cells
+# collected since the previous call and whether the end of the list was reached (the page is scrolled to the bottom and
+# no new cells arrived for `idleMs`).
+# Arguments: cellSelector, stepPx, idleMs, maxMs, maxScrolls (0 = no limit), withElements
+# Returns: {items: [{key, link, username, element?}], ended: bool}
+COLLECT_CELLS = '''
+const [cellSelector, stepPx, idleMs, maxMs, maxScrolls, withElements] = arguments;
+const done = arguments[arguments.length - 1];
+const stateKey = '__autoPosterCollector:' + cellSelector;
+
+function extract(cell) {
+    const anchor = cell.querySelector('a[role="link"]');
+    const handle = Array.from(cell.querySelectorAll('span'))
+        .map(span => span.textContent.trim())
+        .find(text => text.startsWith('@'));
+    const link = anchor ? anchor.href : null;
+    const username = handle ? handle.slice(1) : null;
+    if (!link && !username) {
+        return null; // the cell hasn't been filled in yet
+    }
+    return {key: link || username, link: link, username: username};
+}
+
+let state = window[stateKey];
+if (!state) {
+    state = window[stateKey] = {seen: new Set(), pending: [], lastNewAt: Date.now()};
+    state.add = (cell) => {
+        const record = extract(cell);
+        if (!record || state.seen.has(record.key)) {
+            return;
+        }
+        state.seen.add(record.key);
+        record.cell = cell;
+        state.pending.push(record);
+        state.lastNewAt = Date.now();
+    };
+    state.scan = (node) => {
+        if (node.nodeType !== Node.ELEMENT_NODE) {
+            return;
+        }
+        if (node.matches(cellSelector)) {
+            state.add(node);
+        }
+        node.querySelectorAll(cellSelector).forEach(state.add);
+    };
+    state.observer = new MutationObserver(mutations => {
+        for (const mutation of mutations) {
+            mutation.addedNodes.forEach(state.scan);
+        }
+    });
+    state.observer.observe(document.body, {childList: true, subtree: true});
+}
+
+const started = Date.now();
+let scrolls = 0;
+const atBottom = () => window.innerHeight + window.scrollY >= document.body.scrollHeight - 2;
+
+function finish(ended) {
+    const items = state.pending.splice(0).map(record => {
+        const item = {key: record.key, link: record.link, username: record.username};
+        if (withElements && record.cell.isConnected) {
+            item.element = record.cell;
+        }
+        return item;
+    });
+    done({items: items, ended: ended});
+}
+
+function tick() {
+    // Cells that were empty when they were inserted are picked up here once X fills them in
+    document.querySelectorAll(cellSelector).forEach(state.add);
+    const now = Date.now();
+    if (atBottom() && now - state.lastNewAt >= idleMs) {
+        finish(true);
+        return;
+    }
+    if (now - started >= maxMs || (maxScrolls && scrolls >= maxScrolls)) {
+        finish(false);
+        return;
+    }
+    window.scrollBy(0, stepPx);
+    scrolls += 1;
+    setTimeout(tick, 100);
+}
+
+tick();
+'''
+
+# Goes through the user cells of the connect page that haven't been checked yet, follows the ones whose bio contains one
+# of the keywords (all of them if there are no keywords) and reports whether the "You are unable to follow more people"
+# snackbar is displayed. The checked cells are remembered in the page, so every call only looks at newly loaded cells.
+# Arguments: keywords (lowercase), maxFollows, spacingMs (pause after each click), bioSelector
+# Returns: {followed: [links], checked: int, snackbar: bool}
+FOLLOW_VISIBLE_CELLS = '''
+const [keywords, maxFollows, spacingMs, bioSelector] = arguments;
+const done = arguments[arguments.length - 1];
+const processed = window.__autoPosterCheckedCells = window.__autoPosterCheckedCells || new Set();
+const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+const snackbarDisplayed = () => Array.from(document.querySelectorAll('div[data-testid="toast"]'))
+    .some(toast => toast.getClientRects().length > 0 && toast.textContent.includes('You are unable to follow more people at this time'));
+
+(async () => {
+    const result = {followed: [], checked: 0, snackbar: false};
+    for (const cell of document.querySelectorAll('button[data-testid="UserCell"]')) {
+        if (result.followed.length >= maxFollows) {
+            break;
+        }
+        if (snackbarDisplayed()) {
+            result.snackbar = true;
+            break;
+        }
+
+        const anchor = cell.querySelector('a[role="link"]');
+        if (!anchor || processed.has(anchor.href)) {
+            continue;
+        }
+        processed.add(anchor.href);
+        result.checked += 1;
+
+        const bioElement = cell.querySelector(bioSelector);
+        const bio = bioElement ? bioElement.textContent.toLowerCase() : '';
+        if (keywords.length && !keywords.some(keyword => bio.includes(' ' + keyword + ' '))) {
+            continue;
+        }
+
+        const followButton = cell.querySelector('button[aria-label*="Follow "]');
+        if (!followButton) {
+            continue;
+        }
+        followButton.scrollIntoView({block: 'center'});
+        followButton.click();
+        result.followed.push(anchor.href);
+        await sleep(spacingMs);
+    }
+    result.snackbar = result.snackbar || snackbarDisplayed();
+    done(result);
+})().catch(error => done({followed: [], checked: 0, snackbar: false, error: String(error)}));
+'''
+
+# Lists the tweet articles that are rendered on a timeline, in page order, with everything that is needed to decide
+# whether to interact with them. Retweets are reported with the author of the original tweet, so they are flagged.
+# Arguments: none
+# Returns: [{element, link, author, ad, pinned, retweet}]
+LIST_VISIBLE_TWEETS = '''
+return Array.from(document.querySelectorAll('article[data-testid="tweet"]')).map(article => {
+    const time = article.querySelector('a[href*="/status/"] time');
+    const handle = Array.from(article.querySelectorAll('div[data-testid="User-Name"] span'))
+        .map(span => span.textContent.trim())
+        .find(text => text.startsWith('@'));
+    const socialContext = article.querySelector('[data-testid="socialContext"]');
+    const contextText = socialContext ? socialContext.textContent : '';
+    return {
+        element: article,
+        link: time ? time.closest('a').href : null,
+        author: handle ? handle.slice(1) : null,
+        ad: Array.from(article.querySelectorAll('span')).some(span => span.textContent === 'Ad'),
+        pinned: contextText.includes('Pinned'),
+        retweet: /reposted/i.test(contextText),
+    };
+}).filter(tweet => tweet.link && tweet.author);
+'''
+
+# Classifies the current page in a single call, so the sign in flow doesn't have to wait for the timeouts of the elements
+# that never appear. The states are checked in order of precedence and the first match wins.
+# Returns: {state, username?, text?} where state is one of 'locked', 'verification', 'email_challenge', 'login_password',
+# 'login_username', 'retry', 'rate_limited', 'logged_in', 'logged_out' (the landing page with the login button) or 'unknown'
+# (eg: the page is still loading)
+CLASSIFY_PAGE = '''
+function classifyPage() {
+    const exists = (xpath, context = document) => document.evaluate(xpath, context, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue !== null;
+    const visible = element => element !== null && element.getClientRects().length > 0;
+    const path = location.pathname;
+
+    // The texts of the challenges are only searched where the challenges are shown (the login flow or its dialog, and the
+    // account access page), so a tweet on the timeline that contains the same words isn't mistaken for a challenge
+    const inLoginFlow = path === '/login' || path.startsWith('/i/flow/') || path.startsWith('/account/');
+    const challenge = document.querySelector('div[role="dialog"]') || (inLoginFlow ? document.body : null);
+
+    if (path.startsWith('/account/access') && exists('//div[contains(text(), "Your account has been locked.")]')) {
+        return {state: 'locked'};
+    }
+    if (challenge && exists('.//span[contains(text(), "verification")]', challenge)) {
+        return {state: 'verification'};
+    }
+    if (challenge && exists('.//span[contains(text(), "Enter your phone number or email address")]', challenge) && challenge.querySelector('input[data-testid="ocfEnterTextTextInput"]')) {
+        return {state: 'email_challenge'};
+    }
+    if (visible(document.querySelector('input[name="password"]'))) {
+        return {state: 'login_password'};
+    }
+    if (visible(document.querySelector('input[autocomplete="username"]'))) {
+        return {state: 'login_username'};
+    }
+    if (exists('//div[@data-testid="primaryColumn"]//span[text()="Retry"]')) {
+        return {state: 'retry'};
+    }
+    const toast = Array.from(document.querySelectorAll('div[data-testid="toast"]')).find(visible);
+    if (toast && /limit|unable/i.test(toast.textContent)) {
+        return {state: 'rate_limited', text: toast.textContent};
+    }
+    const handle = Array.from(document.querySelectorAll('button[aria-label="Account menu"] span'))
+        .map(span => span.textContent.trim())
+        .find(text => text.startsWith('@'));
+    if (handle) {
+        return {state: 'logged_in', username: handle.slice(1)};
+    }
+    if (document.querySelector('a[data-testid="loginButton"]')) {
+        return {state: 'logged_out'};
+    }
+    return {state: 'unknown'};
+}
+'''
+
+# Waits until the page is in one of the expected states (any known state if the list is empty) and returns it (see
+# CLASSIFY_PAGE). The page is classified again shortly after every DOM change, so the first state that appears is
+# returned right away. After timeoutMs the current state is returned, whatever it is.
+# Arguments: expectedStates, timeoutMs
+# Returns: {state, username?, text?}
+WAIT_FOR_PAGE_STATE = CLASSIFY_PAGE + '''
+const [expectedStates, timeoutMs] = arguments;
+const done = arguments[arguments.length - 1];
+const matches = page => expectedStates.length ? expectedStates.includes(page.state) : page.state !== 'unknown';
+
+let finished = false;
+let scheduled = false;
+let observer = null;
+let interval = null;
+let timer = null;
+const finish = page => {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    if (observer) {
+        observer.disconnect();
+    }
+    clearInterval(interval);
+    clearTimeout(timer);
+    done(page);
+};
+const check = () => {
+    scheduled = false;
+    const page = classifyPage();
+    if (matches(page)) {
+        finish(page);
+    }
+};
+// Bursts of DOM changes are classified once
+const scheduleCheck = () => {
+    if (!scheduled) {
+        scheduled = true;
+        setTimeout(check, 50);
+    }
+};
+
+// The interval also catches changes that the observer can't see (eg: the document being replaced by a navigation)
+interval = setInterval(check, 250);
+timer = setTimeout(() => finish(classifyPage()), timeoutMs);
+observer = new MutationObserver(scheduleCheck);
+observer.observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+check();
+'''
@@ -0,0 +1,63 @@
+'''
+This overlaps the page loads of the bot with its interactions in a single session. The session has two tabs: while the
+bot interacts with a profile in the active tab, the next profile loads in the background tab, and when the interaction
+is done the tabs swap, so the next profile is usually ready when the bot gets to it.
+'''
+
+from selenium.webdriver.support.ui import WebDriverWait
+from app.bot.pacing import pacer
+from app.logger.logger import logger
+
+class PrefetchPipeline:
+    def __init__(self, browser):
+        '''`browser` is the XController whose tab manager lends the background tab. The open tab stays the active tab'''
+        self.browser = browser
+        self.driver = browser.driver
+        self.logger = logger(__name__)
+        self.active_tab = self.driver.current_window_handle
+        self.background_tab = browser.tabs.acquire(switch=False)
+        self.prefetched_url = None
+
+    def prefetch(self, url: str):
+        '''This starts loading `url` in the background tab and returns right away (the page keeps loading while the active tab is used)'''
+        try:
+            pacer.acquire('navigate')
+            self.driver.switch_to.window(self.background_tab)
+            # Unlike driver.get, this doesn't wait for the page to load
+            self.driver.execute_script('window.location.href = arguments[0];', url)
+            self.prefetched_url = url
+            self.logger.info(f"Prefetching {url} in the background tab")
+        except Exception as e:
+            self.prefetched_url = None
+            self.logger.warning(f"Failed to prefetch {url}. Error: {str(e)}")
+        finally:
+            self.driver.switch_to.window(self.active_tab)
+
+    def activate(self, url: str, timeout=10):
+        '''
+        This swaps the tabs if `url` was prefetched, so the prefetched page becomes the active tab and the old one becomes the background tab (for the next prefetch), and waits until the page is loaded.
+        Returns True if the prefetched page is active, False if `url` wasn't prefetched (then it has to be opened as usual).
+        '''
+        if self.prefetched_url != url:
+            return False
+        self.prefetched_url = None
+        try:
+            # The prefetched tab becomes a main tab and the old active tab becomes the leased worker tab
+            self.browser.tabs.swap(self.background_tab, self.active_tab)
+            self.active_tab, self.background_tab = self.background_tab, self.active_tab
+            self.driver.switch_to.window(self.active_tab)
+            WebDriverWait(self.driver, timeout).until(lambda driver: driver.execute_script('return document.readyState') == 'complete')
+            self.logger.info(f"Switched to the prefetched page {url}")
+            return True
+        except Exception as e:
+            self.logger.warning(f"The prefetched page {url} didn't load. Error: {str(e)}")
+            return False
+
+    def close(self):
+        '''This gives the background tab back to the tab manager and leaves the active tab open'''
+        try:
+            self.browser.tabs.release(self.background_tab)
+        except Exception as e:
+            self.logger.warning(f"Failed to release the background tab. Error: {str(e)}")
+        finally:
+            self.driver.switch_to.window(self.active_tab)
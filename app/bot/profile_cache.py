@@ -0,0 +1,152 @@
+'''
+This is a cache of the scraped X profiles (the profiles in the following and added lists). Every profile records when
+each of its field groups was scraped in 'scraped_at', and every group has its own time to live
+(`Config.PROFILE_CACHE_TTLS`), so the cheap fields (counts) and the expensive ones (followers_you_follow, more_info) are
+refreshed independently and a profile is only scraped again when one of the groups it needs is stale.
+'''
+
+from datetime import datetime, timedelta
+from app.configuration.configuration import Config
+from app.logger.logger import logger
+
+# The fields of every field group
+FIELD_GROUPS = {
+    'counts': ['following_count', 'followers_count'],
+    'core': ['name', 'bio', 'location', 'website'],
+    'followers_you_follow': ['followers_you_follow'],
+    'more_info': ['more_info'],
+}
+
+# The fast groups which make up the core record of a profile, and the expensive groups which are filled in later (see ProfileRefresher)
+CORE_GROUPS = ['counts', 'core']
+ENRICHMENT_GROUPS = ['followers_you_follow', 'more_info']
+
+def get_completeness(profile: dict) -> str:
+    '''This returns 'complete' if every field group of `profile` was scraped, or 'core' if the expensive groups are still missing'''
+    scraped_at = profile.get('scraped_at', {})
+    return 'complete' if all(group in scraped_at for group in FIELD_GROUPS) else 'core'
+
+def get_staleness(profile: dict, group: str, now: datetime = None) -> float:
+    '''This returns how stale a field group of `profile` is: the age of the group divided by its TTL (above 1 means stale). A group that was never scraped is infinitely stale'''
+    scraped_at = profile.get('scraped_at', {}).get(group)
+    if not scraped_at:
+        return float('inf')
+    now = now or datetime.now()
+    return (now - scraped_at) / timedelta(hours=Config.PROFILE_CACHE_TTLS[group])
+
+def get_stale_groups(profile: dict, groups=FIELD_GROUPS, now: datetime = None) -> list:
+    '''This returns the groups of `groups` that are stale in `profile`'''
+    return [group for group in groups if get_staleness(profile, group, now) >= 1]
+
+class ProfileCache:
+    def __init__(self, browser):
+        '''`browser` is the XController whose `following` and `added_people` lists are cached'''
+        self.browser = browser
+        self.profiles = {} # link: profile of the following and added lists (the added profile if a link is in both)
+        self.logger = logger(__name__)
+
+    def rebuild(self):
+        '''This indexes the following and added lists again. It must be called after the lists are replaced (eg: reloaded from MongoDB)'''
+        self.profiles = {}
+        for profile in self.browser.added_people + self.browser.following:
+            self.add(profile)
+
+    def add(self, profile: dict, replace=False):
+        '''This indexes a profile that was appended to the following or added list. An indexed profile with the same link is kept unless `replace` is True (for the added list, which comes first)'''
+        if profile and profile.get('link'):
+            if replace:
+                self.profiles[profile['link']] = profile
+            else:
+                self.profiles.setdefault(profile['link'], profile)
+
+    def remove(self, link: str):
+        '''This drops a profile that was removed from the following or added list. If the link is still in the other list, that profile is indexed instead'''
+        self.profiles.pop(link, None)
+        for profile in self.browser.added_people + self.browser.following:
+            if profile and profile.get('link') == link:
+                self.profiles[link] = profile
+                return
+
+    def find(self, link: str):
+        '''This returns the cached profile with `link`, or None if it isn't in the following or added lists'''
+        return self.profiles.get(link)
+
+    def get_profile(self, link: str, groups=FIELD_GROUPS, browser=None):
+        '''
+        This returns the profile with `link` with fresh values for `groups`. A cached profile is returned as it is if none of those groups are stale, otherwise only the stale groups are scraped (with `browser`, the cache's browser by default) and saved.
+        Profiles that aren't cached are scraped (only `groups`) and returned without being saved, with empty values and a 'completeness' of 'core' if the expensive groups weren't scraped. Returns None if the profile couldn't be scraped.
+        '''
+        cached = self.find(link)
+        if cached is None:
+            data = (browser or self.browser).scrape_profile_data(link, groups)
+            if data:
+                # The groups that weren't scraped are filled in by the profile refresher later
+                data.setdefault('followers_you_follow', [])
+                data.setdefault('more_info', '')
+                data['completeness'] = get_completeness(data)
+            return data
+
+        stale_groups = get_stale_groups(cached, groups)
+        if stale_groups and not self.refresh(cached, stale_groups, browser):
+            return None
+        if not stale_groups:
+            self.logger.info(f"Using the cached profile data of {link}")
+
+        profile = {key: value for key, value in cached.items() if key != '_id'}
+        profile['scraped_at'] = dict(cached.get('scraped_at', {}))
+        return profile
+
+    def refresh(self, profile: dict, groups: list, browser=None):
+        '''This scrapes `groups` of a cached profile, updates it in place and saves the new values to every collection that has it. Returns True if the profile was scraped'''
+        data = (browser or self.browser).scrape_profile_data(profile['link'], groups)
+        if not data:
+            self._record_failure(profile)
+            return False
+
+        # Don't overwrite the reply setting that the user chose
+        values = {key: value for key, value in data.items() if key not in ('reply', 'scraped_at')}
+        values['refresh_failures'] = profile['refresh_failures'] = 0
+        values['refresh_retry_at'] = profile['refresh_retry_at'] = None
+        for group, scraped_at in data['scraped_at'].items():
+            values[f'scraped_at.{group}'] = scraped_at
+
+        profile.update({key: value for key, value in data.items() if key not in ('reply', 'scraped_at')})
+        profile.setdefault('scraped_at', {}).update(data['scraped_at'])
+        profile['completeness'] = values['completeness'] = get_completeness(profile)
+
+        self._save_fields(profile, values)
+        self.logger.info(f"Refreshed {groups} of {profile['link']}")
+        return True
+
+    def _record_failure(self, profile: dict):
+        '''This records that a profile couldn't be scraped, so it isn't refreshed again before `refresh_retry_at`. The wait starts at `Config.PROFILE_REFRESH_RETRY_DELAY` hours and doubles with every failure in a row (up to `Config.PROFILE_REFRESH_MAX_RETRY_DELAY` hours)'''
+        now = datetime.now()
+        failures = profile.get('refresh_failures', 0) + 1
+        delay = min(Config.PROFILE_REFRESH_RETRY_DELAY * 2 ** (failures - 1), Config.PROFILE_REFRESH_MAX_RETRY_DELAY)
+        values = {'refresh_failed_at': now, 'refresh_failures': failures, 'refresh_retry_at': now + timedelta(hours=delay)}
+        profile.update(values)
+        self._save_fields(profile, values)
+        self.logger.warning(f"Couldn't refresh {profile['link']} ({failures} failures in a row), retrying in {delay} hours")
+
+    def _save_fields(self, profile: dict, values: dict):
+        '''This saves `values` of a cached profile to every collection that has it. The profile is matched by link, since the lists may have been reloaded (with new profile objects) since it was taken from the cache'''
+        db_manager = self.browser.db_manager
+        link = profile['link']
+        if any(p and p.get('link') == link for p in self.browser.following):
+            db_manager.update_profile_fields('following', link, values)
+        if any(p and p.get('link') == link for p in self.browser.added_people):
+            db_manager.update_profile_fields('added', link, values)
+
+    def get_stalest_profiles(self, limit=10, groups=FIELD_GROUPS):
+        '''This returns up to `limit` tuples (profile, stale groups) of the profiles that have stale groups, stalest first. Profiles that couldn't be scraped recently are left out until their retry is due'''
+        now = datetime.now()
+        stale_profiles = []
+        for profile in self.browser.added_people + self.browser.following:
+            if not profile or (profile.get('refresh_retry_at') and profile['refresh_retry_at'] > now):
+                continue
+            stale_groups = get_stale_groups(profile, groups, now)
+            if stale_groups:
+                staleness = max(get_staleness(profile, group, now) for group in stale_groups)
+                stale_profiles.append((staleness, profile, stale_groups))
+        stale_profiles.sort(key=lambda item: item[0], reverse=True)
+        return [(profile, stale_groups) for _, profile, stale_groups in stale_profiles[:limit]]
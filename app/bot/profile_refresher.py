@@ -0,0 +1,69 @@
+'''
+This refreshes the stalest cached profiles in the background. Profiles that only have their core record (the expensive
+fields were never scraped) are the stalest, so they are enriched first. It uses its own worker session (logged in with the
+cookies of the main session) and only navigates when the bot leaves spare navigation tokens, so it never gets in the way
+of the bot or the GUI processes.
+'''
+
+import threading
+from app.bot.x_controller import XController, get_worker_id
+from app.configuration.configuration import Config
+from app.bot.pacing import pacer
+from app.logger.logger import logger
+
+class ProfileRefresher:
+    def __init__(self, browser: XController):
+        '''`browser` is the main session. Its profile cache is refreshed'''
+        self.browser = browser
+        self.worker = None
+        self.cookies = [] # the cookies of the main session, taken when the refresher is started
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.logger = logger(__name__)
+
+    def start(self):
+        '''This starts refreshing in a background thread (if it isn't running already). It must be called from the thread that drives the main session, since it reads the cookies of the main session (WebDriver isn't thread safe)'''
+        if self.thread and self.thread.is_alive():
+            return
+        self.cookies = self.browser.get_session_cookies()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.logger.info("Started the profile refresher")
+
+    def stop(self):
+        '''This stops refreshing after the current profile and closes the worker session'''
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=30)
+        if self.worker:
+            self.worker.close_browser()
+            self.worker = None
+        self.logger.info("Stopped the profile refresher")
+
+    def _run(self):
+        '''This refreshes the stalest profile, then the next one, and waits `Config.PROFILE_REFRESH_IDLE_TIME` seconds when no profile is stale'''
+        while not self.stop_event.is_set():
+            try:
+                # This is low priority work, so it waits while the bot is using most of the navigation budget
+                if not pacer.has_spare('navigate', Config.PROFILE_REFRESH_SPARE_TOKENS):
+                    self.stop_event.wait(5)
+                    continue
+
+                stalest = self.browser.profile_cache.get_stalest_profiles(limit=1)
+                if not stalest:
+                    self.stop_event.wait(Config.PROFILE_REFRESH_IDLE_TIME)
+                    continue
+
+                profile, stale_groups = stalest[0]
+                self.browser.profile_cache.refresh(profile, stale_groups, self._get_worker())
+            except Exception as e:
+                self.logger.exception(f"Error while refreshing profiles: {str(e)}")
+                self.stop_event.wait(Config.PROFILE_REFRESH_IDLE_TIME)
+
+    def _get_worker(self):
+        '''This returns the worker session, starting it the first time'''
+        if self.worker is None:
+            self.worker = XController(worker_id=get_worker_id('refresher'), db_manager=self.browser.db_manager)
+            self.worker.load_session_cookies(self.cookies)
+        return self.worker
@@ -0,0 +1,151 @@
+'''
+This decides which bot target is opened next. Instead of a flat round robin, every profile is due again after the time in
+which it is expected to post a new tweet, estimated from the tweets of the profile that were handled before (their times
+are in the tweet ids). Profiles that post often are visited often, dormant profiles rarely. The profiles are kept in a
+heap ordered by the time at which they are due, and the bot targets are re-read from MongoDB while the bot runs, so
+profiles that are added, removed or edited in the Bot Targets tab are picked up without a restart.
+'''
+
+import heapq
+import itertools
+import threading
+import time
+from app.configuration.configuration import Config
+from app.bot.tweet_index import TweetIndex, get_username
+from app.logger.logger import logger
+
+class ProfileScheduler:
+    def __init__(self, db_manager, tweet_index: TweetIndex):
+        self.db_manager = db_manager
+        self.tweet_index = tweet_index
+        self.profiles = {} # link: profile of every current bot target
+        self.heap = [] # (due time, sequence number, link) of the profiles that are waiting to be visited
+        self.queued = set() # links in the heap (profiles that are being visited aren't in it)
+        self.expected_intervals = {} # link: expected interval when the profile was scheduled
+        self.last_visits = {} # link: time of the last visit
+        self.stats = {'visits': 0, 'new_tweets': 0, 'expected': 0.0, 'actual': 0.0, 'revisits': 0}
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.loaded_at = 0
+        self.reported_at = time.time()
+        self.logger = logger(__name__)
+
+    def get_expected_interval(self, link: str, now: float = None) -> float:
+        '''
+        This returns the number of seconds in which the profile is expected to post a new tweet: the inverse of its posting rate (handled tweets per second since the first handled tweet),
+        but at least `Config.SCHEDULER_DORMANCY_FACTOR` times the time since its last tweet, so profiles that stopped posting are visited less and less often.
+        The result is between `Config.SCHEDULER_MIN_INTERVAL` and `Config.SCHEDULER_MAX_INTERVAL`.
+        '''
+        now = now or time.time()
+        activity = self.tweet_index.get_activity(get_username(link))
+        if activity is None:
+            interval = Config.SCHEDULER_DEFAULT_INTERVAL
+        else:
+            count, first_time, last_time = activity
+            rate = count / max(now - first_time, Config.SCHEDULER_MIN_INTERVAL)
+            interval = max(1 / rate, Config.SCHEDULER_DORMANCY_FACTOR * (now - last_time))
+        return min(max(interval, Config.SCHEDULER_MIN_INTERVAL), Config.SCHEDULER_MAX_INTERVAL)
+
+    def _push(self, link: str, due: float):
+        '''This adds a profile to the heap. Must be called while holding `self.lock`.'''
+        heapq.heappush(self.heap, (due, next(self.counter), link))
+        self.queued.add(link)
+
+    def reload_targets(self):
+        '''This re-reads the bot targets (the added profiles first, then the following) from MongoDB. New profiles are due immediately and removed profiles are dropped'''
+        targets = {}
+        for profile in self.db_manager.get_added_list() + self.db_manager.get_following_list():
+            if profile.get('link') and profile['link'] not in targets:
+                targets[profile['link']] = profile
+
+        with self.lock:
+            added = [link for link in targets if link not in self.profiles]
+            removed = [link for link in self.profiles if link not in targets]
+            self.profiles = targets
+            now = time.time()
+            for link in added:
+                if link not in self.queued:
+                    self._push(link, now)
+            # Removed profiles are skipped when they reach the top of the heap
+            self.queued.difference_update(removed)
+            self.loaded_at = now
+        if added or removed:
+            self.logger.info(f"Reloaded the bot targets: {len(targets)} profiles ({len(added)} added, {len(removed)} removed)")
+
+    def reload_if_due(self, now: float = None):
+        '''This reloads the bot targets if they were last read more than `Config.SCHEDULER_RELOAD_INTERVAL` seconds ago'''
+        if (now or time.time()) - self.loaded_at >= Config.SCHEDULER_RELOAD_INTERVAL:
+            self.reload_targets()
+
+    def get_targets(self):
+        '''This returns the current bot targets by lowercase username (the added profile if a username is in both lists). They are re-read from MongoDB at most every `Config.SCHEDULER_RELOAD_INTERVAL` seconds'''
+        self.reload_if_due()
+        with self.lock:
+            profiles = list(self.profiles.values())
+        return {get_username(profile['link']).lower(): profile for profile in reversed(profiles)}
+
+    def record_visit(self, link: str, new_tweet: bool):
+        '''This records that a profile was checked (and whether it had a new tweet), and schedules its next visit'''
+        now = time.time()
+        with self.lock:
+            self.stats['visits'] += 1
+            self.stats['new_tweets'] += int(new_tweet)
+            if link in self.last_visits and link in self.expected_intervals:
+                self.stats['revisits'] += 1
+                self.stats['expected'] += self.expected_intervals[link]
+                self.stats['actual'] += now - self.last_visits[link]
+            self.last_visits[link] = now
+
+            if link in self.profiles and link not in self.queued:
+                interval = self.get_expected_interval(link, now)
+                self.expected_intervals[link] = interval
+                self._push(link, now + interval)
+
+    def get_report(self):
+        '''This returns the scheduling statistics: the visits, the share of visits that found a new tweet, and the average expected and actual revisit intervals in minutes'''
+        with self.lock:
+            stats = dict(self.stats)
+            queued = len(self.queued)
+        revisits = stats['revisits'] or 1
+        return {
+            'profiles': len(self.profiles),
+            'queued': queued,
+            'visits': stats['visits'],
+            'fresh_share': round(stats['new_tweets'] / (stats['visits'] or 1), 3),
+            'avg_expected_interval_min': round(stats['expected'] / revisits / 60, 1),
+            'avg_actual_interval_min': round(stats['actual'] / revisits / 60, 1),
+        }
+
+    def pop_due(self):
+        '''
+        This returns a tuple (profile, wait): the profile that is due next, or None and the number of seconds until the next profile is due. It doesn't block, so it can be mixed with other work.
+        The bot targets are reloaded and the report is logged here when they are due.
+        '''
+        now = time.time()
+        self.reload_if_due(now)
+        if now - self.reported_at >= Config.SCHEDULER_REPORT_INTERVAL:
+            self.logger.info(f"Scheduler report: {self.get_report()}")
+            self.reported_at = now
+
+        with self.lock:
+            # Drop the entries of profiles that were removed
+            while self.heap and self.heap[0][2] not in self.queued:
+                heapq.heappop(self.heap)
+            if self.heap and self.heap[0][0] <= now:
+                _, _, link = heapq.heappop(self.heap)
+                self.queued.discard(link)
+                return self.profiles[link], 0
+            return None, self.heap[0][0] - now if self.heap else Config.SCHEDULER_MIN_INTERVAL
+
+    def iterate(self, should_continue=lambda: True):
+        '''
+        This yields the profile that is due next, forever (until `should_continue()` returns False). If no profile is due yet, it waits.
+        Every yielded profile must be passed to `record_visit` after it is checked, otherwise it isn't scheduled again.
+        '''
+        while should_continue():
+            profile, wait = self.pop_due()
+            if profile:
+                yield profile
+            else:
+                # Wake up regularly to check `should_continue` and reload the targets
+                time.sleep(min(wait, 5))
@@ -0,0 +1,71 @@
+'''
+This is a scroll engine for X's infinite lists (eg: the Following page and the "Followers you know" page).
+The cells are collected inside the page by the `COLLECT_CELLS` script, so scraping a list costs one WebDriver call per
+few seconds of scrolling instead of several calls per profile.
+'''
+
+from app.bot.page_scripts import COLLECT_CELLS
+from app.logger.logger import logger
+
+# A collector is created for every scraped list, so they share one logger
+_logger = logger(__name__)
+
+class ScrollCollector:
+    def __init__(self, driver, cell_selector: str, scroll_step=600, idle_timeout=3, step_duration=5, max_scrolls=0, with_elements=False):
+        '''
+        `cell_selector` is the CSS selector of a single cell in the list. Every step scrolls by `scroll_step` pixels every 100 ms for up to `step_duration` seconds (or `max_scrolls` times).
+        The end of the list is reached when the page is at the bottom and no new cells arrived for `idle_timeout` seconds.
+        If `with_elements` is True, the returned cells which are still in the DOM include their WebElement under the 'element' key.
+        '''
+        self.driver = driver
+        self.cell_selector = cell_selector
+        self.scroll_step = scroll_step
+        self.idle_timeout = idle_timeout
+        self.step_duration = step_duration
+        self.max_scrolls = max_scrolls
+        self.with_elements = with_elements
+        self.logger = _logger
+
+        # A step can last `step_duration` seconds and then wait up to `idle_timeout` seconds for the end of the list
+        self.driver.set_script_timeout(step_duration + idle_timeout + 10)
+
+    def step(self):
+        '''
+        This scrolls the page once and returns a tuple (cells, ended). `cells` are the cells that were rendered since the previous step (each cell is a dict with 'key', 'link' and 'username') and `ended` is True if the end of the list was reached.
+        '''
+        result = self.driver.execute_async_script(
+            COLLECT_CELLS,
+            self.cell_selector,
+            self.scroll_step,
+            int(self.idle_timeout * 1000),
+            int(self.step_duration * 1000),
+            self.max_scrolls,
+            self.with_elements,
+        )
+        return result['items'], result['ended']
+
+    def collect(self, should_stop=None, on_step=None):
+        '''
+        This scrolls to the end of the list and returns all the cells in the order they appeared, without duplicates.
+        `should_stop()` is checked between steps; if it returns True, None is returned.
+        `on_step(cells)` is called with the new cells of every step; if it returns True, scrolling stops early and the cells collected so far are returned.
+        '''
+        cells = {}
+        while True:
+            if should_stop and should_stop():
+                return None
+
+            items, ended = self.step()
+            new_items = [item for item in items if item['key'] not in cells]
+            for item in new_items:
+                cells[item['key']] = item
+            self.logger.info(f'Collected {len(new_items)} new cells ({len(cells)} in total)')
+
+            if on_step and on_step(new_items):
+                self.logger.info('Stopped scrolling early')
+                break
+            if ended:
+                self.logger.info('Reached the end of the list')
+                break
+
+        return list(cells.values())
@@ -0,0 +1,87 @@
+'''
+This is a pool of extra Chrome sessions. Every session is a separate `XController` with its own user data directory which
+is logged in with the cookies of the main session. The pool hands out work (eg: opening a profile and interacting with its
+latest tweet) to whichever session is free, so the work gets done in parallel.
+'''
+
+import itertools
+import threading
+from app.bot.x_controller import XController, get_worker_id
+from app.configuration.configuration import Config
+from app.logger.logger import logger
+
+class SessionPool:
+    def __init__(self, main_browser: XController, size: int = Config.SESSION_POOL_SIZE):
+        self.main_browser = main_browser
+        self.size = size
+        self.workers = []
+        self.worker_numbers = itertools.count(1) # a worker that failed to start doesn't give its number to a running worker
+        self.lock = threading.Lock()
+        self.logger = logger(__name__)
+
+    @property
+    def sessions(self):
+        '''The main session and all the worker sessions'''
+        return [self.main_browser] + self.workers
+
+    def start(self):
+        '''This launches `size - 1` worker sessions (the main session is the first session of the pool) and logs them in with the cookies of the main session'''
+        cookies = self.main_browser.get_session_cookies()
+        missing = self.size - 1 - len(self.workers)
+        if missing <= 0:
+            return
+
+        self.logger.info(f"Starting {missing} worker sessions")
+        threads = [threading.Thread(target=self._start_worker, args=(get_worker_id('pool', next(self.worker_numbers)), cookies), daemon=True) for _ in range(missing)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.logger.info(f"Session pool has {len(self.sessions)} sessions")
+
+    def _start_worker(self, worker_id: str, cookies: list):
+        '''This launches a single worker session and adds it to the pool if it could be logged in'''
+        try:
+            worker = XController(worker_id=worker_id, db_manager=self.main_browser.db_manager)
+            if not worker.load_session_cookies(cookies):
+                worker.close_browser()
+                return
+            with self.lock:
+                self.workers.append(worker)
+        except Exception as e:
+            self.logger.exception(f"Failed to start worker session {worker_id}. Error: {str(e)}")
+
+    def run(self, items, work, should_continue=lambda: True, limit: int = None):
+        '''
+        Hands every item of `items` to the next free session until `items` is exhausted or `should_continue()` returns False.
+        `work(browser, item)` is called in the thread of the session which got the item. `items` can be any iterable (it is only read while holding a lock).
+        If `limit` is set, at most `limit` sessions work at the same time.
+        '''
+        iterator = iter(items)
+
+        def next_item():
+            with self.lock:
+                return next(iterator, None)
+
+        def worker_loop(browser):
+            while should_continue():
+                item = next_item()
+                if item is None:
+                    return
+                try:
+                    work(browser, item)
+                except Exception as e:
+                    self.logger.exception(f"Error while processing an item in the session pool: {str(e)}")
+
+        threads = [threading.Thread(target=worker_loop, args=(browser,), daemon=True) for browser in self.sessions[:limit]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def close(self):
+        '''This closes all the worker sessions. The main session is left open'''
+        for worker in self.workers:
+            worker.close_browser()
+        self.workers = []
+        self.logger.info("Closed all the worker sessions")
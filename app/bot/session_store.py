@@ -0,0 +1,80 @@
+'''
+This keeps the cookies of the logged in X sessions in a local SQLite database, by account. A new or restarted Chrome
+session is logged in by injecting the stored cookies instead of going through the login page again, and the full login
+is only needed when the stored cookies are missing, expired or rejected by X.
+'''
+
+import json
+import sqlite3
+import threading
+import time
+from app.configuration.configuration import Config
+from app.logger.logger import logger
+
+# The cookie that holds the login of an X session. The stored cookies are useless without it
+AUTH_COOKIE = 'auth_token'
+
+class SessionStore:
+    def __init__(self, path: str = Config.SESSION_STORE_PATH):
+        self.path = path
+        self.conn = None
+        self.lock = threading.Lock()
+        self.logger = logger(__name__)
+
+    def _connect(self):
+        '''This opens the database on first use, so importing this module doesn't touch the disk. Must be called while holding `self.lock`.'''
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                account TEXT PRIMARY KEY,
+                cookies TEXT NOT NULL,
+                saved_at REAL NOT NULL
+            )
+            ''')
+            self.conn.commit()
+        return self.conn
+
+    def save(self, account: str, cookies: list):
+        '''This stores the cookies of a logged in session of `account`, replacing the ones stored before'''
+        try:
+            with self.lock:
+                conn = self._connect()
+                conn.execute('INSERT OR REPLACE INTO sessions (account, cookies, saved_at) VALUES (?, ?, ?)', (account.lower(), json.dumps(cookies), time.time()))
+                conn.commit()
+            self.logger.info(f"Saved {len(cookies)} session cookies of {account}")
+        except Exception as e:
+            self.logger.warning(f"Failed to save the session cookies of {account}. Error: {str(e)}")
+
+    def load(self, account: str):
+        '''This returns the stored cookies of `account` without the expired ones, or None if there are none or the login cookie is missing or expired (then the stored session can't be valid)'''
+        try:
+            with self.lock:
+                row = self._connect().execute('SELECT cookies FROM sessions WHERE account = ?', (account.lower(),)).fetchone()
+        except Exception as e:
+            self.logger.warning(f"Failed to load the session cookies of {account}. Error: {str(e)}")
+            return None
+        if row is None:
+            self.logger.info(f"No stored session of {account}")
+            return None
+
+        now = time.time()
+        cookies = [cookie for cookie in json.loads(row[0]) if cookie.get('expiry') is None or cookie['expiry'] > now]
+        if not any(cookie['name'] == AUTH_COOKIE for cookie in cookies):
+            self.logger.info(f"The stored session of {account} expired")
+            self.delete(account)
+            return None
+        return cookies
+
+    def delete(self, account: str):
+        '''This removes the stored cookies of `account` (eg: after X rejected them)'''
+        try:
+            with self.lock:
+                conn = self._connect()
+                conn.execute('DELETE FROM sessions WHERE account = ?', (account.lower(),))
+                conn.commit()
+        except Exception as e:
+            self.logger.warning(f"Failed to delete the session cookies of {account}. Error: {str(e)}")
+
+# All the sessions of the app share this store
+session_store = SessionStore()
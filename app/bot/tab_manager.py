@@ -0,0 +1,133 @@
+'''
+This manages the tabs of a Chrome session. Instead of opening a new tab for every piece of background work (eg: scraping a
+profile) and closing it afterwards, a few long-lived worker tabs are handed out and taken back. A returned tab is reset
+to about:blank, so it is ready to be reused. Worker tabs that nobody owns (eg: left open after an error) are detected and
+closed.
+'''
+
+import threading
+from contextlib import contextmanager
+from app.configuration.configuration import Config
+from app.logger.logger import logger
+
+class TabManager:
+    def __init__(self, driver, size: int = Config.WORKER_TABS, on_new_tab=None):
+        '''The tab that is open when the manager is created is the main tab. At most `size` worker tabs are kept open. `on_new_tab()` is called while every new tab is the current tab (eg: to apply settings that Chrome keeps per tab)'''
+        self.driver = driver
+        self.size = size
+        self.on_new_tab = on_new_tab
+        self.main_tabs = {driver.current_window_handle}
+        self.idle = [] # worker tabs that can be handed out
+        self.leased = set() # worker tabs that are in use
+        self.created = set() # worker tabs that this manager opened (only those are ever closed as leaked)
+        self.lock = threading.Lock()
+        self.logger = logger(__name__)
+
+    def acquire(self, switch=True):
+        '''This hands out an idle worker tab (opening one if there are none) and switches to it if `switch` is True. Returns the handle of the tab'''
+        self.reclaim()
+        with self.lock:
+            if self.idle:
+                handle = self.idle.pop()
+            else:
+                current = self._get_current_handle()
+                self.driver.switch_to.new_window('tab')
+                handle = self.driver.current_window_handle
+                self.created.add(handle)
+                if self.on_new_tab:
+                    self.on_new_tab()
+                if current:
+                    self.driver.switch_to.window(current)
+                self.logger.info(f"Opened a new worker tab ({len(self.idle) + len(self.leased) + 1} worker tabs)")
+            self.leased.add(handle)
+        if switch:
+            self.driver.switch_to.window(handle)
+        return handle
+
+    def release(self, handle: str):
+        '''This takes back a worker tab and resets it to about:blank. Tabs beyond the `size` idle ones are closed instead (only if the manager opened them). The driver is switched back to a main tab'''
+        with self.lock:
+            self.leased.discard(handle)
+            try:
+                self.driver.switch_to.window(handle)
+                if len(self.idle) < self.size or handle not in self.created:
+                    self.driver.get('about:blank')
+                    self.idle.append(handle)
+                else:
+                    self.driver.close()
+            except Exception as e:
+                self.logger.warning(f"Failed to reset a worker tab, it is dropped. Error: {str(e)}")
+            self._switch_to_main_tab()
+
+    @contextmanager
+    def lease(self):
+        '''This hands out a worker tab for the duration of a `with` block and takes it back afterwards, even if the block raises. The tab that was active before is active again afterwards'''
+        previous = self._get_current_handle()
+        handle = self.acquire()
+        try:
+            yield handle
+        finally:
+            self.release(handle)
+            if previous and previous in self.driver.window_handles:
+                self.driver.switch_to.window(previous)
+
+    def swap(self, leased_handle: str, main_handle: str):
+        '''This swaps the roles of a leased worker tab and a main tab (eg: after the prefetch pipeline made its background tab the active one)'''
+        with self.lock:
+            if leased_handle in self.leased and main_handle in self.main_tabs:
+                self.leased.remove(leased_handle)
+                self.main_tabs.remove(main_handle)
+                self.leased.add(main_handle)
+                self.main_tabs.add(leased_handle)
+                # The manager owns the worker tab it swapped in instead of the one it opened
+                if leased_handle in self.created:
+                    self.created.remove(leased_handle)
+                    self.created.add(main_handle)
+
+    def reclaim(self):
+        '''
+        This forgets the tabs that were closed and closes the worker tabs that this manager opened but nobody owns (leaked tabs). Returns the number of closed tabs.
+        Tabs that the manager didn't open are never closed, and nothing is closed when the app is attached to the user's Chrome (see `Config.CHROME_ATTACH`).
+        '''
+        with self.lock:
+            handles = set(self.driver.window_handles)
+            self.main_tabs &= handles
+            self.leased &= handles
+            self.created &= handles
+            self.idle = [handle for handle in self.idle if handle in handles]
+            if not self.main_tabs:
+                # The main tab was closed, so a remaining tab takes its place
+                remaining = handles - self.leased - set(self.idle)
+                self.main_tabs = {sorted(remaining)[0]} if remaining else set()
+
+            if Config.CHROME_ATTACH:
+                return 0
+            leaked = self.created - self.main_tabs - self.leased - set(self.idle)
+            if not leaked:
+                return 0
+            current = self._get_current_handle()
+            for handle in leaked:
+                try:
+                    self.driver.switch_to.window(handle)
+                    self.driver.close()
+                except Exception as e:
+                    self.logger.warning(f"Failed to close a leaked tab. Error: {str(e)}")
+            if current in leaked or current is None:
+                self._switch_to_main_tab()
+            else:
+                self.driver.switch_to.window(current)
+            self.logger.warning(f"Closed {len(leaked)} leaked tabs")
+            return len(leaked)
+
+    def _get_current_handle(self):
+        '''This returns the handle of the active tab, or None if it was closed'''
+        try:
+            return self.driver.current_window_handle
+        except Exception:
+            return None
+
+    def _switch_to_main_tab(self):
+        '''This switches to a main tab (if one is left)'''
+        for handle in self.main_tabs:
+            self.driver.switch_to.window(handle)
+            return
@@ -0,0 +1,122 @@
+'''
+This is an in-memory index of the tweets that the bot already handled (liked, and replied to if replies were allowed).
+It is loaded from the tweets collection when the bot starts and updated after every interaction, so the bot doesn't like
+and reply to the same tweet again on every pass. It also keeps the id of the last handled tweet of every profile and the
+newest tweet that was seen of every profile (eg: in the captured responses), which tells the bot when opening a profile
+wouldn't show anything new.
+'''
+
+import threading
+import time
+from urllib.parse import urlparse
+from app.logger.logger import logger
+
+TWITTER_EPOCH_MS = 1288834974657 # the epoch of the tweet id snowflakes
+
+def get_tweet_id(tweet_link: str) -> str:
+    '''This returns the id of a tweet from its link (eg: https://x.com/user/status/123 -> 123), or None if the link doesn't end with a numeric id (eg: a malformed or promoted link)'''
+    tweet_id = urlparse(tweet_link).path.rstrip('/').split('/')[-1]
+    return tweet_id if tweet_id.isdigit() else None
+
+def get_tweet_time(tweet_id: str) -> float:
+    '''This returns the time (seconds since the epoch) at which a tweet was posted. Tweet ids are snowflakes, so the time is in the id'''
+    return ((int(tweet_id) >> 22) + TWITTER_EPOCH_MS) / 1000
+
+def get_username(profile_link: str) -> str:
+    '''This returns the username of a profile from its link (eg: https://x.com/user -> user)'''
+    return urlparse(profile_link).path.strip('/').split('/')[0]
+
+class TweetIndex:
+    def __init__(self):
+        self.handled = {} # tweet id: True if the tweet was replied to
+        self.last_tweet_ids = {} # lowercase username: id of the last handled tweet
+        self.first_tweet_ids = {} # lowercase username: id of the first handled tweet
+        self.tweet_counts = {} # lowercase username: number of handled tweets
+        self.seen = {} # lowercase username: (id of the newest seen tweet, time.monotonic() when it was seen)
+        self.lock = threading.Lock()
+        self.logger = logger(__name__)
+
+    def load(self, db_manager):
+        '''This loads the handled tweets from the tweets collection (including the ones that are still in the outbox)'''
+        tweets = db_manager.get_handled_tweets()
+        with self.lock:
+            for tweet in tweets:
+                # Tweets that were saved before 'replied' was recorded may have been replied to, so they count as replied
+                self._add(tweet['tweet_id'], tweet.get('username', ''), tweet.get('replied', True))
+        self.logger.info(f"Loaded {len(self.handled)} handled tweets of {len(self.last_tweet_ids)} profiles")
+
+    def _add(self, tweet_id: str, username: str, replied: bool):
+        '''This adds a handled tweet. Must be called while holding `self.lock`. Tweets without a numeric id are ignored'''
+        if not str(tweet_id).isdigit():
+            return
+        is_new = tweet_id not in self.handled
+        self.handled[tweet_id] = self.handled.get(tweet_id, False) or replied
+        username = username.lower()
+        if not username:
+            return
+        if int(tweet_id) > int(self.last_tweet_ids.get(username, 0)):
+            self.last_tweet_ids[username] = tweet_id
+        if username not in self.first_tweet_ids or int(tweet_id) < int(self.first_tweet_ids[username]):
+            self.first_tweet_ids[username] = tweet_id
+        if is_new:
+            self.tweet_counts[username] = self.tweet_counts.get(username, 0) + 1
+
+    def mark_handled(self, tweet_id: str, username: str, replied: bool):
+        '''This records that a tweet was handled, and whether it was replied to'''
+        with self.lock:
+            self._add(tweet_id, username, replied)
+
+    def is_handled(self, tweet_id: str, reply: bool) -> bool:
+        '''This checks if a tweet was already handled. If `reply` is True, a tweet that was only liked still needs a reply, so it isn't handled yet'''
+        with self.lock:
+            if tweet_id not in self.handled:
+                return False
+            return self.handled[tweet_id] or not reply
+
+    def get_last_tweet_id(self, username: str):
+        '''This returns the id of the last handled tweet of `username`, or None'''
+        with self.lock:
+            return self.last_tweet_ids.get(username.lower())
+
+    def get_activity(self, username: str):
+        '''This returns a tuple (number of handled tweets, time of the first one, time of the last one) of `username` for estimating how often the profile posts, or None if none of its tweets were handled'''
+        username = username.lower()
+        with self.lock:
+            if username not in self.tweet_counts:
+                return None
+            return self.tweet_counts[username], get_tweet_time(self.first_tweet_ids[username]), get_tweet_time(self.last_tweet_ids[username])
+
+    def note_seen(self, username: str, tweet_id: str):
+        '''This records that `tweet_id` of `username` was seen now. Only the newest seen tweet of every profile is kept. Tweets without a numeric id are ignored'''
+        if not tweet_id or not tweet_id.isdigit():
+            return
+        username = username.lower()
+        with self.lock:
+            seen = self.seen.get(username)
+            if seen is None or int(tweet_id) >= int(seen[0]):
+                self.seen[username] = (tweet_id, time.monotonic())
+
+    def note_captured(self, network_capture):
+        '''This notes the newest tweets in the captured GraphQL responses (pinned, promoted and retweeted tweets aren't the latest tweet of a profile, so they are ignored)'''
+        for tweet in network_capture.take_new_tweets():
+            if tweet['is_pinned'] or tweet['is_promoted'] or tweet['is_retweet'] or not str(tweet['tweet_id']).isdigit():
+                continue
+            username = tweet['username'].lower()
+            with self.lock:
+                seen = self.seen.get(username)
+                if seen is None or int(tweet['tweet_id']) > int(seen[0]):
+                    self.seen[username] = (tweet['tweet_id'], tweet['captured_at'])
+
+    def has_nothing_new(self, username: str, max_age: float) -> bool:
+        '''
+        This is the cheap check for skipping a profile without opening it: it returns True if the newest tweet of `username` was seen in the last `max_age` seconds and it isn't newer than the last handled tweet.
+        If there is no recent sighting, False is returned and the profile has to be opened.
+        '''
+        username = username.lower()
+        with self.lock:
+            seen = self.seen.get(username)
+            last_tweet_id = self.last_tweet_ids.get(username)
+        if seen is None or last_tweet_id is None:
+            return False
+        tweet_id, seen_at = seen
+        return time.monotonic() - seen_at <= max_age and int(tweet_id) <= int(last_tweet_id)
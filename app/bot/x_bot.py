@@ -1,15 +1,33 @@
-from app.bot.x_controller import XController, VerificationRequiredException
+from typing import TYPE_CHECKING
+from app.bot.tweet_index import TweetIndex, get_tweet_id, get_username
+from app.bot.scheduler import ProfileScheduler
+from app.bot.notification_trigger import NotificationTrigger
+from app.configuration.configuration import Config
 from time import sleep
-import app.bot.delete_interactions as delete_interactions
 import app.decorators.decorators as decorators
+from app.bot.pacing import pacer
 from app.logger.logger import logger
 import threading
 
+# Selenium and pymongo (through XController and the modules that use it) are imported when they are first needed, so the
+# GUI comes up without waiting for them (see app/import_budget.py)
+if TYPE_CHECKING:
+    from app.bot.x_controller import XController
+
 # These are high level methods that interact with XController methods.
 class XBot:
-    def __init__(self):
-        self.browser = XController()
+    def __init__(self, start: bool = True):
+        '''If `start` is False, the browser isn't created yet: `create_browser` must be called first (see app/startup.py)'''
+        self.browser = None
+        if start:
+            self.create_browser()
+        self.session_pool = None
+        self.profile_refresher = None
+        self.tweet_index = TweetIndex()
+        self.scheduler = None
+        self.notification_trigger = None
         self.get_following_lock = threading.Lock()
+        self.signed_in = False # set once `sign_in` succeeded, so the worker sessions get the cookies of a logged in session
         self.retry_delay = 5
         self.username = ''
         self.password = ''
@@ -18,6 +36,12 @@ class XBot:
         self.is_running = True
         self.logger = logger(__name__)
 
+    def create_browser(self, start: bool = True):
+        '''This imports the controller stack (Selenium and pymongo) and creates the browser. If `start` is False, the browser isn't started yet (see `XController`)'''
+        from app.bot.x_controller import XController
+        self.browser = XController(start=start)
+        return self.browser
+
     def is_credentials_valid(self):
         '''This method checks if the email, username and password are valid'''
         self.logger.info("Checking if credentials are valid")
@@ -29,6 +53,7 @@ class XBot:
 
     def sign_in(self):
         '''This method signs in to X and goes to the following page of the specified user. It also updates the GUI with a list of the people that the user is following and displays error messages if any occur'''
+        from app.bot.x_controller import VerificationRequiredException
         try:
             self.browser.sign_in(self.username, self.password, self.email)
         except VerificationRequiredException as ve:
@@ -39,50 +64,145 @@ class XBot:
             error_message = f"An error occurred during initialization: {str(e)}"
             self.logger.error(error_message)
             return False
+        self.signed_in = True
         return True
 
-    def get_following(self):
-        '''This method opens the user's following page, gets the list of people that the user is following and displays it on the GUI'''
+    def get_following(self, on_profile=None, force=False):
+        '''This method opens the user's following page, gets the list of people that the user is following and displays it on the GUI. The new profiles are scraped in parallel by the session pool if `Config.SCRAPE_CONCURRENCY` and `Config.SESSION_POOL_SIZE` allow it. `on_profile(data)` is called for every scraped profile. The scrape is skipped (unless `force` is True) if the following number is the same as at the last sync and nothing changed since.'''
         with self.get_following_lock:
+            following_count = self.get_total_following()
+            if not force and self.is_following_unchanged(following_count):
+                self.logger.info(f"Skipping get following because the following number ({following_count}) didn't change since the last sync")
+                return True
+
+            pool = None
+            if Config.SCRAPE_CONCURRENCY > 1 and Config.SESSION_POOL_SIZE > 1:
+                pool = self.start_session_pool()
             self.browser.go_to_following(self.username)
-            self.browser.get_following()
+            success = self.browser.get_following(pool, on_profile, following_count or None)
+        self.start_enrichment()
+        return success
+
+    def is_following_unchanged(self, following_count: int):
+        '''This checks if the last sync of the following list is still up to date: the following number is the same, the bot didn't follow or unfollow anyone since, and no full sync is due'''
+        sync_state = self.browser.db_manager.get_sync_state('following')
+        return (
+            following_count > 0
+            and sync_state.get('following_count') == following_count
+            and sync_state.get('changed') is False
+            and not self.browser.is_full_sync_due(sync_state)
+        )
 
     def unfollow_users(self, count):
         '''This method unfollows a specified number of users that the bot is currently following.'''
         self.browser.go_to_following(self.username)
         self.browser.unfollow_users(count)
+        self.browser.mark_following_changed()
 
-    def interact_with_tweet(self, profile):
-        '''This method opens the profile page of the person passed in, scrolls to the latest tweet, likes the tweet, and replies to it if it's allowed. The tweet is then saved to the database.'''
-        self.browser.reload_page(mins_to_wait=2)
-        tweet_element = self.browser.scroll_to_latest_post()
+    def interact_with_tweet(self, profile, browser: 'XController' = None):
+        '''This method opens the profile page of the person passed in, scrolls to the latest tweet, likes the tweet, and replies to it if it's allowed. The tweet is then saved to the database. Tweets that were already handled are skipped. `browser` is the session to use (the main session by default). Returns True if a new tweet was handled.'''
+        browser = browser or self.browser
+        browser.reload_page()
+        tweet_element = browser.scroll_to_latest_post()
         if not tweet_element:
             self.logger.warning("Failed to find the latest non-ad and non-pinned tweet")
-            return
+            return False
 
-        tweet_link = self.browser.get_tweet_link(tweet_element)
-        tweet_author = self.browser.get_tweet_author(tweet_element)
+        tweet_link = browser.get_tweet_link(tweet_element)
+        tweet_author = browser.get_tweet_author(tweet_element)
         if not (tweet_link and tweet_author):
             self.logger.warning(f"Failed to get tweet link for {tweet_author}")
-            return
+            return False
+
+        self.tweet_index.note_seen(tweet_author, get_tweet_id(tweet_link))
+        return self.handle_tweet(tweet_element, tweet_link, tweet_author, profile, browser)
+
+    def handle_tweet(self, tweet_element, tweet_link, tweet_author, profile, browser: 'XController' = None):
+        '''This likes a tweet and replies to it if the profile allows it, then saves it to the database and the tweet index. The tweet can be on any page (a profile or a timeline). Tweets that were already handled are skipped. Returns True if the tweet was handled now.'''
+        browser = browser or self.browser
+        tweet_id = get_tweet_id(tweet_link)
+        if not tweet_id:
+            self.logger.warning(f"Skipping the tweet by {tweet_author} because its link has no tweet id: {tweet_link}")
+            return False
+        if self.tweet_index.is_handled(tweet_id, profile['reply']):
+            self.logger.info(f"Skipping the tweet by {tweet_author} because it was already handled: {tweet_link}")
+            return False
         
-        self.like_tweet(tweet_element, tweet_author)
+        if not self.like_tweet(tweet_element, tweet_author, browser):
+            # Not marked as handled, so it is tried again on the next visit or sweep
+            return False
+        replied = False
         if profile['reply']:
-            self.reply_to_tweet(tweet_element, tweet_author)
+            replied = self.reply_to_tweet(tweet_element, tweet_author, browser)
 
-        self.browser.db_manager.save_tweet(tweet_link, tweet_author)
+        browser.db_manager.save_tweet(tweet_link, tweet_author, replied)
+        self.tweet_index.mark_handled(tweet_id, tweet_author, replied)
         self.logger.info(f"Saved tweet link: {tweet_link} by author: {tweet_author}")
+        return True
+
+    def get_targets(self):
+        '''This returns the bot targets (the added profiles and the following) by lowercase username. While the bot runs, they are the targets of the scheduler (which re-reads them every `Config.SCHEDULER_RELOAD_INTERVAL` seconds, so edits made in the Bot Targets tab are included), otherwise they are read from the database'''
+        if self.scheduler:
+            return self.scheduler.get_targets()
+        db_manager = self.browser.db_manager
+        targets = {}
+        for profile in db_manager.get_added_list() + db_manager.get_following_list():
+            if profile.get('link'):
+                targets.setdefault(get_username(profile['link']).lower(), profile)
+        return targets
+
+    def sweep_timeline(self, browser: 'XController' = None):
+        '''
+        This scrolls the home "Following" timeline and handles the new tweets of the bot targets in place, so a cycle costs one page load instead of one per target.
+        The timeline is newest first, so the sweep stops after `Config.TIMELINE_STOP_AFTER_HANDLED` handled tweets of targets in a row (everything below them was handled before) or after `Config.TIMELINE_MAX_SCROLLS` scrolls.
+        Returns the number of tweets that were handled.
+        '''
+        browser = browser or self.browser
+        targets = self.get_targets()
+        if not browser.open_following_timeline():
+            return 0
+
+        checked = set()
+        handled_in_a_row = 0
+        handled = 0
+        for _ in range(Config.TIMELINE_MAX_SCROLLS):
+            for tweet in browser.get_visible_tweets():
+                if not self.is_running:
+                    return handled
+                if tweet['link'] in checked:
+                    continue
+                checked.add(tweet['link'])
+                if tweet['ad'] or tweet['pinned'] or tweet['retweet']:
+                    continue
+
+                self.tweet_index.note_seen(tweet['author'], get_tweet_id(tweet['link']))
+                profile = targets.get(tweet['author'].lower())
+                if not profile:
+                    continue
+                if self.handle_tweet(tweet['element'], tweet['link'], tweet['author'], profile, browser):
+                    handled += 1
+                    handled_in_a_row = 0
+                else:
+                    handled_in_a_row += 1
+                    if handled_in_a_row >= Config.TIMELINE_STOP_AFTER_HANDLED:
+                        self.logger.info(f"Reached the tweets that were handled before. Handled {handled} new tweets in the timeline sweep")
+                        return handled
+            browser.scroll_down(Config.TIMELINE_SCROLL_STEP)
+
+        self.logger.info(f"Handled {handled} new tweets in the timeline sweep (scroll limit reached)")
+        return handled
 
     def get_total_following(self):
         '''This method retrieves the total number of people that the user is following on X. This is not the same as getting the number of people in the database because the number of people in the database can be different than the actual number of people the user is following on X.'''
         return self.browser.get_following_number(self.username)
 
-    @decorators.rest
-    def open_profile(self, profile):
+    @decorators.paced('navigate')
+    def open_profile(self, profile, browser: 'XController' = None):
         """
-        Opens the X profile of the person passed in.
+        Opens the X profile of the person passed in with `browser` (the main session by default).
         Returns True if the profile is opened, False otherwise.
         """
+        browser = browser or self.browser
         try:
             # Ensure the URL is complete
             url = profile['link']
@@ -90,58 +210,215 @@ class XBot:
                 url = f'https://{url}'
             
             # Open the X profile
-            self.browser.open_page(url)
+            browser.open_page(url)
             self.logger.info(f"Opened profile: {url}")
             return True
         except Exception as e:
             self.logger.exception(f"Failed to open profile. Error: {str(e)}")
             return False
 
-    def like_tweet(self, tweet_element, tweet_author):
-        if self.browser.like_tweet(tweet_element):
+    def like_tweet(self, tweet_element, tweet_author, browser: 'XController' = None):
+        browser = browser or self.browser
+        if browser.like_tweet(tweet_element):
             self.logger.info(f"Liked the tweet by {tweet_author} successfully")
             return True
         else:
             self.logger.warning(f"Failed to like the tweet by {tweet_author}")
             return False
 
-    def reply_to_tweet(self, tweet_element, tweet_author):
+    def reply_to_tweet(self, tweet_element, tweet_author, browser: 'XController' = None):
+        browser = browser or self.browser
         try:
-            if self.browser.click_reply_button(tweet_element):
-                if self.browser.type_reply(self.content) and self.browser.send_reply():
+            if browser.click_reply_button(tweet_element):
+                if browser.type_reply(self.content) and browser.send_reply():
                     self.logger.info(f"Replied to the tweet by {tweet_author} successfully")
+                    return True
                 else:
                     self.logger.warning(f"Failed to send reply to {tweet_author}")
         except Exception as e:
             self.logger.exception(f"Error sending reply to tweet by {tweet_author}")
+        return False
 
     def run(self):
-        '''It initializes the environment, gets the following list, and then opens each profile in the following and added people lists, interacts with the tweet of each profile, and saves it to the database.'''
+        '''It initializes the environment, gets the following list, and then keeps opening the profiles in the following and added people lists in the order of the scheduler (profiles that post often first), interacts with the latest tweet of each profile, and saves it to the database.'''
         self.logger.info("Initializing environment for the bot")
         if not self.sign_in():
             return
         self.get_following()
+        self.tweet_index.load(self.browser.db_manager)
+        self.scheduler = ProfileScheduler(self.browser.db_manager, self.tweet_index)
+
+        # A timeline sweep uses a single page, so it doesn't need the session pool
+        if Config.SESSION_POOL_SIZE > 1 and Config.BOT_MODE != 'timeline':
+            self.start_session_pool()
+        self.start_enrichment()
+
+        if Config.BOT_MODE == 'timeline':
+            self.logger.info("Starting timeline sweeps")
+            while self.is_running:
+                self.sweep_timeline()
+                self.logger.info(f"Finished a timeline sweep. Pacing: {pacer.get_rates()}")
+                for _ in range(Config.TIMELINE_SWEEP_INTERVAL):
+                    if not self.is_running:
+                        break
+                    sleep(1)
+            self.logger.info("Main loop finished")
+            return
 
         self.logger.info("Starting main loop")
-        profiles = self.browser.added_people + self.browser.following
-        while self.is_running:
-            for profile in profiles:
-                if not self.is_running:
-                    break
-                try:
-                    self.open_profile(profile)
-                    self.interact_with_tweet(profile)
-                except Exception as e:
-                    error_message = f"An error occurred while processing a profile: {str(e)}"
-                    self.logger.exception(f"Error in main loop: {error_message}")
-                    sleep(self.retry_delay)
-            
-            if not self.is_running:
-                break
-        self.logger.info("Main loop finished")
+        if Config.BOT_MODE == 'notifications':
+            # New tweets from the notifications first, the scheduled profiles in between
+            self.notification_trigger = NotificationTrigger(self.scheduler, self.tweet_index)
+            items, work = self.notification_trigger.iterate(lambda: self.is_running), self.process_work_item
+        elif Config.PREFETCH_ENABLED and not self.session_pool:
+            self.run_with_prefetch()
+            self.logger.info(f"Main loop finished. Scheduler: {self.scheduler.get_report()}. Pacing: {pacer.get_rates()}")
+            return
+        else:
+            items, work = self.scheduler.iterate(lambda: self.is_running), self.process_profile
+        if self.session_pool:
+            self.session_pool.run(items, work, lambda: self.is_running)
+            # The bot was stopped, so the worker sessions aren't needed anymore
+            self.close_session_pool()
+        else:
+            for item in items:
+                work(self.browser, item)
+        if self.notification_trigger:
+            self.logger.info(f"Post to reply latency: {self.notification_trigger.get_report()}")
+        self.logger.info(f"Main loop finished. Scheduler: {self.scheduler.get_report()}. Pacing: {pacer.get_rates()}")
+
+    def process_work_item(self, browser: 'XController', item):
+        '''This does a single item of work of the notifications mode with `browser`: polling the notifications, handling a queued tweet or visiting a scheduled profile (see `NotificationTrigger.iterate`)'''
+        kind, value = item
+        if kind == 'poll':
+            self.poll_notifications(browser)
+        elif kind == 'tweet':
+            handled = False
+            try:
+                handled = self.interact_with_tweet_link(value['link'], value['author'], value['profile'], browser)
+            finally:
+                self.notification_trigger.record_handled(value, handled)
+        else:
+            self.process_profile(browser, value)
+
+    def poll_notifications(self, browser: 'XController' = None):
+        '''This opens the notifications page with `browser` and queues the new tweets of the bot targets that are listed there'''
+        browser = browser or self.browser
+        try:
+            if browser.open_notifications():
+                tweets = browser.get_visible_tweets()
+                for tweet in tweets:
+                    if not (tweet['ad'] or tweet['retweet']):
+                        self.tweet_index.note_seen(tweet['author'], get_tweet_id(tweet['link']))
+                self.notification_trigger.add_tweets(tweets, self.get_targets())
+        except Exception as e:
+            self.logger.exception(f"Failed to poll the notifications. Error: {str(e)}")
+        finally:
+            self.notification_trigger.finish_poll()
+
+    def interact_with_tweet_link(self, tweet_link, tweet_author, profile, browser: 'XController' = None):
+        '''This opens a tweet by its link with `browser` and handles it (see `handle_tweet`). Returns True if the tweet was handled now.'''
+        browser = browser or self.browser
+        tweet_element = browser.open_tweet(tweet_link)
+        if not tweet_element:
+            return False
+        return self.handle_tweet(tweet_element, tweet_link, tweet_author, profile, browser)
+
+    def run_with_prefetch(self):
+        '''This is the main loop with a prefetch pipeline: while the bot interacts with a profile in the active tab, the next due profile already loads in a background tab (see `PrefetchPipeline`).'''
+        from app.bot.prefetch import PrefetchPipeline
+        pipeline = PrefetchPipeline(self.browser)
+        upcoming = None
+        try:
+            while self.is_running:
+                if upcoming is None:
+                    upcoming = self._pop_due_profile()
+                    if upcoming is None:
+                        sleep(1)
+                        continue
+                    pipeline.prefetch(upcoming['link'])
+
+                profile, upcoming = upcoming, None
+                opened = pipeline.activate(profile['link'])
+                # Load the next profile while this one is being handled
+                upcoming = self._pop_due_profile()
+                if upcoming:
+                    pipeline.prefetch(upcoming['link'])
+                self.process_profile(self.browser, profile, opened=opened)
+        finally:
+            pipeline.close()
+
+    def _pop_due_profile(self):
+        '''This returns the next due profile of the scheduler without waiting, or None. Profiles without new tweets are skipped (and recorded as visited)'''
+        while True:
+            profile, _ = self.scheduler.pop_due()
+            if profile is None or not self._has_nothing_new(self.browser, profile):
+                return profile
+            self.scheduler.record_visit(profile['link'], False)
+
+    def _has_nothing_new(self, browser: 'XController', profile):
+        '''This checks, without opening the profile, if its newest tweet was seen recently (relative to how often the profile is visited) and was already handled'''
+        if browser.network_capture:
+            self.tweet_index.note_captured(browser.network_capture)
+        interval = self.scheduler.get_expected_interval(profile['link']) if self.scheduler else Config.SCHEDULER_DEFAULT_INTERVAL
+        if self.tweet_index.has_nothing_new(get_username(profile['link']), interval * Config.TWEET_SEEN_MAX_AGE_FACTOR):
+            self.logger.info(f"Skipping {profile['link']} because it has no new tweets")
+            return True
+        return False
+
+    def process_profile(self, browser: 'XController', profile, opened=False):
+        '''This opens the profile with `browser` (unless it is `opened` already, eg: by the prefetch pipeline) and interacts with its latest tweet, then reports the visit to the scheduler. It is the unit of work of the main loop, so it can run in any session of the session pool.'''
+        new_tweet = False
+        try:
+            if not opened:
+                if self._has_nothing_new(browser, profile):
+                    return
+                self.open_profile(profile, browser)
+            new_tweet = self.interact_with_tweet(profile, browser)
+        except Exception as e:
+            error_message = f"An error occurred while processing a profile: {str(e)}"
+            self.logger.exception(f"Error in main loop: {error_message}")
+            sleep(self.retry_delay)
+        finally:
+            if self.scheduler:
+                self.scheduler.record_visit(profile['link'], new_tweet)
+
+    def start_session_pool(self):
+        '''This starts the session pool (if it isn't started yet) so that the main loop can use `Config.SESSION_POOL_SIZE` sessions. The worker sessions are logged in with the cookies of the main session, so this must be called after signing in.'''
+        if self.session_pool is None:
+            from app.bot.session_pool import SessionPool
+            self.session_pool = SessionPool(self.browser)
+        self.session_pool.start()
+        return self.session_pool
+
+    def close_session_pool(self):
+        '''This closes the worker sessions of the session pool (if it was started). The pool starts them again if it is needed later'''
+        if self.session_pool:
+            self.session_pool.close()
+
+    def close_sessions(self):
+        '''This closes the extra sessions (the session pool and the profile refresher) when the app exits. The main session is left to the browser'''
+        self.is_running = False
+        self.close_session_pool()
+        if self.profile_refresher:
+            self.profile_refresher.stop()
+
+    def start_profile_refresher(self):
+        '''This starts refreshing the stalest cached profiles in a background session. Like the session pool, it uses the cookies of the main session, so this must be called after signing in.'''
+        if self.profile_refresher is None:
+            from app.bot.profile_refresher import ProfileRefresher
+            self.profile_refresher = ProfileRefresher(self.browser)
+        self.profile_refresher.start()
+        return self.profile_refresher
+
+    def start_enrichment(self):
+        '''This starts the profile refresher (if it is enabled and the main session is signed in), which fills in the expensive fields of the profiles that only have their core record and refreshes the stale ones'''
+        if Config.PROFILE_REFRESHER_ENABLED and self.signed_in:
+            self.start_profile_refresher()
 
     def delete_replies(self):
         """Deletes all replies from the user's X account"""
+        import app.bot.delete_interactions as delete_interactions
         success = delete_interactions.delete_all_replies(self.browser.driver, self.logger, self.username)
         if success:
             self.logger.info("All replies deleted successfully.")
@@ -150,6 +427,7 @@ class XBot:
 
     def delete_likes(self):
         """Deletes all likes from the user's X account"""
+        import app.bot.delete_interactions as delete_interactions
         success = delete_interactions.delete_all_likes(self.browser.driver, self.logger, self.username)
         if success:
             self.logger.info("All likes deleted successfully.")
@@ -160,6 +438,8 @@ class XBot:
         self.logger.info("Stopping bot")
         self.is_running = False
         self.browser.set_stop_get_following(True)
+        if self.profile_refresher:
+            self.profile_refresher.stop()
         self.logger.info("Bot finished running.")
 
     def stop_get_following(self):
@@ -9,54 +9,215 @@ from selenium.common.exceptions import WebDriverException, TimeoutException, NoS
 from app.database.mongo_manager import MongoManager
 from app.configuration.configuration import Config
 from time import sleep
+import threading
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+import time
+from app.bot.scroll_collector import ScrollCollector
+from app.bot.page_scripts import FOLLOW_VISIBLE_CELLS, LIST_VISIBLE_TWEETS, WAIT_FOR_PAGE_STATE
+from app.bot.network_capture import NetworkCapture
 import app.decorators.decorators as decorators
+from app.bot.pacing import pacer
+from app.bot.tab_manager import TabManager
+from app.bot.session_store import session_store
+from app.bot.chrome_launcher import ensure_chrome_running
+from app.bot.profile_cache import ProfileCache, FIELD_GROUPS, CORE_GROUPS
 from app.logger.logger import logger, clear_log_file
 
+# URL patterns that are blocked in lean browser mode (see `Config.LEAN_BROWSER`)
+LEAN_BLOCKED_URLS = [
+    '*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.mp4', '*.m3u8', '*.m4s', '*.ts', '*.webm', '*.mp3',
+    '*.woff', '*.woff2', '*.ttf', '*.otf',
+    '*pbs.twimg.com/media*', '*video.twimg.com*', '*abs.twimg.com/sticky*',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*ads-twitter.com*', '*analytics.twitter.com*', '*t.co/i/adsct*',
+]
+
+# CSS selectors of a single profile cell on the Following page and on the "Followers you know" page
+FOLLOWING_CELL_SELECTOR = 'div[aria-label="Timeline: Following"] div[class="css-175oi2r r-1adg3ll r-1ny4l3l"]'
+FOLLOWERS_YOU_KNOW_CELL_SELECTOR = 'div[aria-label="Timeline: Followers you know"] button[data-testid="UserCell"]'
+
+# Multipliers of the abbreviated counts that X shows (eg: 12.3K or 1.2M)
+COUNT_SUFFIXES = {'K': 1000, 'M': 1000000, 'B': 1000000000}
+
+def parse_count(text: str) -> int:
+    '''This parses a count as X shows it (eg: '1,234', '12K', '12.3K' or '1.2M') into an int. Raises ValueError if it isn't a count'''
+    text = text.strip().replace(',', '').upper()
+    multiplier = 1
+    if text and text[-1] in COUNT_SUFFIXES:
+        multiplier = COUNT_SUFFIXES[text[-1]]
+        text = text[:-1]
+    try:
+        return int(Decimal(text) * multiplier)
+    except InvalidOperation:
+        raise ValueError(f"Not a count: {text}")
+
 class VerificationRequiredException(Exception):
     """Custom exception for when verification is required during login."""
     pass
 
+def get_worker_id(role: str, number: int = None) -> str:
+    '''
+    This returns the id of a worker session, which also names its user data directory (AutoPoster-<worker id> in `Config.CHROME_PROFILES_PATH`, next to the main session's AutoPoster).
+    The id starts with the role of the session (eg: 'pool' for the sessions of a `SessionPool`, 'refresher' for the `ProfileRefresher`), followed by `number` if the role has several sessions, so the sessions of different roles never share a directory.
+    '''
+    return role if number is None else f'{role}-{number}'
+
 class XController:
 
-    def __init__(self) -> None:
-        clear_log_file()
-        self.initialize_chrome_driver()
-        self.driver.get("https://x.com/home")
-        self.driver.maximize_window()
-        self.window_handles = self.driver.window_handles
+    def __init__(self, worker_id: str = None, db_manager: MongoManager = None, start: bool = True) -> None:
+        '''
+        `worker_id` is set for the extra sessions (see `get_worker_id`), eg: of a `SessionPool`. Those sessions share the `db_manager` of the main session and only visit profiles, so they don't load the target lists or check the lock page.
+        If `start` is False, Chrome isn't launched and MongoDB isn't connected yet, so the caller can run `start_driver`, `start_database` and `check_account_lock` itself (eg: in parallel, see app/startup.py).
+        '''
+        self.worker_id = worker_id
+        if worker_id is None:
+            clear_log_file()
         self.logger = logger(__name__)
-        self.db_manager = MongoManager()
-        self.following = self.db_manager.get_following_list()
-        self.added_people = self.db_manager.get_added_list()
+        self.attached = Config.CHROME_ATTACH and worker_id is None
+        self.driver = None
+        self.tabs = None
+        self.db_manager = db_manager
         self.stop_get_following = False
         self.stop_add_process = False
-
-        # Check if the account is locked after loading the home page
+        self.pacer = pacer
+        self.profile_cache = ProfileCache(self)
+        self.following_count_cache = {} # username: (following number, time.monotonic() when it was read)
+        self.following = []
+        self.added_people = []
+        self.is_account_locked = False
+
+        if start:
+            self.start_driver()
+            self.start_database()
+            self.check_account_lock()
+
+    def start_driver(self):
+        '''This launches (or attaches to) Chrome and opens the home page of X'''
+        self.initialize_chrome_driver()
+        if not (self.attached and self.driver.current_url.startswith('https://x.com/')):
+            self.driver.get("https://x.com/home")
+        if not Config.LEAN_BROWSER and not self.attached:
+            self.driver.maximize_window()
+        # Request blocking only applies to the tab it was set up in, so every worker tab gets it too
+        self.tabs = TabManager(self.driver, on_new_tab=self._block_heavy_requests if Config.LEAN_BROWSER else None)
+
+    def start_database(self):
+        '''This connects to MongoDB (unless a `db_manager` was passed in) and loads the following and added lists. Worker sessions don't need the lists'''
+        self.db_manager = self.db_manager or MongoManager()
+        if self.worker_id is None:
+            self.following = self.db_manager.get_following_list()
+            self.added_people = self.db_manager.get_added_list()
+            self.profile_cache.rebuild()
+
+    def check_account_lock(self):
+        '''This checks if the account is locked after loading the home page and sets `is_account_locked`. Worker sessions skip it'''
+        if self.worker_id is not None:
+            return
         self.is_account_locked = self.is_account_locked_page_open()
         if self.is_account_locked:
             self.logger.warning("Detected that the X account is locked.")
 
     def initialize_chrome_driver(self):
         '''This method initializes the Chrome driver and creates a `driver` attribute for the class'''
+        if self.attached:
+            self._attach_to_chrome()
+            return
+
         chrome_options = Options() 
         chrome_options.add_experimental_option("detach", False)
         chrome_options.add_argument('--profile-directory=Profile 11') # This profile is for the fake account
         
-        # Use a unique user data directory for this project
-        chrome_options.add_argument(f"--user-data-dir={Config.CHROME_PROFILES_PATH}/AutoPoster")
-        
-        # Specify a different port for Chrome DevTools
-        chrome_options.add_argument("--remote-debugging-port=9223")
+        if self.worker_id is None:
+            # Use a unique user data directory for this project
+            chrome_options.add_argument(f"--user-data-dir={Config.CHROME_PROFILES_PATH}/AutoPoster")
+
+            # Specify a different port for Chrome DevTools
+            chrome_options.add_argument("--remote-debugging-port=9223")
+        else:
+            # Two Chrome instances can't share a user data directory, so every worker session gets its own (see `get_worker_id`).
+            # The worker is logged in by copying the cookies of the main session (see `load_session_cookies`)
+            chrome_options.add_argument(f"--user-data-dir={Config.CHROME_PROFILES_PATH}/AutoPoster-{self.worker_id}")
         
         # Disable the use of a single Chrome instance
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
         
+        if Config.LEAN_BROWSER:
+            self._add_lean_options(chrome_options)
+
+        if Config.NETWORK_CAPTURE:
+            # The performance log contains the Network events which are needed to read the GraphQL responses
+            chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
         # Use a service object to set additional options
         service = ChromeService(executable_path=Config.CHROMEDRIVER_EXE_PATH)
 
         self.driver = webdriver.Chrome(service=service, options=chrome_options)
+
+        if Config.LEAN_BROWSER:
+            self._block_heavy_requests()
+
+        self.network_capture = NetworkCapture(self.driver, Config.NETWORK_CAPTURE_RECORD_DIR) if Config.NETWORK_CAPTURE else None
+
+    def _attach_to_chrome(self):
+        '''This attaches the driver to the Chrome that runs on the debugging port (launching it first if it isn't running, see app/bot/chrome_launcher.py), so a warm browser that is already logged in is reused'''
+        if not ensure_chrome_running():
+            raise WebDriverException(f"No Chrome is running on {Config.CHROME_DEBUGGER_ADDRESS}")
+        chrome_options = Options()
+        chrome_options.add_experimental_option("debuggerAddress", Config.CHROME_DEBUGGER_ADDRESS)
+        if Config.LEAN_BROWSER:
+            chrome_options.page_load_strategy = 'eager'
+        if Config.NETWORK_CAPTURE:
+            chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        service = ChromeService(executable_path=Config.CHROMEDRIVER_EXE_PATH)
+
+        self.driver = webdriver.Chrome(service=service, options=chrome_options)
+        self.logger.info(f"Attached to the running Chrome on {Config.CHROME_DEBUGGER_ADDRESS}")
+
+        if Config.LEAN_BROWSER:
+            self._block_heavy_requests()
+
+        self.network_capture = NetworkCapture(self.driver, Config.NETWORK_CAPTURE_RECORD_DIR) if Config.NETWORK_CAPTURE else None
+
+    def _add_lean_options(self, chrome_options: Options):
+        '''This adds the options of lean browser mode: headless, a fixed viewport, no images and the eager page load strategy (`driver.get` returns once the DOM is ready instead of waiting for every image and script)'''
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument(f"--window-size={Config.VIEWPORT_WIDTH},{Config.VIEWPORT_HEIGHT}")
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+        chrome_options.add_argument("--mute-audio")
+        chrome_options.page_load_strategy = 'eager'
+
+    def _block_heavy_requests(self):
+        '''This uses the Chrome DevTools Protocol to block requests for images, media, fonts and trackers (see `LEAN_BLOCKED_URLS`) in the current tab'''
+        try:
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': LEAN_BLOCKED_URLS})
+        except WebDriverException as e:
+            self.logger.warning(f"Could not block heavy requests in lean browser mode: {e}")
         
+    def get_session_cookies(self):
+        '''This returns the cookies of the current X session so that other sessions can be logged in with them'''
+        return self.driver.get_cookies()
+
+    def load_session_cookies(self, cookies: list):
+        '''This adds `cookies` (taken from another session with `get_session_cookies`) to this session and reloads X so that this session is logged in to the same account'''
+        try:
+            # Cookies can only be added for the domain that is currently open
+            self.driver.get('https://x.com')
+            for cookie in cookies:
+                cookie.pop('sameSite', None) # Chrome rejects some of the sameSite values that get_cookies returns
+                try:
+                    self.driver.add_cookie(cookie)
+                except WebDriverException:
+                    self.logger.warning(f"Could not add the cookie: {cookie.get('name')}")
+            self.driver.get('https://x.com/home')
+            self.logger.info(f'Loaded {len(cookies)} session cookies')
+            return True
+        except Exception as e:
+            self.logger.exception(f'Failed to load session cookies. Error: {str(e)}')
+            return False
+
     def check_user_exists(self, username):
         '''This method checks if the specified user exists on X. If the user exists, it returns the account name, otherwise it returns False.'''
         def check_stop_event():
@@ -93,12 +254,15 @@ class XController:
             return False
 
     def open_page(self, url: str):
-        '''This opens `url` and maximizes the window'''
+        '''This opens `url` and maximizes the window. In lean browser mode the viewport is fixed at launch, so the window is left as it is.'''
         try:
             self.driver.get(url)
-            self.driver.set_window_size(1920, 1080)  # Set a large default size
+            if Config.LEAN_BROWSER:
+                self.logger.info(f'Opened this url: {url}')
+                return True
+            self.driver.set_window_size(Config.VIEWPORT_WIDTH, Config.VIEWPORT_HEIGHT)  # Set a large default size
             self.driver.maximize_window()
-            if self.driver.get_window_size()['width'] < 1920:
+            if self.driver.get_window_size()['width'] < Config.VIEWPORT_WIDTH:
                 self.driver.fullscreen_window()
             self.logger.info(f'Opened this url: {url} and maximized the window')
             return True
@@ -106,28 +270,53 @@ class XController:
             self.logger.exception(f'Cannot open this url: {url}')
             return False 
 
-    @decorators.rest
-    def sign_in(self, username, password, email):
-        '''This method checks if the user is logged in to X, if not, it will sign in to the specified account'''
-        self.driver.get('https://x.com/login') # go to X
-        self.logger.info('Opened X login page')
+    def wait_for_page_state(self, expected: list = None, timeout: float = 10):
+        '''This classifies the open page in a single browser call that returns as soon as the page is in one of the `expected` states (any known state if None), or after `timeout` seconds with the current state. The states are in `CLASSIFY_PAGE`. Returns a dict with the state (and the username if logged in)'''
         try:
-            home_timeline = WebDriverWait(self.driver, 6).until(EC.presence_of_element_located((By.XPATH, '//div[@aria-label="Home timeline"]')))
-            if home_timeline.is_displayed(): # if the timeline is displayed, that means that X opened and a user is logged in
-                self.logger.info('X login page redirected to home timeline')
-                # check if the username on X is the same as the one that is passed as argument
-                username_on_x = self.driver.find_element(By.XPATH, '//button[@aria-label="Account menu"]//span[contains(text(), "@")]').text
-                if username_on_x.strip('@') == username:
-                    self.logger.info(f'{username} is already logged in to X')
-                else: # handle the case where a different account is logged in
-                    self.logger.info(f'{username} is not logged in to X. Instead, {username_on_x} is logged in.')
-                    self._logout()
-                    self._login(username, password, email)
-        except TimeoutException: # if the timeline is not displayed, that means that a user is not logged in
-            self.logger.info('User is not logged in to X')
+            self.driver.set_script_timeout(timeout + 5)
+            page = self.driver.execute_async_script(WAIT_FOR_PAGE_STATE, expected or [], int(timeout * 1000))
+            self.logger.info(f"Page state: {page}")
+            return page or {'state': 'unknown'}
+        except Exception as e:
+            self.logger.warning(f"Failed to classify the page. Error: {str(e)}")
+            return {'state': 'unknown'}
+
+    @decorators.paced('navigate')
+    def sign_in(self, username, password, email):
+        '''This method checks if the user is logged in to X, if not, it will sign in to the specified account. The stored cookies of the account (see `SessionStore`) are tried before the login page, and the cookies are stored again after every successful sign in'''
+        username = username.strip('@')
+        page = self.probe_session()
+        if page.get('username') != username:
+            cookies = session_store.load(username)
+            if cookies and self.load_session_cookies(cookies):
+                page = self.probe_session()
+                if page.get('username') == username:
+                    self.logger.info(f'Logged in {username} with the stored session cookies')
+                else:
+                    self.logger.info(f'The stored session cookies of {username} were rejected')
+                    session_store.delete(username)
+
+        if page.get('username') == username:
+            self.logger.info(f'{username} is already logged in to X')
+        else:
+            if page['state'] == 'logged_in':
+                # handle the case where a different account is logged in
+                self.logger.info(f"{username} is not logged in to X. Instead, @{page['username']} is logged in.")
+                self._logout()
+            else:
+                self.logger.info('User is not logged in to X')
+                self.driver.get('https://x.com/login')
+                self.logger.info('Opened X login page')
             self._login(username, password, email)
+        session_store.save(username, self.get_session_cookies())
+
+    def probe_session(self, timeout: float = 5):
+        '''This checks whether the session is logged in, and to which account, by classifying the home page. The home page is only opened if another page is open. Returns the page state (see `wait_for_page_state`)'''
+        if not self.driver.current_url.startswith('https://x.com/home'):
+            self.driver.get('https://x.com/home')
+        return self.wait_for_page_state(['logged_in', 'logged_out', 'login_username', 'locked'], timeout)
 
-    @decorators.rest
+    @decorators.paced('navigate')
     def _logout(self):
         '''Helper method to log out the current user'''
         self.logger.info('Logging out the current user')
@@ -143,45 +332,56 @@ class XController:
         login_button = WebDriverWait(self.driver, 5).until(EC.presence_of_element_located((By.XPATH, '//a[@data-testid="loginButton"]')))
         login_button.click()
 
-    @decorators.rest
     def _login(self, username, password, email):
-        '''Helper method to perform the actual login process'''
+        '''Helper method to perform the actual login process. Every step waits for whichever page comes next (eg: the email challenge or the password) instead of waiting for each possible page in turn'''
         try:
-            # Find and enter username
-            username_input = WebDriverWait(self.driver, 5).until(EC.presence_of_element_located((By.XPATH, '//input[@autocomplete="username"]')))
-            username_input.send_keys(username)
-            username_input.send_keys(Keys.ENTER)
-            self.logger.info('Successfully entered username')
-
-            # If a phone number or email is required because suspicious activity is detected, enter the email
-            try:
-                WebDriverWait(self.driver, 2).until(EC.presence_of_element_located((By.XPATH, '//span[contains(text(), "Enter your phone number or email address")]')))
-                email_input = self.driver.find_element(By.XPATH, '//input[@data-testid="ocfEnterTextTextInput"]')
-                email_input.send_keys(email)
-                email_input.send_keys(Keys.ENTER)
-                self.logger.info('Successfully entered email')
-            except TimeoutException: # if a timeout exception is raised, that means that the popup asking for email or phone number didn't display
-                self.logger.info('No popup asking for email or phone number')
-                pass
-            
-            # Wait for password input to be present
-            password_input = WebDriverWait(self.driver, 5).until(EC.presence_of_element_located((By.XPATH, '//input[@name="password"]')))
-            password_input.send_keys(password)
-            password_input.send_keys(Keys.ENTER)
-            self.logger.info('Successfully entered password')
-
-            # Check for verification popup
-            try:
-                WebDriverWait(self.driver, 3).until(EC.presence_of_element_located((By.XPATH, '//span[contains(text(), "verification")]')))
-                raise VerificationRequiredException("Verification required for X account. All two-factor authentication methods for X account should be disabled.")
-            except TimeoutException:
-                # Verification popup not found, continue with login process
-                self.logger.info('No verification popup')
-                pass
-
-            # Wait for the home timeline to be present, indicating successful login
-            WebDriverWait(self.driver, 2).until(EC.presence_of_element_located((By.XPATH, '//div[@aria-label="Home timeline"]')))
-            self.logger.info('Successfully logged in to X')
+            # X can push back at any step (the Retry button or the rate limit snackbar), so those are always waited for
+            pushback_states = ['retry', 'rate_limited']
+            states = ['login_username', 'email_challenge', 'login_password', 'verification', 'locked', 'logged_in']
+            done = set() # the steps that were done since the login page was opened
+            page = self.wait_for_page_state(states + pushback_states, 5)
+            for _ in range(8):
+                state = page['state']
+                if state in done:
+                    # The wait timed out while the page of a step that was done is still open (eg: a slow submit), so keep waiting instead of typing it again
+                    self.logger.info(f'Still waiting for the next page after {state}')
+                    page = self.wait_for_page_state(states + pushback_states, 5)
+                    continue
+                if state == 'logged_in':
+                    self.logger.info('Successfully logged in to X')
+                    self.pacer.report_success()
+                    return
+                if state in pushback_states:
+                    # Back off and start the login from the beginning, since the steps that were done are lost
+                    self.pacer.report_pushback(f"{state} during the login")
+                    self.pacer.wait_until_closed()
+                    self.driver.get('https://x.com/login')
+                    states = ['login_username', 'email_challenge', 'login_password', 'verification', 'locked', 'logged_in']
+                    done = set()
+                    page = self.wait_for_page_state(states + pushback_states, 10)
+                    continue
+                if state == 'verification':
+                    raise VerificationRequiredException("Verification required for X account. All two-factor authentication methods for X account should be disabled.")
+                if state == 'locked':
+                    raise Exception('The X account is locked')
+                if state == 'login_username':
+                    self._enter_login_text('//input[@autocomplete="username"]', username)
+                    self.logger.info('Successfully entered username')
+                elif state == 'email_challenge':
+                    # A phone number or email is required because suspicious activity is detected
+                    self._enter_login_text('//input[@data-testid="ocfEnterTextTextInput"]', email)
+                    self.logger.info('Successfully entered email')
+                elif state == 'login_password':
+                    self._enter_login_text('//input[@name="password"]', password)
+                    self.logger.info('Successfully entered password')
+                else:
+                    raise Exception(f'Unexpected page during the login: {page}')
+                # The step that was just done can't come up again
+                done.add(state)
+                if state in states:
+                    states.remove(state)
+                page = self.wait_for_page_state(states + pushback_states, 5)
+            raise Exception(f'The login did not finish. Last page: {page}')
         except VerificationRequiredException as ve:
             self.logger.error(str(ve))
             raise  # Re-raise the exception to be caught by the calling method
@@ -189,6 +389,15 @@ class XController:
             self.logger.exception(f'Failed to log in to X. Error: {str(e)}')
             raise  # Re-raise the exception to be caught by the calling method
 
+    def _enter_login_text(self, xpath: str, text: str):
+        '''Helper method to replace the text of the login input at `xpath` with `text` and submit it'''
+        text_input = self.driver.find_element(By.XPATH, xpath)
+        # clear() doesn't reset X's (React) inputs, so the old text is selected and deleted instead
+        text_input.send_keys(Keys.CONTROL, 'a')
+        text_input.send_keys(Keys.DELETE)
+        text_input.send_keys(text)
+        text_input.send_keys(Keys.ENTER)
+
     def set_stop_add_process(self, stop_event):
         '''This method sets the boolean value of `self.stop_add_process` to `stop_event`'''
         self.stop_add_process = stop_event
@@ -196,31 +405,32 @@ class XController:
     def update_added_people(self):
         '''This method fetches the latest data from the 'added' collection in MongoDB and updates `self.added_people`'''
         self.added_people = self.db_manager.get_added_list()
+        self.profile_cache.rebuild()
+
+    def get_following_number(self, username: str, max_age: float = Config.FOLLOWING_COUNT_TTL):
+        '''This method finds the number of people that the user is following on X. The number is cached, so the profile is only opened if the cached number is older than `max_age` seconds (0 forces a fresh number)'''
+        cached = self.following_count_cache.get(username)
+        if cached and time.monotonic() - cached[1] < max_age:
+            self.logger.info(f'Using the cached following number of {username}: {cached[0]}')
+            return cached[0]
 
-    def get_following_number(self, username: str):
-        '''This method finds the number of people that the user is following on X'''
         try:
             self.open_page(f'https://x.com/{username}')
             sleep(2) # keep this sleep for the latest and correct following number to load
             following_element = WebDriverWait(self.driver, 5).until(EC.presence_of_element_located((By.XPATH, f'//div[@aria-label="Home timeline"]//a[@href="/{username}/following"]//span')))
-            following_text = following_element.text.replace(',', '')
-            
-            # Handle the case where the number contains K. Eg: 32.1K or 12K
-            if 'K' in following_text:
-                following_text = following_text.replace('K', '')
-                if '.' in following_text:
-                    following_number = int(following_text) * 100
-                else:
-                    following_number = int(following_text) * 1000
-            else:
-                following_number = int(following_text)
-            
+            following_number = parse_count(following_element.text)
+            self.following_count_cache[username] = (following_number, time.monotonic())
             return following_number
             
         except Exception as e:
             self.logger.exception(f'Failed to get the number of people that the user is following on X. Error: {str(e)}')
             return 0
 
+    def mark_following_changed(self):
+        '''This records that the user followed or unfollowed people, so the cached following number is dropped and the next get_following can't be skipped'''
+        self.following_count_cache.clear()
+        self.db_manager.save_sync_state('following', {'changed': True})
+
     def remove_person_from_db(self, link: str):
         '''This method removes a profile with `link` from the 'following' collection in MongoDB'''
         self.db_manager.delete_following_profile(link)
@@ -230,6 +440,7 @@ class XController:
         for person in self.added_people:
             if person['link'] == link:
                 self.added_people.remove(person)
+                self.profile_cache.remove(link)
                 break
 
     def go_to_following(self, username: str):
@@ -246,10 +457,13 @@ class XController:
         '''This method sets the boolean value of `self.stop_get_following` to `stop_event`'''
         self.stop_get_following = stop_event
 
-    def get_following(self):
+    def get_following(self, pool=None, on_profile=None, following_count: int = None):
         """
         Goes through the following page and scrapes the data of the profiles that the user is following.
         Stores the data in MongoDB if it's not already present.
+        If `pool` (a `SessionPool`) is passed, the new profiles are scraped by up to `Config.SCRAPE_CONCURRENCY` of its sessions at the same time. `on_profile(data)` is called (in the thread of the session) for every scraped profile, so the GUI can show the progress.
+        The following page is newest first, so scrolling stops after `Config.FOLLOWING_KNOWN_RUN` stored profiles in a row (an incremental sync). Every `Config.FOLLOWING_RECONCILE_INTERVAL` seconds the whole page is scrolled instead (a full sync), and the profiles that are no longer followed are recorded as unfollowed.
+        `following_count` (the following number shown on the profile) is saved with the sync state once the sync is complete.
         """
         def check_stop_event():
             if self.stop_get_following:
@@ -259,65 +473,79 @@ class XController:
             return False
 
         try:
-            timeline_div = WebDriverWait(self.driver, 10).until(
+            WebDriverWait(self.driver, 10).until(
                 EC.presence_of_element_located((By.XPATH, '//div[@aria-label="Timeline: Following"]'))
             )
 
-            last_height = self.driver.execute_script("return document.body.scrollHeight")
-            scroll_pause_time = 0.7
-            latest_following = []
-
-            while True:
-                if check_stop_event():
-                    self.logger.info("Aborting get_following.")
-                    return True
-
-                self.logger.info('Scrolling down to load more profiles')
-                self.driver.execute_script("window.scrollBy(0, 600);")
-                sleep(scroll_pause_time)
-
-                profile_elements = timeline_div.find_elements(By.XPATH, './/div[@class="css-175oi2r r-1adg3ll r-1ny4l3l"]')
-                self.logger.info(f'Scraping data from {len(profile_elements)} profiles')
+            full_sync = self.is_full_sync_due(self.db_manager.get_sync_state('following'))
+            stored_links = {profile['link'] for profile in self.following}
+            known_run = 0
+
+            def on_step(cells):
+                '''This stops an incremental sync once `Config.FOLLOWING_KNOWN_RUN` stored profiles in a row were collected'''
+                nonlocal known_run
+                self._drain_network_capture()
+                if full_sync:
+                    return False
+                for cell in cells:
+                    known_run = known_run + 1 if cell['link'] in stored_links else 0
+                return known_run >= Config.FOLLOWING_KNOWN_RUN
+
+            self.logger.info(f"Scrolling through the following page to collect the profiles ({'full' if full_sync else 'incremental'} sync)")
+            collector = ScrollCollector(self.driver, FOLLOWING_CELL_SELECTOR)
+            cells = collector.collect(should_stop=check_stop_event, on_step=on_step)
+            if cells is None:
+                self.logger.info("Aborting get_following.")
+                return True
+            latest_following = [cell['link'] for cell in cells if cell['link']]
 
-                for element in profile_elements:
-                    if check_stop_event():
-                        self.logger.info("Aborting get_following.")
-                        return True
-                    try:
-                        link = element.find_element(By.XPATH, './/a[@role="link"]').get_attribute('href')
-                        if link not in latest_following:
-                            latest_following.append(link)
-                    except NoSuchElementException:
-                        self.logger.warning("Profile link not found. Skipping.")
-                        continue
+            self.logger.info(f"Scraped {len(latest_following)} profiles")
 
-                # Calculate new scroll height and compare with last scroll height
-                new_height = self.driver.execute_script("return document.body.scrollHeight")
-                if new_height == last_height:
-                    # Try scrolling a bit more to ensure we've reached the bottom
-                    self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                    sleep(scroll_pause_time)
-                    new_height = self.driver.execute_script("return document.body.scrollHeight")
-                    if new_height == last_height:
-                        # If heights are still the same, we've reached the end of the page
-                        self.logger.info('Reached the end of the page')
+            # store the profiles that the user is following if they're not already in MongoDB
+            known_links = self.db_manager.get_existing_following_links(latest_following)
+            new_links = [link for link in latest_following if link not in known_links]
+            self.logger.info(f"{len(new_links)} of the profiles are not in MongoDB yet")
+            # A full sync whose scroll stopped early (eg: a network stall) isn't complete, so it doesn't record unfollows and is done again next time
+            full_sync = self._record_following_changes(latest_following, new_links, full_sync, following_count)
+
+            new_profiles = []
+            lock = threading.Lock()
+
+            def scrape(browser, profile_link):
+                # Only the core record is scraped here, the expensive fields are filled in later by the profile refresher
+                data = self.get_captured_profile(profile_link) or self.profile_cache.get_profile(profile_link, CORE_GROUPS, browser)
+                if not data:
+                    return
+                with lock:
+                    self.following.append(data)
+                    self.profile_cache.add(data)
+                    new_profiles.append(data)
+                    # Save in small batches so that a stopped or failed run keeps most of its work
+                    if len(new_profiles) >= 25:
+                        self.db_manager.save_profiles(new_profiles)
+                        new_profiles.clear()
+                if on_profile:
+                    on_profile(data)
+
+            if pool:
+                pool.run(new_links, scrape, lambda: not self.stop_get_following, limit=Config.SCRAPE_CONCURRENCY)
+            else:
+                for profile_link in new_links:
+                    if self.stop_get_following:
                         break
-                last_height = new_height
+                    scrape(self, profile_link)
 
-            self.logger.info(f"Scraped {len(latest_following)} profiles")
-            
-            for profile_link in latest_following:
-                if check_stop_event():
-                    self.logger.info("Aborting get_following.")
-                    return True
+            self.db_manager.save_profiles(new_profiles)
+            if check_stop_event():
+                self.logger.info("Aborting get_following.")
+                return True
 
-                # store a profile that the user is following if it's not already in MongoDB
-                if not self.db_manager.is_profile_in_following(profile_link): 
-                    data = self.scrape_profile_data(profile_link)
-                    self.following.append(data)
-                    self.db_manager.save_profile(data)
+            state = {'last_sync': datetime.now(), 'changed': False, 'following_count': following_count}
+            if full_sync:
+                state['last_full_sync'] = state['last_sync']
+            self.db_manager.save_sync_state('following', state)
 
-            # Note: The logic for deleting a profile from the following collection if the user has unfollowed that profile is not implemented because papa told me to keep all the profiles that the user has ever followed.
+            # Note: Profiles that the user has unfollowed are not deleted from the following collection because papa told me to keep all the profiles that the user has ever followed. A full sync marks them with 'unfollowed_at' instead (see _record_following_changes).
 
             return True
 
@@ -328,63 +556,108 @@ class XController:
             self.logger.exception(f'Failed to scrape profile links. Error: {str(e)}')
             return False
 
+    def _record_following_changes(self, latest_following: list, new_links: list, full_sync: bool, following_count: int = None):
+        '''
+        This records the new follows. After a full sync, the stored profiles that weren't on the following page are recorded as unfollowed, and the unfollowed ones that were on it again as followed.
+        The unfollows are only recorded if the number of collected profiles is at least the following number shown on the profile (`following_count`), since a scroll that stopped early would record everyone below it as unfollowed.
+        Nothing is deleted: papa wants to keep all the profiles that the user has ever followed. Returns True if the full sync was complete.
+        '''
+        followed, unfollowed = list(new_links), []
+        if full_sync:
+            latest = set(latest_following)
+            followed_links = self.db_manager.get_followed_links()
+            stored_links = {profile['link'] for profile in self.following}
+            new = set(new_links)
+            followed += [link for link in latest_following if link in stored_links and link not in followed_links and link not in new]
+            if following_count is not None and len(latest) >= following_count:
+                unfollowed = [link for link in followed_links if link not in latest]
+            else:
+                self.logger.warning(f"Not recording unfollows because the full sync collected {len(latest)} profiles but the following number is {following_count}")
+                full_sync = False
+        self.db_manager.record_following_changes(followed, unfollowed)
+        return full_sync
+
+    def is_full_sync_due(self, sync_state: dict) -> bool:
+        '''This checks if the next get_following has to scroll the whole following page (no full sync was done in the last `Config.FOLLOWING_RECONCILE_INTERVAL` seconds)'''
+        last_full_sync = sync_state.get('last_full_sync')
+        return last_full_sync is None or (datetime.now() - last_full_sync).total_seconds() >= Config.FOLLOWING_RECONCILE_INTERVAL
+
+    def _drain_network_capture(self, cells=None):
+        '''This parses the GraphQL responses that were loaded since the last call (if network capture is on). It can be passed as the `on_step` callback of `ScrollCollector.collect` and never stops the scrolling.'''
+        if self.network_capture:
+            self.network_capture.drain()
+        return False
+
+    def get_captured_profile(self, link: str):
+        '''This returns the profile data of `link` from the captured GraphQL responses, or None if network capture is off or the profile wasn't captured'''
+        if not self.network_capture:
+            return None
+        profile = self.network_capture.users.get(link)
+        if not profile:
+            return None
+        self.logger.info(f"Using the captured profile data of {link}")
+        captured_at = datetime.now()
+        # followers_you_follow and more_info aren't in the responses, so they have no scraped_at and the profile refresher fills them in later
+        return {
+            **profile,
+            'followers_you_follow': [],
+            'more_info': '',
+            'reply': True,  # Default to True when adding a new profile
+            'scraped_at': {'counts': captured_at, 'core': captured_at},
+            'completeness': 'core',
+        }
+
     def unfollow_users(self, count):
         """
         Unfollows `count` users that the user is currently following. Removes people from the mongodb collection as they get unfollowed.
         """
         try:
             self.logger.info(f"Starting to unfollow {count} users.")
-            timeline_div = WebDriverWait(self.driver, 10).until(
+            WebDriverWait(self.driver, 10).until(
                 EC.presence_of_element_located((By.XPATH, '//div[@aria-label="Timeline: Following"]'))
             )
 
-            last_height = self.driver.execute_script("return document.body.scrollHeight")
-            scroll_pause_time = 0.7
-            unfollowed_profiles = []
+            # Scroll one step at a time so that the collected cells are still in the DOM when their buttons are clicked
+            collector = ScrollCollector(self.driver, FOLLOWING_CELL_SELECTOR, max_scrolls=1, with_elements=True)
+            unfollowed_profiles = set()
 
             while True:
-                profile_elements = timeline_div.find_elements(By.XPATH, './/div[@class="css-175oi2r r-1adg3ll r-1ny4l3l"]')
-              
-                for element in profile_elements:
+                cells, ended = collector.step()
+
+                for cell in cells:
                     if len(unfollowed_profiles) >= count: # if the desired number of profiles have been unfollowed, exit the method
                         self.logger.info(f"Finished unfollowing {count} users.")
                         return True
+                    link = cell['link']
+                    if not link or link in unfollowed_profiles or 'element' not in cell:
+                        continue
                     try:
-                        link = element.find_element(By.XPATH, './/a[@role="link"]').get_attribute('href')
-                        if link not in unfollowed_profiles:
-                            # Click the Following button to trigger the Unfollow popup
-                            button = element.find_element(By.XPATH, './/button[contains(@aria-label, "Following ")]')
-                            if not button.is_displayed():
-                                self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", button)
-                                sleep(0.5)  # Wait for scroll to complete
-                            button.click()
-                            unfollow_button = WebDriverWait(self.driver, 2).until(
-                                EC.presence_of_element_located((By.XPATH, '//div[@data-testid="confirmationSheetDialog"]//button[@data-testid="confirmationSheetConfirm"]'))
-                            )
-                            unfollow_button.click()
-                            sleep(0.2)
-                            unfollowed_profiles.append(link)
-                            self.remove_person_from_db(link)
+                        # Click the Following button to trigger the Unfollow popup
+                        self.pacer.acquire('unfollow')
+                        button = cell['element'].find_element(By.XPATH, './/button[contains(@aria-label, "Following ")]')
+                        if not button.is_displayed():
+                            self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", button)
+                            sleep(0.5)  # Wait for scroll to complete
+                        button.click()
+                        unfollow_button = WebDriverWait(self.driver, 2).until(
+                            EC.presence_of_element_located((By.XPATH, '//div[@data-testid="confirmationSheetDialog"]//button[@data-testid="confirmationSheetConfirm"]'))
+                        )
+                        unfollow_button.click()
+                        sleep(0.2)
+                        unfollowed_profiles.add(link)
+                        self.remove_person_from_db(link)
                     except WebDriverException as e:
                         self.logger.warning(f"WebDriverException occurred while clicking the unfollow button: {e}")
                         continue
 
-                # Calculate new scroll height and compare with last scroll height
-                new_height = self.driver.execute_script("return document.body.scrollHeight")
-                if new_height == last_height:
-                    # Try scrolling a bit more to ensure we've reached the bottom
-                    self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                    sleep(scroll_pause_time)
-                    new_height = self.driver.execute_script("return document.body.scrollHeight")
-                    if new_height == last_height:
-                        # If heights are still the same, we've reached the end of the page
-                        self.logger.info('Reached the end of the page')
-                        break
-                last_height = new_height
+                if len(unfollowed_profiles) >= count:
+                    self.logger.info(f"Finished unfollowing {count} users.")
+                    return True
+                if ended:
+                    self.logger.info('Reached the end of the page')
+                    break
 
-                self.logger.info('Scrolling down to load more profiles')
-                self.driver.execute_script("window.scrollBy(0, 600);")
-                sleep(scroll_pause_time)
+            return True
 
         except TimeoutException:
             self.logger.warning("The page might not have loaded properly.")
@@ -412,7 +685,6 @@ class XController:
             self.logger.exception(f"Error checking snackbar: {e}")
             return False
 
-    @decorators.rest
     def auto_follow(self, keywords, follow_at_once, total_follow_count, total_followed, get_is_running):
         '''
         This method automatically follows users based on the given keywords and `follow_at_once` value.
@@ -430,81 +702,48 @@ class XController:
             # Selector for bio
             bio_selector = 'div[class="css-146c3p1 r-bcqeeo r-1ttztb7 r-qvutc0 r-37j5jr r-a023e6 r-rjixqe r-16dba41 r-1h8ys4a r-1jeg54m"]'
 
-            # Initialize a set to keep track of profiles which have been checked
-            processed_profiles = set()
-
             # Follow people if the specified keywords are in the profile's bio and the profile
             last_height = self.driver.execute_script("return document.body.scrollHeight")
             scroll_pause_time = 0.7
             followed_profiles = 0
             total_followed_profiles = total_followed
 
-            while True:
-                profiles = self.driver.find_elements(By.XPATH, '//button[@data-testid="UserCell"]')
-                for profile in profiles:
-                    is_running = get_is_running()
-                    if not is_running: # if the is_running attribute in AutoFollow is false, that means that the auto-follow process has stopped
-                        return followed_profiles
-                    
-                    # Check for snackbar before attempting to follow
-                    if self.is_snackbar_displayed():
-                        self.logger.info('"You are unable to follow more people" snackbar displayed on X. Stopping auto-follow process')
-                        return followed_profiles
-
-                    try:
-                        # Extract the profile link as a unique identifier
-                        profile_link = profile.find_element(By.XPATH, './/a[@role="link"]').get_attribute('href')
-
-                        # Skip the profile if it's already checked
-                        if profile_link in processed_profiles:
-                            continue
-
-                        # Add the profile to processed profiles (this indicates that the profile has been checked)
-                        processed_profiles.add(profile_link)
-
-                        if total_followed_profiles >= total_follow_count:
-                            # If the total follow count is reached, break the loop
-                            self.logger.info(f"Reached total follow count of {total_follow_count}")
-                            return followed_profiles
-
-                        if followed_profiles >= follow_at_once:
-                            # If the follow at once limit is reached, break the loop
-                            self.logger.info(f"Reached follow at once limit of {follow_at_once}")
-                            return followed_profiles
-
-                        # Get the bio of the profile
-                        try:
-                            bio = profile.find_element(By.CSS_SELECTOR, bio_selector).text.lower()
-                            self.logger.debug(f"Profile bio: {bio}")
-                        except NoSuchElementException:
-                            bio = ""
-                            self.logger.debug("No bio found for this profile.")
-
-                        # Check if any keyword is in bio if the keywords list is not empty.
-                        # If any keyword is in the bio, follow the profile
-                        if not keywords or any(f' {keyword} ' in bio for keyword in keywords):
-                            try:
-                                follow_button = profile.find_element(By.XPATH, './/button[contains(@aria-label, "Follow ")]')
-
-                                # If the button isn't displayed, scroll the profile into view
-                                if not follow_button.is_displayed():
-                                    self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", profile)
-                                    sleep(0.5)
-
-                                follow_button.click()
-                                sleep(0.2)  # Short pause after each follow
-                                followed_profiles += 1
-                                total_followed_profiles += 1
-                    
-                            except Exception as e:
-                                self.logger.exception(f"Unexpected error when trying to follow: {e}")
+            # A single script call can click up to `follow_at_once` buttons with `Config.FOLLOW_CLICK_SPACING` seconds between them
+            self.driver.set_script_timeout(follow_at_once * Config.FOLLOW_CLICK_SPACING + 30)
 
-                    except NoSuchElementException:
-                        self.logger.warning("Profile link element not found. Skipping this profile.")
-                        continue
-                    except Exception as e:
-                        self.logger.exception(f"Error processing a profile: {e}")
-                        continue
+            while True:
+                is_running = get_is_running()
+                if not is_running: # if the is_running attribute in AutoFollow is false, that means that the auto-follow process has stopped
+                    return followed_profiles
+
+                if total_followed_profiles >= total_follow_count:
+                    # If the total follow count is reached, break the loop
+                    self.logger.info(f"Reached total follow count of {total_follow_count}")
+                    return followed_profiles
+
+                if followed_profiles >= follow_at_once:
+                    # If the follow at once limit is reached, break the loop
+                    self.logger.info(f"Reached follow at once limit of {follow_at_once}")
+                    return followed_profiles
+
+                # Check the newly loaded profiles and follow the matching ones in the page, as many as the pacer allows
+                remaining = min(follow_at_once - followed_profiles, total_follow_count - total_followed_profiles)
+                allowed = self.pacer.reserve('follow', remaining)
+                result = self.driver.execute_async_script(FOLLOW_VISIBLE_CELLS, keywords, allowed, int(Config.FOLLOW_CLICK_SPACING * 1000), bio_selector)
+                self.pacer.refund('follow', allowed - len(result['followed']))
+                if result.get('error'):
+                    self.logger.error(f"Error in the follow script: {result['error']}")
+                followed_profiles += len(result['followed'])
+                total_followed_profiles += len(result['followed'])
+                self.logger.debug(f"Checked {result['checked']} profiles and followed {len(result['followed'])} of them: {result['followed']}")
+
+                if result['snackbar']:
+                    self.logger.info('"You are unable to follow more people" snackbar displayed on X. Stopping auto-follow process')
+                    self.pacer.report_pushback('"unable to follow" snackbar')
+                    return followed_profiles
+
+                if len(result['followed']) >= allowed:
+                    continue # a limit was reached (handled at the start of the loop) or the pacer allowed fewer follows than the visible cells have
 
                 # Scroll down to load more profiles
                 self.driver.execute_script("window.scrollBy(0, 500);")
@@ -527,11 +766,14 @@ class XController:
             self.logger.exception(f'Failed to auto follow. Error: {str(e)}')
             return followed_profiles
 
-    @decorators.rest
-    def scrape_profile_data(self, link) -> dict:
+    @decorators.paced('navigate')
+    def scrape_profile_data(self, link, groups=None) -> dict:
         """
         Scrapes and returns data of an X profile.
+        The fields in the profile header (the 'counts' and 'core' field groups) are always scraped. The expensive groups ('followers_you_follow' and 'more_info') are only scraped if they are in `groups` (all the groups in `FIELD_GROUPS` by default).
+        The returned 'scraped_at' dict has the time at which each of the scraped groups was scraped.
         """
+        groups = FIELD_GROUPS if groups is None else groups
         def check_stop_event():
             '''This checks if `self.stop_add_process` is True. If it is, `self.set_stop_add_process(False)` is called and True is returned. Otherwise, False is returned. It is intended to detect if the Add button in the Bot Targets tab was clicked.'''
             if self.stop_add_process:
@@ -541,95 +783,96 @@ class XController:
             return False
         
         try:
-            # Open the profile in a new tab
-            self.driver.execute_script("window.open('');")
-            self.driver.switch_to.window(self.driver.window_handles[-1])
-            self.driver.get(link)
-            self.logger.info(f'Opened {link} in new tab')
+            # Open the profile in a worker tab, which is taken back even if scraping fails
+            with self.tabs.lease():
+                self.driver.get(link)
+                self.logger.info(f'Opened {link} in a worker tab')
 
-            if check_stop_event():
-                return None
+                if check_stop_event():
+                    return None
 
-            self.reload_page()
+                self.reload_page()
 
-            # Wait for the page to load
-            name_element = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, '//div[@data-testid="UserName"]'))
-            )
+                # Wait for the page to load
+                name_element = WebDriverWait(self.driver, 10).until(
+                    EC.presence_of_element_located((By.XPATH, '//div[@data-testid="UserName"]'))
+                )
 
-            # Extract profile data
-            profile = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, '//div[@class="css-175oi2r r-3pj75a r-ttdzmv r-1ifxtd0"]'))
-            )
+                # Extract profile data
+                profile = WebDriverWait(self.driver, 10).until(
+                    EC.presence_of_element_located((By.XPATH, '//div[@class="css-175oi2r r-3pj75a r-ttdzmv r-1ifxtd0"]'))
+                )
             
-            username = link.split('com/')[1]
-            name = name_element.text.split('@')[0].strip()
-            following_count = profile.find_element(By.XPATH, './/a[contains(@href, "/following")]/span/span').text
-            followers_count = profile.find_element(By.XPATH, './/a[contains(@href, "followers")]/span/span').text
-
-            if check_stop_event():
-                return None
+                username = link.split('com/')[1]
+                name = name_element.text.split('@')[0].strip()
+                following_count = profile.find_element(By.XPATH, './/a[contains(@href, "/following")]/span/span').text
+                followers_count = profile.find_element(By.XPATH, './/a[contains(@href, "followers")]/span/span').text
 
-            # Optional fields
-            bio = self._get_optional_field(profile, '//div[@data-testid="UserDescription"]')
-            location = self._get_optional_field(profile, '//div[@data-testid="UserProfileHeader_Items"]//span[@data-testid="UserLocation"]')
-            website = self._get_optional_field(profile, '//div[@data-testid="UserProfileHeader_Items"]//a[@data-testid="UserUrl"]', attr='href')
-            self.logger.info(f'Successfully scraped data from {username}')
-
-            # Scrape the followers the user is following
-            try:
-                WebDriverWait(profile, 1.2).until(EC.presence_of_element_located((By.XPATH, '//span[contains(text(), "Not followed by anyone you’re following")]')))
-                self.logger.info(f"{username} is not followed by anyone you're following.")
-                followers_you_follow = []
-            except TimeoutException:
-                followers_you_follow = self._fetch_followers_you_follow()
-                # click the back button amd wait for the profile page to load
-                self.driver.find_element(By.XPATH, '//div[@aria-label="Home timeline"] //button[@aria-label="Back"]').click()
-                WebDriverWait(self.driver, 2).until(EC.presence_of_element_located((By.XPATH, '//div[@data-testid="UserName"]')))
-
-            # Click the View More button if it exists
-            try:
                 if check_stop_event():
                     return None
-                
-                more_info = ''
-                view_more_button = self.driver.find_element(By.XPATH, '//div[@class="css-175oi2r r-3pj75a r-ttdzmv r-1ifxtd0"] //a[contains(@href, "bio")]')
-                view_more_button.click()
-                more_info = WebDriverWait(self.driver, 3).until(
-                    EC.presence_of_element_located((By.XPATH, '//div[@class="extended-profile"]'))
-                ).text
-            except TimeoutException as te:
-                self.logger.info(f"Timeout while clicking the 'View More' button: {te}")    
-            except Exception as e:
-                self.logger.info("No 'View More' button found")
-
-            profile_data = {
-                'username': username,
-                'name': name,
-                'link': link,
-                'following_count': following_count,
-                'followers_count': followers_count,
-                'bio': bio,
-                'location': location,
-                'website': website,
-                'followers_you_follow': followers_you_follow,
-                'more_info': more_info,
-                'reply': True,  # Default to True when adding a new profile
-            }
-
-            # Return the profile data for further use
-            self.close_current_tab()
-            return profile_data
+
+                # Optional fields
+                bio = self._get_optional_field(profile, '//div[@data-testid="UserDescription"]')
+                location = self._get_optional_field(profile, '//div[@data-testid="UserProfileHeader_Items"]//span[@data-testid="UserLocation"]')
+                website = self._get_optional_field(profile, '//div[@data-testid="UserProfileHeader_Items"]//a[@data-testid="UserUrl"]', attr='href')
+                self.logger.info(f'Successfully scraped data from {username}')
+
+                scraped_at = datetime.now()
+                profile_data = {
+                    'username': username,
+                    'name': name,
+                    'link': link,
+                    'following_count': following_count,
+                    'followers_count': followers_count,
+                    'bio': bio,
+                    'location': location,
+                    'website': website,
+                    'reply': True,  # Default to True when adding a new profile
+                    'scraped_at': {'counts': scraped_at, 'core': scraped_at},
+                }
+
+                # Scrape the followers the user is following
+                if 'followers_you_follow' in groups:
+                    try:
+                        WebDriverWait(profile, 1.2).until(EC.presence_of_element_located((By.XPATH, '//span[contains(text(), "Not followed by anyone you’re following")]')))
+                        self.logger.info(f"{username} is not followed by anyone you're following.")
+                        followers_you_follow = []
+                    except TimeoutException:
+                        followers_you_follow = self._fetch_followers_you_follow()
+                        # click the back button amd wait for the profile page to load
+                        self.driver.find_element(By.XPATH, '//div[@aria-label="Home timeline"] //button[@aria-label="Back"]').click()
+                        WebDriverWait(self.driver, 2).until(EC.presence_of_element_located((By.XPATH, '//div[@data-testid="UserName"]')))
+                    profile_data['followers_you_follow'] = followers_you_follow
+                    profile_data['scraped_at']['followers_you_follow'] = datetime.now()
+
+                # Click the View More button if it exists
+                if 'more_info' in groups:
+                    try:
+                        if check_stop_event():
+                            return None
+                    
+                        more_info = ''
+                        view_more_button = self.driver.find_element(By.XPATH, '//div[@class="css-175oi2r r-3pj75a r-ttdzmv r-1ifxtd0"] //a[contains(@href, "bio")]')
+                        view_more_button.click()
+                        more_info = WebDriverWait(self.driver, 3).until(
+                            EC.presence_of_element_located((By.XPATH, '//div[@class="extended-profile"]'))
+                        ).text
+                    except TimeoutException as te:
+                        self.logger.info(f"Timeout while clicking the 'View More' button: {te}")    
+                    except Exception as e:
+                        self.logger.info("No 'View More' button found")
+                    profile_data['more_info'] = more_info
+                    profile_data['scraped_at']['more_info'] = datetime.now()
+
+                # Return the profile data for further use
+                return profile_data
 
         except TimeoutException as te:
             self.logger.error(f"Timeout while loading profile data: {te}")
-            self.close_current_tab()
         except NoSuchElementException as nse:
             self.logger.error(f"Element not found while storing profile data: {nse}")
-            self.close_current_tab()
         except Exception as e:
             self.logger.exception(f"Failed to store profile data. Error: {str(e)}")
-            self.close_current_tab()
             return None
 
     def _get_optional_field(self, profile, xpath, attr=None):
@@ -643,7 +886,7 @@ class XController:
             self.logger.info(f"Optional field not found for xpath: {xpath}")
             return ''
 
-    @decorators.rest
+    @decorators.paced('navigate')
     def _fetch_followers_you_follow(self):
         """
         Fetches the list of followers you follow.
@@ -662,41 +905,19 @@ class XController:
             
             common_followers_link = self.driver.find_element(By.XPATH, '//a[@aria-label="Followers you know"]').get_attribute('href')
             self.driver.get(common_followers_link)
-            followers_section = WebDriverWait(self.driver, 3).until(
+            WebDriverWait(self.driver, 3).until(
                 EC.presence_of_element_located((By.XPATH, '//div[@aria-label="Timeline: Followers you know"]'))
             )
 
             self.logger.info('Scraping the list of followers that you know')
-            followers_you_follow = set()  # Use a set to automatically handle duplicates
-            last_height = self.driver.execute_script("return document.body.scrollHeight")
-            scroll_pause_time = 0.7
-            while True:
-                if check_stop_event():
-                    return []
-                
-                self.logger.info('Scrolling down to load more profiles')
-                self.driver.execute_script("window.scrollBy(0, 500);")
-                sleep(scroll_pause_time)
-
-                # Fetch follower usernames
-                username_elements = followers_section.find_elements(By.XPATH, '//button[@data-testid="UserCell"] //span[contains(text(), "@")]')
-                new_followers = set(elem.text.strip('@') for elem in username_elements)
-                followers_you_follow.update(new_followers)
-
-                # Check if we've reached the bottom or if we haven't found new followers in several scrolls
-                new_height = self.driver.execute_script("return document.body.scrollHeight")
-                if new_height == last_height:
-                    # Try a final scroll to ensure
-                    self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                    sleep(scroll_pause_time)
-                    new_height = self.driver.execute_script("return document.body.scrollHeight")
-                    if new_height == last_height:
-                        self.logger.info('Reached the bottom of the page')
-                        break
-                last_height = new_height
+            collector = ScrollCollector(self.driver, FOLLOWERS_YOU_KNOW_CELL_SELECTOR)
+            cells = collector.collect(should_stop=check_stop_event)
+            if cells is None:
+                return []
+            followers_you_follow = [cell['username'] for cell in cells if cell['username']]
 
             self.logger.info(f"Scraped {len(followers_you_follow)} followers you follow")
-            return list(followers_you_follow)
+            return followers_you_follow
 
         except TimeoutException as te:
             self.logger.error(f"Timeout while fetching followers you follow: {te}")
@@ -719,6 +940,10 @@ class XController:
                 EC.presence_of_element_located((By.XPATH, '//div[contains(@aria-label, "Timeline")]'))
             )
 
+            tweet = self._find_captured_latest_post()
+            if tweet:
+                return tweet
+
             # Scroll until a non-ad and non-pinned tweet article is visible or max attempts reached
             max_attempts = 5
             for _ in range(max_attempts):
@@ -744,22 +969,49 @@ class XController:
             self.logger.exception(f"Failed to scroll to latest non-ad and non-pinned post. Error: {str(e)}")
             return None
 
-    def reload_page(self, mins_to_wait=3):
+    def _find_captured_latest_post(self):
+        '''
+        This finds the latest non-ad and non-pinned post of the open profile with the captured GraphQL responses and scrolls to it.
+        Returns the tweet element, or None if network capture is off or the tweet couldn't be found (the DOM is searched instead then).
+        '''
+        if not self.network_capture:
+            return None
+        try:
+            self.network_capture.drain()
+            username = self.driver.current_url.rstrip('/').split('/')[-1]
+            latest_tweet = self.network_capture.latest_tweet(username)
+            if not latest_tweet:
+                return None
+
+            tweet = WebDriverWait(self.driver, 5).until(EC.presence_of_element_located(
+                (By.XPATH, f'//article[@data-testid="tweet"][.//a[contains(@href, "/status/{latest_tweet["tweet_id"]}")]]')
+            ))
+            self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", tweet)
+            self.logger.info(f"Found the latest post of {username} with the captured responses: {latest_tweet['tweet_link']}")
+            return tweet
+        except TimeoutException:
+            self.logger.info("The captured latest post is not rendered. Searching the page instead")
+            return None
+        except Exception as e:
+            self.logger.warning(f"Failed to find the captured latest post. Error: {str(e)}")
+            return None
+
+    def reload_page(self):
         """
-        If the Retry button is found, we wait for a minute, refresh the page and wait for the page to fully load.
+        If the Retry button is found, X is pushing back: the shared pacer backs off (exponentially, with jitter, for all sessions), then the page is refreshed and we wait for it to load.
         """
         try:
             # check if the Retry button is present on the page
-            retry_span = self.driver.find_element(By.XPATH, '//div[@data-testid="primaryColumn"] //span[text()="Retry"]')
-            self.logger.info(f"Retry button found. Will sleep for {mins_to_wait} minutes before reloading the page.")
-            mins = mins_to_wait * 60
-            sleep(mins) # sleep for 2 minutes
+            self.driver.find_element(By.XPATH, '//div[@data-testid="primaryColumn"] //span[text()="Retry"]')
+            delay = self.pacer.report_pushback('Retry button')
+            self.logger.info(f"Retry button found. Will wait about {delay:.0f} seconds before reloading the page.")
+            self.pacer.wait_until_closed()
             self.driver.refresh()
             WebDriverWait(self.driver, 5).until(EC.presence_of_element_located((By.XPATH, '//div[@data-testid="primaryColumn"]')))
-            sleep(2)
             return True
         except NoSuchElementException:
             self.logger.info("No Retry button found, no need to reload the page")
+            self.pacer.report_success()
             return True
         except Exception as e:
             self.logger.exception(f"Failed to reload the page. Error: {str(e)}")
@@ -791,11 +1043,68 @@ class XController:
             self.logger.error("Could not find tweet author")
             return None
 
-    @decorators.rest
+    @decorators.paced('navigate')
+    def open_following_timeline(self):
+        '''This opens the home page and selects its "Following" tab (the chronological timeline of the followed accounts). Returns True if the timeline is open, False otherwise.'''
+        try:
+            self.driver.get('https://x.com/home')
+            following_tab = WebDriverWait(self.driver, 10).until(
+                EC.element_to_be_clickable((By.XPATH, '//div[@role="tablist"]//a[@role="tab"][.//span[text()="Following"]]'))
+            )
+            if following_tab.get_attribute('aria-selected') != 'true':
+                following_tab.click()
+            WebDriverWait(self.driver, 10).until(EC.presence_of_element_located((By.XPATH, '//article[@data-testid="tweet"]')))
+            self.logger.info('Opened the Following timeline')
+            return True
+        except Exception as e:
+            self.logger.exception(f'Failed to open the Following timeline. Error: {str(e)}')
+            return False
+
+    @decorators.paced('navigate')
+    def open_notifications(self):
+        '''This opens the notifications page, where the new tweets of the accounts with post notifications turned on are listed. Returns True if the page is open, False otherwise.'''
+        try:
+            self.driver.get('https://x.com/notifications')
+            WebDriverWait(self.driver, 10).until(EC.presence_of_element_located((By.XPATH, '//div[contains(@aria-label, "Timeline")]')))
+            self.logger.info('Opened the notifications page')
+            return True
+        except Exception as e:
+            self.logger.exception(f'Failed to open the notifications page. Error: {str(e)}')
+            return False
+
+    @decorators.paced('navigate')
+    def open_tweet(self, tweet_link: str):
+        '''This opens the page of a tweet and returns its article element (the focal tweet, not the replies under it), or None if it can't be found'''
+        try:
+            self.driver.get(tweet_link)
+            tweet_id = tweet_link.rstrip('/').split('/')[-1]
+            tweet = WebDriverWait(self.driver, 10).until(EC.presence_of_element_located(
+                (By.XPATH, f'//article[@data-testid="tweet"][.//a[contains(@href, "/status/{tweet_id}")]//time]')
+            ))
+            self.logger.info(f'Opened the tweet: {tweet_link}')
+            return tweet
+        except Exception as e:
+            self.logger.exception(f'Failed to open the tweet {tweet_link}. Error: {str(e)}')
+            return None
+
+    def get_visible_tweets(self):
+        '''This returns the tweets that are rendered on the open timeline, in page order, as dicts with element, link, author, ad, pinned and retweet. Returns an empty list if the page can't be read.'''
+        try:
+            return self.driver.execute_script(LIST_VISIBLE_TWEETS)
+        except Exception as e:
+            self.logger.warning(f'Failed to list the visible tweets. Error: {str(e)}')
+            return []
+
+    def scroll_down(self, pixels: int):
+        '''This scrolls the page down by `pixels` and waits for the new tweets to render'''
+        self.driver.execute_script('window.scrollBy(0, arguments[0]);', pixels)
+        sleep(1)
+
     def like_tweet(self, tweet_element):
         """
         Checks if the given tweet is liked. If not, it likes the tweet.
         Returns True if the tweet is (or was successfully) liked, False otherwise.
+        A like token of the pacer is only taken when the like button is clicked, not for tweets that are already liked.
         """
         try:
             # Find the like/unlike button within the tweet element
@@ -807,6 +1116,7 @@ class XController:
                 return True
             
             # If not liked, click the like button
+            self.pacer.acquire('like')
             like_button.click()
             
             self.logger.info("Successfully liked the tweet")
@@ -840,7 +1150,6 @@ class XController:
             self.logger.exception(f"Failed to click the reply button. Error: {str(e)}")
             return False
 
-    @decorators.rest
     def type_reply(self, reply_text):
         """
         Types the given text into the reply box.
@@ -856,7 +1165,7 @@ class XController:
             self.logger.exception(f"Failed to type reply. Error: {str(e)}")
             return False
 
-    @decorators.rest
+    @decorators.paced('reply')
     def send_reply(self):
         """
         Clicks the send button for the reply.
@@ -875,7 +1184,6 @@ class XController:
             self.logger.exception(f"Failed to click reply send button. Error: {str(e)}")
             return False
 
-    @decorators.rest
     def close_current_tab(self):
         """
         Closes the current tab and switches back to the previous one.
@@ -894,6 +1202,11 @@ class XController:
         Closes the browser safely.
         """
         try:
+            if self.driver and self.attached:
+                # Only the driver session ends, Chrome keeps running (and logged in) for the next run of the app
+                self.driver.quit()
+                self.logger.info("Detached from the browser, it keeps running")
+                return
             if self.driver:
                 self.driver.stop_client()
                 self.driver.close()
@@ -910,15 +1223,10 @@ class XController:
             self.driver.get('https://x.com/account/access')
 
             # Check if the "Your account has been locked" page is displayed
-            locked_message = WebDriverWait(self.driver, 3).until(
-                EC.presence_of_element_located((By.XPATH, '//div[contains(text(), "Your account has been locked.")]'))
-            )
-            
-            if locked_message:
+            page = self.wait_for_page_state(['locked', 'logged_in', 'login_username'], 3)
+            if page['state'] == 'locked':
                 self.logger.info("Account locked page detected")
                 return True
-            
-        except TimeoutException:
             self.logger.warning("Account locked page not detected or elements not found")
             return False
         except Exception as e:
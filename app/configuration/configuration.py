@@ -5,6 +5,64 @@ class Config:
     MONGODB_PWD = os.getenv('MONGODB_PWD')
     CHROMEDRIVER_EXE_PATH = os.getenv('CHROMEDRIVER_EXE_PATH')
     CHROME_PROFILES_PATH = os.getenv('CHROME_PROFILES_PATH')
+    CHROME_BINARY_PATH = os.getenv('CHROME_BINARY_PATH') # Chrome executable that app/bot/chrome_launcher.py launches
+    CHROME_ATTACH = os.getenv('CHROME_ATTACH', 'false').lower() == 'true' # attach the main session to a running Chrome on the debugging port (launched by app/bot/chrome_launcher.py if needed) instead of launching a new one, and leave it running when the app closes
+    CHROME_DEBUGGER_ADDRESS = '127.0.0.1:9223' # remote debugging address of the main session's Chrome
+    CHROME_KEEP_ALIVE_INTERVAL = 10 # seconds between the checks of the Chrome keep-alive (app/bot/chrome_launcher.py)
+    IMPORT_TIME_BUDGET_MS = 300 # maximum milliseconds for importing main.py in a fresh interpreter (checked by app/import_budget.py)
     DATABASE_URI ='mongodb+srv://sammy:{}@cluster1.565lfln.mongodb.net/?retryWrites=true&w=majority&appName=Cluster1'.format(MONGODB_PWD)
     LOG_FILE = 'app_log.log'
-    SINGLE_BATCH_DURATION = 65 # duration to follow a single batch in seconds (for auto follow)
+    SINGLE_BATCH_DURATION = 65 # duration to follow a single batch in seconds (for auto follow). Keep it until a timed run of the single-script follow (see FOLLOW_VISIBLE_CELLS) measures a shorter batch
+    FOLLOW_CLICK_SPACING = 0.2 # pause in seconds after each click on a Follow button (for auto follow)
+    SESSION_POOL_SIZE = int(os.getenv('SESSION_POOL_SIZE', 1)) # number of Chrome sessions that work through the bot targets in parallel (1 = only the main session)
+    LEAN_BROWSER = os.getenv('LEAN_BROWSER', 'false').lower() == 'true' # headless Chrome that doesn't load images, media, fonts and trackers
+    VIEWPORT_WIDTH = 1920 # fixed window size that is used instead of maximizing the window
+    VIEWPORT_HEIGHT = 1080
+    NETWORK_CAPTURE = os.getenv('NETWORK_CAPTURE', 'false').lower() == 'true' # read users and tweets from X's GraphQL responses instead of the DOM where possible
+    NETWORK_CAPTURE_RECORD_DIR = os.getenv('NETWORK_CAPTURE_RECORD_DIR') # if set, every captured GraphQL response is saved to this directory
+    NETWORK_CAPTURE_MAX_USERS = 5000 # number of captured users that are kept (the least recently captured ones are dropped)
+    NETWORK_CAPTURE_MAX_TWEETS = 5000 # number of captured tweets that are kept (the least recently captured ones are dropped)
+    PACING_RATES = { # action: (average actions per minute, burst size) for the token buckets of the pacer. They are shared by all the sessions (the limits are per account), so a SESSION_POOL_SIZE above 1 can't go above them
+        'navigate': (30, 5),
+        'like': (12, 3),
+        'reply': (6, 2),
+        'follow': (100, 100),
+        'unfollow': (30, 10),
+    }
+    BACKOFF_BASE_DELAY = 30 # seconds to back off after X pushes back for the first time. This doubles with every pushback in a row
+    BACKOFF_MAX_DELAY = 15 * 60 # maximum seconds to back off after X pushes back
+    MONGO_BULK_BATCH_SIZE = 500 # maximum number of documents in a single $in query or bulk write
+    OUTBOX_PATH = 'app/database/outbox.db' # local SQLite database for the MongoDB writes that haven't been flushed yet
+    OUTBOX_FLUSH_INTERVAL = 2 # seconds between flushes of the outbox to MongoDB
+    OUTBOX_MAX_RETRY_DELAY = 60 # maximum seconds between retries while MongoDB can't be reached
+    SESSION_STORE_PATH = 'app/database/sessions.db' # local SQLite database with the cookies of the logged in X sessions, by account
+    PROFILE_CACHE_TTLS = { # field group: hours until the scraped values of the group are stale (see app/bot/profile_cache.py)
+        'counts': 24,
+        'core': 7 * 24,
+        'followers_you_follow': 30 * 24,
+        'more_info': 30 * 24,
+    }
+    PROFILE_REFRESHER_ENABLED = os.getenv('PROFILE_REFRESHER_ENABLED', 'false').lower() == 'true' # fill in the expensive fields (followers_you_follow, more_info) and refresh stale profiles in an extra background Chrome session (off by default, since it launches another Chrome)
+    PROFILE_REFRESH_IDLE_TIME = 10 * 60 # seconds the profile refresher waits when no profile is stale
+    PROFILE_REFRESH_SPARE_TOKENS = 3 # the profile refresher only navigates while at least this many navigation tokens of the pacer are available
+    PROFILE_REFRESH_RETRY_DELAY = 1 # hours before a profile that couldn't be scraped is refreshed again. This doubles with every failure in a row
+    PROFILE_REFRESH_MAX_RETRY_DELAY = 7 * 24 # maximum hours before a profile that couldn't be scraped is refreshed again
+    TWEET_SEEN_MAX_AGE_FACTOR = 1.5 # a sighting of a profile's newest tweet is trusted for this many times the profile's visit interval, so the sighting of one visit can skip the next visit (but not two in a row). A profile isn't opened if its newest tweet was seen this recently and was already handled
+    SCHEDULER_MIN_INTERVAL = 10 * 60 # minimum seconds between two visits of the same profile
+    SCHEDULER_MAX_INTERVAL = 24 * 60 * 60 # maximum seconds between two visits of the same profile (even dormant profiles are visited this often)
+    SCHEDULER_DEFAULT_INTERVAL = 60 * 60 # seconds between visits of profiles whose posting rate isn't known yet
+    SCHEDULER_DORMANCY_FACTOR = 0.5 # a profile that hasn't posted for a while is expected to stay quiet for this fraction of that time
+    SCHEDULER_RELOAD_INTERVAL = 5 * 60 # seconds between re-reads of the bot targets from MongoDB
+    SCHEDULER_REPORT_INTERVAL = 30 * 60 # seconds between reports of the expected and actual revisit intervals
+    BOT_MODE = os.getenv('BOT_MODE', 'profiles') # 'profiles' opens the profile of every bot target, 'timeline' sweeps the home Following timeline for the tweets of the bot targets, 'notifications' handles the new tweets in the notifications first and opens the profiles in between
+    TIMELINE_SWEEP_INTERVAL = 5 * 60 # seconds between two timeline sweeps
+    TIMELINE_MAX_SCROLLS = 30 # maximum scrolls of a single timeline sweep
+    TIMELINE_SCROLL_STEP = 1500 # pixels per scroll of a timeline sweep
+    TIMELINE_STOP_AFTER_HANDLED = 3 # a timeline sweep stops after this many already handled tweets of bot targets in a row
+    NOTIFICATIONS_POLL_INTERVAL = 60 # seconds between two polls of the notifications page (in the notifications bot mode)
+    PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'false').lower() == 'true' # load the next profile in a background tab while the bot interacts with the current one (only without the session pool)
+    WORKER_TABS = 2 # number of long-lived worker tabs that every session keeps for background work (eg: scraping profiles, prefetching)
+    SCRAPE_CONCURRENCY = int(os.getenv('SCRAPE_CONCURRENCY', 3)) # maximum number of sessions of the session pool that scrape new profiles at the same time in get_following
+    FOLLOWING_KNOWN_RUN = 20 # an incremental get_following stops scrolling after this many stored profiles in a row
+    FOLLOWING_RECONCILE_INTERVAL = 7 * 24 * 60 * 60 # seconds between full get_following syncs, which scroll the whole following page and record unfollows
+    FOLLOWING_COUNT_TTL = 10 * 60 # seconds for which the following number of the user is cached
@@ -0,0 +1,31 @@
+'''
+This prints how the MongoDB indexes are used and which queries are still slow. Run it with:
+python -m app.database.index_report
+'''
+
+from app.database.mongo_manager import MongoManager
+
+def print_report():
+    '''This prints the index usage, the query shapes that scan a whole collection and the slow queries recorded by the profiler'''
+    db_manager = MongoManager()
+
+    print("Index usage:")
+    for index in db_manager.get_index_usage():
+        print(f"  {index['collection']}.{index['name']}: {index['ops']} operations since {index['since']}")
+
+    print("Queries that scan a whole collection:")
+    collection_scans = db_manager.get_collection_scans()
+    for scan in collection_scans:
+        print(f"  {scan['collection']} by {scan['query']} (sort: {scan['sort']})")
+    if not collection_scans:
+        print("  None")
+
+    print("Slow queries (from the database profiler):")
+    slow_queries = db_manager.get_slow_queries()
+    for query in slow_queries:
+        print(f"  {query['ts']} {query['ns']} {query['op']} {query['millis']} ms ({query['plan']})")
+    if not slow_queries:
+        print("  None recorded (the profiler might be off)")
+
+if __name__ == "__main__":
+    print_report()
@@ -1,8 +1,10 @@
 from urllib.parse import urlparse
 from datetime import datetime
+from pymongo import IndexModel, ASCENDING, DESCENDING
 from pymongo.mongo_client import MongoClient
 from app.logger.logger import logger
 from app.configuration.configuration import Config
+from app.database.outbox import MongoOutbox
 
 class MongoManager:
     def __init__(self):
@@ -11,7 +13,105 @@ class MongoManager:
         self.tweets_collection = self.db['tweets']
         self.following_collection = self.db['following']
         self.added_collection = self.db['added']
+        self.following_changes_collection = self.db['following_changes']
+        self.sync_state_collection = self.db['sync_state']
         self.logger = logger('database_manager')
+        self.ensure_indexes()
+        # Writes go through the outbox, so they don't wait for MongoDB and aren't lost when it can't be reached
+        self.outbox = MongoOutbox(self.db)
+
+    # The indexes of every collection. The unique indexes are on the keys that the bot upserts on, the others support its read patterns
+    INDEXES = {
+        'following': [
+            IndexModel([('link', ASCENDING)], unique=True, name='link_unique'),
+            IndexModel([('username', ASCENDING)], name='username'),
+        ],
+        'added': [
+            IndexModel([('link', ASCENDING)], unique=True, name='link_unique'),
+            IndexModel([('username', ASCENDING)], name='username'),
+        ],
+        'tweets': [
+            IndexModel([('tweet_id', ASCENDING)], unique=True, name='tweet_id_unique'),
+            IndexModel([('username', ASCENDING), ('timestamp', DESCENDING)], name='username_timestamp'),
+        ],
+        'following_changes': [
+            IndexModel([('link', ASCENDING), ('at', DESCENDING)], name='link_at'),
+        ],
+        'sync_state': [
+            IndexModel([('name', ASCENDING)], unique=True, name='name_unique'),
+        ],
+    }
+
+    # The query shapes that the bot uses, for checking that none of them scans a whole collection
+    QUERY_SHAPES = [
+        ('following', {'link': ''}, None),
+        ('following', {'username': ''}, None),
+        ('added', {'link': ''}, None),
+        ('added', {'username': ''}, None),
+        ('tweets', {'tweet_id': ''}, None),
+        ('tweets', {'username': ''}, [('timestamp', DESCENDING)]),
+        ('following_changes', {'link': ''}, [('at', DESCENDING)]),
+        ('sync_state', {'name': ''}, None),
+    ]
+
+    def ensure_indexes(self):
+        '''This creates the indexes in `INDEXES` if they don't exist yet. A unique index can't be created while the collection has duplicates, so a failure is logged and the other collections are still indexed'''
+        for collection_name, indexes in self.INDEXES.items():
+            try:
+                created = self.db[collection_name].create_indexes(indexes)
+                self.logger.info(f"Ensured indexes on {collection_name}: {created}")
+            except Exception as e:
+                self.logger.error(f"Failed to create indexes on {collection_name}. Remove duplicate documents if a unique index failed. Error: {str(e)}")
+
+    def get_index_usage(self):
+        '''This returns the usage statistics of every index (from $indexStats) as a list of dicts with collection, name, ops and since'''
+        usage = []
+        for collection_name in self.INDEXES:
+            try:
+                for stats in self.db[collection_name].aggregate([{'$indexStats': {}}]):
+                    usage.append({
+                        'collection': collection_name,
+                        'name': stats['name'],
+                        'ops': stats['accesses']['ops'],
+                        'since': stats['accesses']['since'],
+                    })
+            except Exception as e:
+                self.logger.error(f"Failed to get the index usage of {collection_name}. Error: {str(e)}")
+        return usage
+
+    def get_collection_scans(self):
+        '''This explains every query shape in `QUERY_SHAPES` and returns the ones whose winning plan scans the whole collection'''
+        def stages(plan):
+            yield plan.get('stage')
+            for child in [plan.get('inputStage')] + plan.get('inputStages', []):
+                if child:
+                    yield from stages(child)
+
+        collection_scans = []
+        for collection_name, query, sort in self.QUERY_SHAPES:
+            try:
+                cursor = self.db[collection_name].find(query)
+                if sort:
+                    cursor = cursor.sort(sort)
+                plan = cursor.explain()['queryPlanner']['winningPlan']
+                if 'COLLSCAN' in stages(plan.get('queryPlan', plan)):
+                    collection_scans.append({'collection': collection_name, 'query': list(query), 'sort': sort})
+            except Exception as e:
+                self.logger.error(f"Failed to explain a query on {collection_name}. Error: {str(e)}")
+        return collection_scans
+
+    def get_slow_queries(self, min_millis=100, limit=20):
+        '''This returns the latest queries that took at least `min_millis` milliseconds from the database profiler. The profiler must be enabled (it isn't available on every Atlas tier), otherwise an empty list is returned'''
+        try:
+            cursor = self.db['system.profile'].find({'millis': {'$gte': min_millis}}).sort('ts', DESCENDING).limit(limit)
+            return [{'ns': doc.get('ns'), 'op': doc.get('op'), 'millis': doc.get('millis'), 'plan': doc.get('planSummary'), 'ts': doc.get('ts')} for doc in cursor]
+        except Exception as e:
+            self.logger.warning(f"Failed to read the database profiler. Error: {str(e)}")
+            return []
+
+    def close(self):
+        '''This flushes the outbox before the app exits. Whatever can't be flushed is kept for the next run'''
+        self.outbox.close()
 
     def delete_profile(self, username: str, collection_name: str):
         '''This deletes a profile from a collection based on the username'''
@@ -29,7 +129,7 @@ class MongoManager:
         except Exception as e:
             self.logger.error(f"Failed to delete documents in {collection_name}. Error: {str(e)}")
 
-    def save_tweet(self, tweet_link, username):
+    def save_tweet(self, tweet_link, username, replied=False):
         parsed_url = urlparse(tweet_link)
         tweet_id = parsed_url.path.split('/')[-1]
         
@@ -37,39 +137,39 @@ class MongoManager:
             'tweet_id': tweet_id,
             'tweet_link': tweet_link,
             'username': username,
+            'replied': replied,
             'timestamp': datetime.now()
         }
         
-        result = self.tweets_collection.update_one(
-            {'tweet_id': tweet_id},
-            {'$set': tweet_data},
-            upsert=True
-        )
-        
-        if result.upserted_id:
-            self.logger.info(f"Inserted new tweet: {tweet_id}")
-        else:
-            self.logger.info(f"Updated existing tweet: {tweet_id}")
+        self.outbox.enqueue('tweets', {'tweet_id': tweet_id}, tweet_data)
+        self.logger.info(f"Queued tweet for saving: {tweet_id}")
+
+    def get_handled_tweets(self):
+        '''This returns the tweet_id, username and replied fields of every saved tweet (including the tweets that are still in the outbox). It is used to load the tweet index when the bot starts.'''
+        try:
+            tweets = list(self.tweets_collection.find({}, {'_id': 0, 'tweet_id': 1, 'username': 1, 'replied': 1}))
+        except Exception as e:
+            self.logger.error(f"Failed to get handled tweets. Error: {str(e)}")
+            tweets = []
+        return self.outbox.apply_pending('tweets', tweets)
 
     def save_profile(self, data: dict):
         '''This saves an X profile to the following collection. If the profile already exists in the collection, the profile will be updated with the new data'''
         try:
-            username = data.get('username')
-            result = self.following_collection.update_one(
-                {'username': username},
-                {'$set': data},
-                upsert=True
-            )
-            if result.upserted_id:
-                self.logger.info(f"Successfully saved new profile for: {username}")
-            else:
-                self.logger.info(f"Updated existing profile for: {username}")
+            # Like save_profiles, this upserts on the link, so the updates of the same profile are merged in the outbox and can't create a second document
+            self.outbox.enqueue('following', {'link': data['link']}, data)
+            self.logger.info(f"Queued profile for saving: {data.get('username')}")
         except Exception as e:
             self.logger.error(f"Failed to save profile. Error: {str(e)}")
 
     def is_profile_in_following(self, link: str):
-        '''This checks if a profile is in the following collection in MongoDB'''
+        '''This checks if a profile is in the following collection in MongoDB (or waiting in the outbox to be saved there)'''
         try:
+            upserted, deleted = self._get_pending_links('following')
+            if link in upserted:
+                return True
+            if link in deleted:
+                return False
             existing_profile = self.following_collection.find_one({'link': link})
             if existing_profile is None:
                 return False
@@ -78,13 +178,100 @@ class MongoManager:
         except Exception as e:
             self.logger.error(f"Failed to check if profile is in collection. Error: {str(e)}")
 
+    def _get_pending_links(self, collection_name: str) -> tuple:
+        '''This returns two sets: the links of the profiles that are waiting in the outbox to be upserted into `collection_name`, and the links of the profiles that are waiting to be deleted from it (whichever came last)'''
+        upserted, deleted = set(), set()
+        for op, filter, values, upsert in self.outbox.pending(collection_name):
+            link = filter.get('link') or values.get('link')
+            if op == 'delete':
+                upserted.discard(link)
+                deleted.add(link)
+            elif upsert:
+                deleted.discard(link)
+                upserted.add(link)
+        upserted.discard(None)
+        deleted.discard(None)
+        return upserted, deleted
+
+    def get_existing_following_links(self, links: list) -> set:
+        '''This returns the set of `links` that are already in the following collection. It uses one $in query per `Config.MONGO_BULK_BATCH_SIZE` links instead of one query per link'''
+        existing_links = set()
+        try:
+            batch_size = Config.MONGO_BULK_BATCH_SIZE
+            for i in range(0, len(links), batch_size):
+                batch = links[i:i + batch_size]
+                cursor = self.following_collection.find({'link': {'$in': batch}}, {'link': 1, '_id': 0})
+                existing_links.update(doc['link'] for doc in cursor)
+            upserted, deleted = self._get_pending_links('following')
+            existing_links = (existing_links - deleted) | (upserted & set(links))
+            self.logger.info(f"{len(existing_links)} of {len(links)} links are already in the following collection")
+        except Exception as e:
+            self.logger.error(f"Failed to check which profiles are in the following collection. Error: {str(e)}")
+        return existing_links
+
+    def get_followed_links(self) -> set:
+        '''This returns the links of the profiles in the following collection that aren't marked as unfollowed (including the ones that are still in the outbox)'''
+        try:
+            following = list(self.following_collection.find({}, {'link': 1, 'unfollowed_at': 1, '_id': 0}))
+        except Exception as e:
+            self.logger.error(f"Failed to get the followed links. Error: {str(e)}")
+            following = []
+        following = self.outbox.apply_pending('following', following)
+        return {doc['link'] for doc in following if doc.get('link') and not doc.get('unfollowed_at')}
+
+    def record_following_changes(self, followed: list, unfollowed: list):
+        '''
+        This records follows and unfollows as timestamped documents in the following_changes collection, and sets (or clears) 'unfollowed_at' on the profiles in the following collection.
+        Unfollowed profiles are never deleted, so the history of everyone the user has followed is kept.
+        '''
+        if not followed and not unfollowed:
+            return
+        now = datetime.now()
+        try:
+            changes = [({'link': link, 'at': now}, {'change': 'followed'}) for link in followed]
+            changes += [({'link': link, 'at': now}, {'change': 'unfollowed'}) for link in unfollowed]
+            self.outbox.enqueue_many('following_changes', changes)
+            self.outbox.enqueue_many('following', [({'link': link}, {'unfollowed_at': None}) for link in followed], upsert=False)
+            self.outbox.enqueue_many('following', [({'link': link}, {'unfollowed_at': now}) for link in unfollowed], upsert=False)
+            self.logger.info(f"Recorded {len(followed)} follows and {len(unfollowed)} unfollows")
+        except Exception as e:
+            self.logger.error(f"Failed to record following changes. Error: {str(e)}")
+
+    def get_sync_state(self, name: str) -> dict:
+        '''This returns the sync state document called `name` (eg: the times of the last following syncs), or an empty dict'''
+        try:
+            state = self.sync_state_collection.find_one({'name': name}, {'_id': 0}) or {}
+        except Exception as e:
+            self.logger.error(f"Failed to get the sync state of {name}. Error: {str(e)}")
+            state = {}
+        pending = self.outbox.apply_pending('sync_state', [state] if state else [])
+        return next((doc for doc in pending if doc.get('name') == name), {})
+
+    def save_sync_state(self, name: str, values: dict):
+        '''This updates the sync state document called `name`'''
+        try:
+            self.outbox.enqueue('sync_state', {'name': name}, values)
+        except Exception as e:
+            self.logger.error(f"Failed to save the sync state of {name}. Error: {str(e)}")
+
+    def save_profiles(self, profiles: list):
+        '''This saves many X profiles to the following collection with unordered bulk writes of `Config.MONGO_BULK_BATCH_SIZE` upserts (matched by link). Existing profiles are updated with the new data'''
+        if not profiles:
+            return
+        try:
+            self.outbox.enqueue_many('following', [({'link': data['link']}, data) for data in profiles])
+            self.logger.info(f"Queued {len(profiles)} profiles for saving")
+        except Exception as e:
+            self.logger.error(f"Failed to bulk save profiles. Error: {str(e)}")
+
     def get_following_list(self):
         '''
         This method retrieves a list of all profiles from the 'following' collection in MongoDB.
         
         It performs the following actions:
         1. Queries the 'following' collection in MongoDB.
-        2. Returns this list of profiles.
+        2. Applies the writes that are still waiting in the outbox.
+        3. Returns this list of profiles.
 
         If an exception occurs during this process:
         - The error is logged.
@@ -96,19 +283,15 @@ class MongoManager:
         '''
         try:
             following_list = list(self.following_collection.find({}))
-            return following_list
         except Exception as e:
             self.logger.error(f"Failed to get following list. Error: {str(e)}")
-            return []
+            following_list = []
+        return self.outbox.apply_pending('following', following_list)
 
     def save_added_profile(self, data: dict):
         '''Saves a profile to the added collection. If the profile already exists in the collection, the profile will be updated with the new data'''
         try:
-            self.added_collection.update_one(
-                {'link': data['link']},
-                {'$set': data},
-                upsert=True
-            )
+            self.outbox.enqueue('added', {'link': data['link']}, data)
             self.logger.info(f"Added profile: {data['username']}")
         except Exception as e:
             self.logger.error(f"Failed to save added profile. Error: {str(e)}")
@@ -119,7 +302,8 @@ class MongoManager:
         
         It performs the following actions:
         1. Queries the 'added' collection in MongoDB.
-        2. Returns this list of profiles.
+        2. Applies the writes that are still waiting in the outbox.
+        3. Returns this list of profiles.
 
         If an exception occurs during this process:
         - The error is logged.
@@ -131,19 +315,17 @@ class MongoManager:
         '''
         try:
             added_profiles = list(self.added_collection.find({}))
-            self.logger.info(f"Retrieved {len(added_profiles)} added profiles")
-            return added_profiles
         except Exception as e:
             self.logger.error(f"Failed to retrieve added profiles. Error: {str(e)}")
-            return []
+            added_profiles = []
+        added_profiles = self.outbox.apply_pending('added', added_profiles)
+        self.logger.info(f"Retrieved {len(added_profiles)} added profiles")
+        return added_profiles
 
     def update_added_profile(self, link: str, reply: bool):
         '''Updates the reply field of a profile in the added collection.'''
         try:
-            self.added_collection.update_one(
-                {'link': link},
-                {'$set': {'reply': reply}}
-            )
+            self.outbox.enqueue('added', {'link': link}, {'reply': reply}, upsert=False)
             self.logger.info(f"Updated reply status for profile: {link} to {reply}")
         except Exception as e:
             self.logger.error(f"Failed to update added profile. Error: {str(e)}")
@@ -151,23 +333,41 @@ class MongoManager:
     def update_following_profile(self, link: str, reply: bool):
         '''Updates the reply field of a profile in the following collection.'''
         try:
-            self.following_collection.update_one(
-                {'link': link},
-                {'$set': {'reply': reply}}
-            )
+            self.outbox.enqueue('following', {'link': link}, {'reply': reply}, upsert=False)
             self.logger.info(f"Updated reply status for profile: {link} to {reply}")
         except Exception as e:
             self.logger.error(f"Failed to update following profile. Error: {str(e)}")
 
+    def update_profile_fields(self, collection_name: str, link: str, values: dict):
+        '''Updates some fields (which can be dotted, like 'scraped_at.counts') of a profile in the following or added collection. This is used by the profile cache to save refreshed field groups without touching the other fields.'''
+        try:
+            self.outbox.enqueue(collection_name, {'link': link}, values, upsert=False)
+            self.logger.info(f"Updated {len(values)} fields of profile: {link} in {collection_name}")
+        except Exception as e:
+            self.logger.error(f"Failed to update profile fields. Error: {str(e)}")
+
+    def _profile_exists(self, collection_name: str, link: str) -> bool:
+        '''This checks if a profile is in `collection_name` in MongoDB or waiting in the outbox to be saved there (and not waiting to be deleted)'''
+        upserted, deleted = self._get_pending_links(collection_name)
+        if link in upserted or link in deleted:
+            return link in upserted
+        try:
+            return self.db[collection_name].find_one({'link': link}, {'_id': 1}) is not None
+        except Exception as e:
+            self.logger.error(f"Failed to check if profile is in {collection_name}. Error: {str(e)}")
+            return False
+
     def delete_added_profile(self, link: str) -> bool:
         '''
         Deletes a profile from the added collection based on the link.
-        Returns True if deletion was successful, False otherwise.
+        Returns True if the profile was found (in MongoDB or the outbox), False otherwise. The delete itself is written by the outbox.
         '''
         try:
-            result = self.added_collection.delete_one({'link': link})
-            if result.deleted_count > 0:
-                self.logger.info(f"Successfully deleted profile with link: {link}")
+            exists = self._profile_exists('added', link)
+            # The delete goes through the outbox, so it is written after the updates of the profile that are still waiting there
+            self.outbox.enqueue_delete('added', {'link': link})
+            if exists:
+                self.logger.info(f"Queued profile for deletion: {link}")
                 return True
             else:
                 self.logger.warning(f"No profile found with link: {link}")
@@ -179,12 +379,14 @@ class MongoManager:
     def delete_following_profile(self, link: str) -> bool:
         '''
         Deletes a profile from the following collection based on the link.
-        Returns True if deletion was successful, False otherwise.
+        Returns True if the profile was found (in MongoDB or the outbox), False otherwise. The delete itself is written by the outbox.
         '''
         try:
-            result = self.following_collection.delete_one({'link': link})
-            if result.deleted_count > 0:
-                self.logger.info(f"Successfully deleted profile with link: {link}")
+            exists = self._profile_exists('following', link)
+            # The delete goes through the outbox, so it is written after the updates of the profile that are still waiting there
+            self.outbox.enqueue_delete('following', {'link': link})
+            if exists:
+                self.logger.info(f"Queued profile for deletion: {link}")
                 return True
             else:
                 self.logger.warning(f"No profile found with link: {link}")
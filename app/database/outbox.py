@@ -0,0 +1,204 @@
+'''
+This is a write-behind outbox for MongoDB. Writes are stored in a local SQLite database first, which is fast and survives
+restarts, and a background thread flushes them to MongoDB in batches. If MongoDB can't be reached, the writes stay in the
+outbox and are retried later, so no data is lost while the network is down.
+'''
+
+import sqlite3
+import threading
+from bson import json_util
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from app.configuration.configuration import Config
+from app.logger.logger import logger
+
+def apply_set(doc: dict, values: dict):
+    '''This applies a MongoDB $set (which can have dotted keys like 'scraped_at.counts') to a local document'''
+    for key, value in values.items():
+        target = doc
+        *parents, field = key.split('.')
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[field] = value
+
+def merge_set(values: dict, update: dict):
+    '''
+    This merges the $set `update` into the $set `values` as if `update` was applied after `values`. MongoDB rejects a $set that has both a field and a path inside it (eg: 'scraped_at' and 'scraped_at.counts'),
+    so a dotted key is folded into its parent if the parent is set, and a parent replaces the dotted keys inside it.
+    '''
+    for key, value in update.items():
+        parts = key.split('.')
+        parent = next((prefix for prefix in ('.'.join(parts[:i]) for i in range(1, len(parts))) if prefix in values), None)
+        if parent:
+            target = values[parent] if isinstance(values[parent], dict) else {}
+            apply_set(target, {key[len(parent) + 1:]: value})
+            values[parent] = target
+            continue
+        for existing in [existing for existing in values if existing.startswith(key + '.')]:
+            del values[existing]
+        values[key] = value
+    return values
+
+class MongoOutbox:
+    def __init__(self, db, path: str = Config.OUTBOX_PATH):
+        '''`db` is the pymongo database that the writes are flushed to'''
+        self.db = db
+        self.logger = logger(__name__)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.retry_delay = Config.OUTBOX_FLUSH_INTERVAL
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                collection TEXT NOT NULL,
+                filter TEXT NOT NULL,
+                doc TEXT NOT NULL,
+                upsert INTEGER NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                op TEXT NOT NULL DEFAULT 'set'
+            )
+            ''')
+            # Outboxes that were created before deletes went through the outbox don't have the op column
+            columns = [column[1] for column in self.conn.execute('PRAGMA table_info(outbox)')]
+            if 'op' not in columns:
+                self.conn.execute("ALTER TABLE outbox ADD COLUMN op TEXT NOT NULL DEFAULT 'set'")
+            self.conn.commit()
+
+        self.flusher = threading.Thread(target=self._run_flusher, daemon=True)
+        self.flusher.start()
+
+    def enqueue(self, collection: str, filter: dict, values: dict, upsert=True):
+        '''This stores an update ($set `values` on the document matching `filter`) which will be flushed to MongoDB later'''
+        self.enqueue_many(collection, [(filter, values)], upsert)
+
+    def enqueue_many(self, collection: str, updates: list, upsert=True):
+        '''This stores many updates, each a tuple (filter, values), in a single SQLite transaction'''
+        rows = [(collection, json_util.dumps(filter), json_util.dumps(values), int(upsert)) for filter, values in updates]
+        with self.lock:
+            self.conn.executemany('INSERT INTO outbox (collection, filter, doc, upsert) VALUES (?, ?, ?, ?)', rows)
+            self.conn.commit()
+
+    def enqueue_delete(self, collection: str, filter: dict):
+        '''This stores a delete of the document matching `filter`. It is flushed in order with the updates, so an update that was stored before it can't bring the document back'''
+        with self.lock:
+            self.conn.execute("INSERT INTO outbox (collection, filter, doc, upsert, op) VALUES (?, ?, '{}', 0, 'delete')", (collection, json_util.dumps(filter)))
+            self.conn.commit()
+
+    def pending(self, collection: str):
+        '''This returns the updates and deletes of `collection` that haven't been flushed yet, oldest first, as tuples (op, filter, values, upsert) where `op` is 'set' or 'delete' (deletes have empty values)'''
+        with self.lock:
+            rows = self.conn.execute('SELECT op, filter, doc, upsert FROM outbox WHERE collection = ? ORDER BY id', (collection,)).fetchall()
+        return [(op, json_util.loads(filter), json_util.loads(doc), bool(upsert)) for op, filter, doc, upsert in rows]
+
+    def pending_count(self):
+        '''This returns the number of updates that haven't been flushed yet'''
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    def apply_pending(self, collection: str, docs: list):
+        '''This applies the pending updates of `collection` to `docs` (documents read from MongoDB), so that reads see the writes that are still in the outbox. Returns the updated list'''
+        for op, filter, values, upsert in self.pending(collection):
+            matches = [doc for doc in docs if all(doc.get(key) == value for key, value in filter.items())]
+            if op == 'delete':
+                docs = [doc for doc in docs if not any(doc is match for match in matches)]
+                continue
+            for doc in matches:
+                apply_set(doc, values)
+            if not matches and upsert:
+                doc = dict(filter)
+                apply_set(doc, values)
+                docs.append(doc)
+        return docs
+
+    def flush(self):
+        '''
+        This writes up to `Config.MONGO_BULK_BATCH_SIZE` pending updates and deletes to MongoDB and removes them from the outbox. Returns the number of flushed rows.
+        Updates of the same document are merged (in order) into a single update, so the unordered bulk write can't apply them out of order. A delete drops the updates
+        of the document that were stored before it, and is written before the updates that were stored after it.
+        If MongoDB can't be reached, the exception is raised and the updates stay in the outbox.
+        '''
+        with self.lock:
+            rows = self.conn.execute('SELECT id, collection, filter, doc, upsert, op FROM outbox ORDER BY id LIMIT ?', (Config.MONGO_BULK_BATCH_SIZE,)).fetchall()
+        if not rows:
+            return 0
+
+        merged = {} # (collection, filter) -> [filter, values, upsert, rows, delete]
+        for row in rows:
+            _, collection, filter, doc, upsert, op = row
+            update = merged.setdefault((collection, filter), [json_util.loads(filter), {}, False, [], False])
+            if op == 'delete':
+                update[1:5] = [{}, False, [], True]
+                continue
+            merge_set(update[1], json_util.loads(doc))
+            update[2] = update[2] or bool(upsert)
+            update[3].append(row[:5])
+
+        deletes = {} # collection -> [DeleteOne]
+        operations = {} # collection -> ([UpdateOne], [rows of every update])
+        for (collection, _), (filter, values, upsert, merged_rows, delete) in merged.items():
+            if delete:
+                deletes.setdefault(collection, []).append(DeleteOne(filter))
+            if merged_rows:
+                collection_operations, collection_rows = operations.setdefault(collection, ([], []))
+                collection_operations.append(UpdateOne(filter, {'$set': values}, upsert=upsert))
+                collection_rows.append(merged_rows)
+
+        ids = [(row[0],) for row in rows]
+        try:
+            # The deletes go first, since the only updates that are left of a deleted document were stored after the delete
+            for collection, collection_deletes in deletes.items():
+                self.db[collection].bulk_write(collection_deletes, ordered=False)
+            for collection, (collection_operations, collection_rows) in operations.items():
+                try:
+                    self.db[collection].bulk_write(collection_operations, ordered=False)
+                except BulkWriteError as bwe:
+                    # Only the rejected updates failed, the others were written
+                    for error in bwe.details.get('writeErrors', []):
+                        self._write_rows_one_by_one(collection, collection_rows[error['index']], error.get('errmsg'))
+        except Exception:
+            with self.lock:
+                self.conn.executemany('UPDATE outbox SET attempts = attempts + 1 WHERE id = ?', ids)
+                self.conn.commit()
+            raise
+
+        with self.lock:
+            self.conn.executemany('DELETE FROM outbox WHERE id = ?', ids)
+            self.conn.commit()
+        self.logger.info(f"Flushed {len(rows)} updates and deletes to MongoDB")
+        return len(rows)
+
+    def _write_rows_one_by_one(self, collection: str, rows: list, errmsg: str):
+        '''This writes the rows of a merged update that MongoDB rejected one by one (in order), so a single bad row doesn't take the other rows of the same document with it. Rows that are rejected on their own are dropped, since retrying them won't help'''
+        if len(rows) == 1:
+            self.logger.error(f"Dropped an update of {collection} that MongoDB rejected: {errmsg}")
+            return
+        for _, _, filter, doc, upsert in rows:
+            try:
+                self.db[collection].update_one(json_util.loads(filter), {'$set': json_util.loads(doc)}, upsert=bool(upsert))
+            except OperationFailure as e:
+                self.logger.error(f"Dropped an update of {collection} that MongoDB rejected: {str(e)}")
+
+    def _run_flusher(self):
+        '''This flushes the outbox in the background. After a failure it waits longer and longer (up to `Config.OUTBOX_MAX_RETRY_DELAY` seconds) before retrying'''
+        while not self.stop_event.wait(self.retry_delay):
+            try:
+                while self.flush() >= Config.MONGO_BULK_BATCH_SIZE:
+                    pass # keep flushing while full batches are waiting
+                self.retry_delay = Config.OUTBOX_FLUSH_INTERVAL
+            except Exception as e:
+                self.retry_delay = min(self.retry_delay * 2, Config.OUTBOX_MAX_RETRY_DELAY)
+                self.logger.warning(f"Failed to flush the outbox to MongoDB, retrying in {self.retry_delay} seconds. Error: {str(e)}")
+
+    def close(self):
+        '''This stops the background flusher and tries to flush the remaining updates. Updates that can't be flushed stay in the outbox for the next run'''
+        self.stop_event.set()
+        self.flusher.join(timeout=5)
+        try:
+            while self.flush():
+                pass
+        except Exception as e:
+            self.logger.warning(f"{self.pending_count()} updates are left in the outbox. Error: {str(e)}")
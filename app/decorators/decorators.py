@@ -1,14 +1,12 @@
 import functools
-import random
-from time import sleep
+from app.bot.pacing import pacer
 
-def rest(func):
-    '''This decorator adds a random sleep time between 1 and 2 seconds after the decorated function is called. This was created to reduce the likelihood of the Retry button appearing on X'''
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        result = func(*args, **kwargs)
-        sleep_time = random.uniform(1, 2.5)
-        print(f'Sleeping for {sleep_time} seconds')
-        sleep(sleep_time)
-        return result
-    return wrapper
\ No newline at end of file
+def paced(action):
+    '''This decorator waits until the shared pacer allows `action` (eg: 'navigate' or 'like') before the decorated function is called. This replaces the fixed sleep after every call: the bot goes as fast as the rate limits in `Config.PACING_RATES` allow and only slows down when X pushes back'''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            pacer.acquire(action)
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -48,6 +48,12 @@ class AutoFollowTab:
         )
         self.stop_auto_follow_button.pack(pady=10)
 
+    def set_browser_ready(self, ready: bool):
+        """
+        Enables the Start Auto Follow button once the browser and the database are started (see app/startup.py), and disables it until then.
+        """
+        self.start_auto_follow_button.config(state=tk.NORMAL if ready else tk.DISABLED)
+
     def create_time_span_input(self):
         """
         Creates and packs the 'Time Span in Minutes' input section.
@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 import threading
+from app.bot.profile_cache import CORE_GROUPS
 
 class BotTargetsTab:
     def __init__(self, frame, logger, bot, process_manager):
@@ -12,8 +13,12 @@ class BotTargetsTab:
         self.add_person_thread = None      # Reference to the add_person thread
 
         self.create_widgets()
-        self.load_following_profiles()
-        self.load_added_profiles()
+        if self.bot.browser and self.bot.browser.db_manager:
+            self.load_profiles()
+        else:
+            # The lists are loaded once the database is started (see app/startup.py)
+            self.following_label.config(text="People you're following: loading...")
+            self.added_people_label.config(text="Added People: loading...")
 
     def create_widgets(self):
         lists_container = ttk.Frame(self.frame)
@@ -150,7 +155,8 @@ class BotTargetsTab:
         After completion, re-enable/disable buttons appropriately.
         """
         try:
-            success = self.bot.get_following()
+            # Show every profile as soon as it is scraped
+            success = self.bot.get_following(on_profile=lambda data: self.frame.after(0, lambda: self.insert_following_list(data)))
             if success:
                 self.logger.info("Get Following process completed successfully.")
             else:
@@ -206,12 +212,14 @@ class BotTargetsTab:
             name = self.bot.browser.check_user_exists(username)
             if name:
                 profile_link = f"https://x.com/{username}"
-                # Scrape profile data
-                profile_data = self.bot.browser.scrape_profile_data(profile_link)
+                # Scrape the core profile data (or use the cached data if it is still fresh). The expensive fields are filled in later by the profile refresher
+                profile_data = self.bot.browser.profile_cache.get_profile(profile_link, CORE_GROUPS)
                 if profile_data and not self.bot.browser.stop_add_process:
                     # Update in MongoDB, code and GUI
                     self.bot.browser.db_manager.save_added_profile(profile_data)
                     self.bot.browser.added_people.append(profile_data)
+                    self.bot.browser.profile_cache.add(profile_data, replace=True)
+                    self.bot.start_enrichment()
                     # Schedule GUI updates on the main thread
                     self.frame.after(0, self.update_added_people_count)
                     self.frame.after(0, lambda: self.insert_added_people_list(profile_data))
@@ -354,6 +362,21 @@ class BotTargetsTab:
             self.delete_button.config(state=tk.NORMAL)
             self.logger.info("Bot is not running, enabling delete button")
 
+    def load_profiles(self):
+        """
+        Populates the Following and Added lists in the GUI.
+        """
+        self.load_following_profiles()
+        self.load_added_profiles()
+
+    def set_browser_ready(self, ready: bool):
+        """
+        Enables the Get Following and Add buttons once the browser and the database are started (see app/startup.py), and disables them until then.
+        """
+        state = tk.NORMAL if ready else tk.DISABLED
+        self.get_following_button.config(state=state)
+        self.add_button.config(state=state)
+
     def load_following_profiles(self):
         """
         Populates the Following list in the GUI with the user's following list.
@@ -361,9 +384,7 @@ class BotTargetsTab:
         try:
             following_list = self.bot.browser.following
             for profile in following_list:
-                reply_status = '✓' if profile['reply'] else ''
-                see_tweet_status = '✓' if not profile['reply'] else ''
-                self.following_list.insert("", "end", values=(profile['name'], see_tweet_status, reply_status), tags=(profile['link'],))
+                self.insert_following_list(profile, update_count=False)
 
             self.following_label.config(text=f"People you're following: {len(following_list)}")
             self.logger.info("Loaded following profiles into the GUI")
@@ -384,6 +405,14 @@ class BotTargetsTab:
         except Exception as e:
             self.logger.error(f"Failed to load added profiles: {e}")
 
+    def insert_following_list(self, profile_data, update_count=True):
+        '''Inserts a profile into the Following list in the GUI and updates the count of people you're following'''
+        reply_status = '✓' if profile_data['reply'] else ''
+        see_tweet_status = '✓' if not profile_data['reply'] else ''
+        self.following_list.insert("", "end", values=(profile_data['name'], see_tweet_status, reply_status), tags=(profile_data['link'],))
+        if update_count:
+            self.following_label.config(text=f"People you're following: {len(self.bot.browser.following)}")
+
     def insert_added_people_list(self, profile_data):
         '''Inserts a profile into the Added People list in the GUI'''
         reply_status = '✓' if profile_data['reply'] else ''
@@ -7,10 +7,12 @@ from app.gui.auto_follow_tab import AutoFollowTab
 from app.gui.process_manager import ProcessManager
 
 class MainWindow:
-    def __init__(self, master, logger, bot):
+    def __init__(self, master, logger, bot, startup=None):
+        '''`startup` is the `Startup` that starts the browser and the database in the background. Without it, they must be started already'''
         self.master = master
         self.logger = logger
         self.bot = bot
+        self.startup = startup
 
         # Initialize ProcessManager
         self.process_manager = ProcessManager()
@@ -53,14 +55,34 @@ class MainWindow:
         notebook.add(auto_follow_frame, text="Auto Follow")
 
         # Initialize tabs with their respective classes and pass ProcessManager
-        SettingsTab(settings_frame, logger, bot, self.process_manager)
-        BotTargetsTab(bot_targets_frame, logger, bot, self.process_manager)
-        AutoFollowTab(auto_follow_frame, logger, bot, self.process_manager)
+        self.settings_tab = SettingsTab(settings_frame, logger, bot, self.process_manager)
+        self.bot_targets_tab = BotTargetsTab(bot_targets_frame, logger, bot, self.process_manager)
+        self.auto_follow_tab = AutoFollowTab(auto_follow_frame, logger, bot, self.process_manager)
 
         self.logger.info("MainWindow initialization complete")
 
-        # After GUI setup, check if the account is locked
-        self.check_account_locked()
+        if startup is None:
+            # After GUI setup, check if the account is locked
+            self.check_account_locked()
+            return
+
+        # The tabs fill in as the background startup stages finish
+        self.set_browser_ready(False)
+        startup.on_ready('database', self.bot_targets_tab.load_profiles)
+        startup.on_ready('database', self.enable_when_ready)
+        startup.on_ready('lock_check', self.check_account_locked)
+        startup.on_ready('lock_check', self.enable_when_ready)
+
+    def set_browser_ready(self, ready: bool):
+        '''This enables or disables the buttons of every tab that need the browser and the database'''
+        for tab in (self.settings_tab, self.bot_targets_tab, self.auto_follow_tab):
+            tab.set_browser_ready(ready)
+
+    def enable_when_ready(self):
+        '''This enables the buttons that need the browser and the database once both are started and the lock check (which drives the browser) is done. They stay disabled if the account is locked'''
+        if self.startup.is_ready('driver', 'database', 'lock_check') and not self.bot.browser.is_account_locked:
+            self.set_browser_ready(True)
+            self.logger.info("The browser and the database are ready")
 
     def check_account_locked(self):
         '''This checks if the account is locked and shows a popup message if it is.'''
@@ -2,7 +2,6 @@ import threading
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 import app.database.sql_manager as sql_manager
-import app.bot.delete_interactions as delete_interactions
 
 class SettingsTab:
     def __init__(self, frame, logger, bot, process_manager):
@@ -75,8 +74,10 @@ class SettingsTab:
         ttk.Button(self.frame, text="Fill Fields", command=self.fill_fields).pack(pady=10)
 
         # Delete All Replies and Likes buttons
-        ttk.Button(self.frame, text="Delete All Replies", command=self.delete_replies).pack(pady=5)
-        ttk.Button(self.frame, text="Delete All Likes", command=self.delete_likes).pack(pady=5)
+        self.delete_replies_button = ttk.Button(self.frame, text="Delete All Replies", command=self.delete_replies)
+        self.delete_replies_button.pack(pady=5)
+        self.delete_likes_button = ttk.Button(self.frame, text="Delete All Likes", command=self.delete_likes)
+        self.delete_likes_button.pack(pady=5)
 
         # Frame for Unfollow section
         unfollow_frame = ttk.Frame(self.frame)
@@ -104,6 +105,13 @@ class SettingsTab:
         self.max_label = ttk.Label(unfollow_frame, text=f"Max: {self.max_following}")
         self.max_label.pack(side=tk.LEFT, padx=(5, 0))
 
+    def set_browser_ready(self, ready: bool):
+        '''This enables the buttons that need the browser and the database once they are started (see app/startup.py), and disables them until then'''
+        state = tk.NORMAL if ready else tk.DISABLED
+        for button in (self.start_button, self.delete_replies_button, self.delete_likes_button, self.unfollow_button):
+            button.config(state=state)
+        self.status_label.config(text="" if ready else "Starting the browser...")
+
     def validate_digits(self, P):
         """
         Validates that `P` contains only digits and is less than or equal to max_following.
@@ -231,10 +239,14 @@ class SettingsTab:
 
     def delete_replies(self):
         if not self.check_account_locked():
+            # Selenium is only imported when it is needed
+            import app.bot.delete_interactions as delete_interactions
             delete_interactions.delete_all_replies(self.bot.browser.driver, self.logger, self.bot.username)
 
     def delete_likes(self):
         if not self.check_account_locked():
+            # Selenium is only imported when it is needed
+            import app.bot.delete_interactions as delete_interactions
             delete_interactions.delete_all_likes(self.bot.browser.driver, self.logger, self.bot.username)
 
     def fill_fields(self):
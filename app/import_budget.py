@@ -0,0 +1,51 @@
+'''
+This measures how long importing the GUI entry point (main.py) takes in a fresh interpreter, using the output of
+`python -X importtime`, and fails if it is over `Config.IMPORT_TIME_BUDGET_MS` or if a heavy dependency that should be
+imported lazily (see `LAZY_MODULES`) is imported at startup. Run it from the root of the repository with:
+python -m app.import_budget
+It exits with status 1 if the budget is exceeded, so it can be used as a check before a release.
+'''
+
+import subprocess
+import sys
+from app.configuration.configuration import Config
+
+# Top level packages that must not be imported before the window is up. They are imported by the startup stages instead
+LAZY_MODULES = ['selenium', 'pymongo', 'bson', 'app.bot.x_controller', 'app.database.mongo_manager']
+
+def measure_imports(module: str = 'main'):
+    '''This imports `module` in a fresh interpreter with `-X importtime` and returns the imports as a list of dicts with name, self_us, cumulative_us and depth (0 for the modules that were imported directly)'''
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        # The lines look like: "import time:       412 |       1083 |   encodings"
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append({'name': name.strip(), 'self_us': int(self_us), 'cumulative_us': int(cumulative_us), 'depth': depth})
+    return imports
+
+def check_budget(budget_ms: float = Config.IMPORT_TIME_BUDGET_MS, module: str = 'main'):
+    '''This prints the import time of `module`, its slowest imports and the lazy modules that were imported. Returns True if the import is within the budget and no lazy module was imported'''
+    imports = measure_imports(module)
+    total_ms = sum(item['self_us'] for item in imports) / 1000
+    print(f"Importing {module} took {total_ms:.1f} ms (budget: {budget_ms} ms)")
+
+    print("Slowest imports (own time, cumulative time):")
+    for item in sorted(imports, key=lambda item: item['self_us'], reverse=True)[:10]:
+        print(f"  {item['self_us'] / 1000:8.1f} ms {item['cumulative_us'] / 1000:8.1f} ms  {item['name']}")
+
+    eager = sorted({item['name'] for item in imports if any(item['name'] == lazy or item['name'].startswith(lazy + '.') for lazy in LAZY_MODULES)})
+    if eager:
+        print(f"Imported at startup, but should be imported lazily: {', '.join(eager)}")
+
+    within_budget = total_ms <= budget_ms and not eager
+    print("OK" if within_budget else "FAILED")
+    return within_budget
+
+if __name__ == "__main__":
+    sys.exit(0 if check_budget() else 1)
@@ -11,6 +11,9 @@ def logger(logger_name, logger_level=INFO):
     '''This sets up a logger and returns it'''
     logger = getLogger(logger_name)
     logger.setLevel(logger_level)
+    if logger.handlers:
+        # The logger was set up before (getLogger returns the same logger for the same name), so adding handlers again would open another file and print every line twice
+        return logger
     
     date_format = "%m.%d.%y %H:%M:%S"
     formatter = Formatter('%(name)s.py %(funcName)s() %(levelname)s: %(message)s %(asctime)s', datefmt=date_format)
@@ -0,0 +1,112 @@
+'''
+This starts the app in stages so the window comes up right away. Importing the controller stack (Selenium and pymongo),
+launching Chrome, connecting to MongoDB (and loading the bot targets) and the account lock check run in background
+threads: the driver and the database in parallel once the controller is imported, and the lock check as soon as the
+driver is ready (it needs the browser). The GUI registers callbacks with `on_ready`, which run in
+the Tk thread when their stage is done, so every tab fills in as soon as what it needs is ready. When all the stages are
+done, a timing report is logged.
+'''
+
+import threading
+import time
+from tkinter import messagebox
+from app.logger.logger import logger
+
+class Startup:
+    # stage: the stage it has to wait for
+    STAGES = {
+        'browser': None,
+        'driver': 'browser',
+        'database': 'browser',
+        'lock_check': 'driver',
+    }
+
+    def __init__(self, root, bot):
+        '''`bot` is an XBot that was created with start=False (so it has no browser yet). `root` is the Tk root that runs the callbacks'''
+        self.root = root
+        self.bot = bot
+        self.started_at = time.perf_counter()
+        self.timings = {} # stage: (seconds after the start when it started, seconds after the start when it was done)
+        self.done = {stage: threading.Event() for stage in self.STAGES}
+        self.failed = set()
+        self.callbacks = {stage: [] for stage in self.STAGES}
+        self.stage_functions = {
+            'browser': lambda: bot.create_browser(start=False),
+            'driver': lambda: bot.browser.start_driver(),
+            'database': lambda: bot.browser.start_database(),
+            'lock_check': lambda: bot.browser.check_account_lock(),
+        }
+        self.lock = threading.Lock()
+        self.logger = logger(__name__)
+
+    def elapsed(self):
+        '''This returns the seconds since the start of the app'''
+        return time.perf_counter() - self.started_at
+
+    def record(self, name: str, started: float = 0):
+        '''This records the timing of a step that isn't a background stage (eg: building the window)'''
+        with self.lock:
+            self.timings[name] = (started, self.elapsed())
+
+    def on_ready(self, stage: str, callback):
+        '''This runs `callback()` in the Tk thread once `stage` is done (right away if it is done already). It isn't run if the stage failed'''
+        with self.lock:
+            if not self.done[stage].is_set():
+                self.callbacks[stage].append(callback)
+                return
+        if stage not in self.failed:
+            self.root.after(0, callback)
+
+    def is_ready(self, *stages):
+        '''This checks if all the `stages` are done and didn't fail'''
+        return all(self.done[stage].is_set() and stage not in self.failed for stage in stages)
+
+    def start(self):
+        '''This starts the background stages and returns right away'''
+        self.record('window')
+        for stage in self.STAGES:
+            threading.Thread(target=self._run_stage, args=(stage,), daemon=True).start()
+
+    def _run_stage(self, stage: str):
+        '''This waits for the stage that `stage` depends on, runs it and then the callbacks that wait for it'''
+        dependency = self.STAGES[stage]
+        if dependency:
+            self.done[dependency].wait()
+            if dependency in self.failed:
+                self.logger.warning(f"Skipped the {stage} startup stage because the {dependency} stage failed")
+                self._finish(stage, failed=True)
+                return
+
+        started = self.elapsed()
+        failed = False
+        try:
+            self.stage_functions[stage]()
+            self.logger.info(f"The {stage} startup stage took {self.elapsed() - started:.2f} seconds")
+        except Exception as e:
+            failed = True
+            self.logger.exception(f"The {stage} startup stage failed. Error: {str(e)}")
+            message = f"The app couldn't start ({stage}): {str(e)}"
+            self.root.after(0, lambda: messagebox.showerror("Startup Error", message))
+        self.record(stage, started)
+        self._finish(stage, failed)
+
+    def _finish(self, stage: str, failed: bool):
+        '''This marks `stage` as done, schedules its callbacks and logs the report after the last stage'''
+        with self.lock:
+            if failed:
+                self.failed.add(stage)
+            self.done[stage].set()
+            callbacks, self.callbacks[stage] = self.callbacks[stage], []
+            finished = all(event.is_set() for event in self.done.values())
+        if not failed:
+            for callback in callbacks:
+                self.root.after(0, callback)
+        if finished:
+            self.logger.info(f"Startup report: {self.get_report()}")
+
+    def get_report(self):
+        '''This returns the seconds after the start of the app when every step started and was done'''
+        with self.lock:
+            report = {name: {'start': round(started, 2), 'done': round(done, 2)} for name, (started, done) in sorted(self.timings.items(), key=lambda item: item[1][1])}
+        report['failed'] = sorted(self.failed)
+        return report
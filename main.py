@@ -2,18 +2,29 @@ from app.bot.x_bot import XBot
 import tkinter as tk
 import app.gui.main_window as main_window
 import app.logger.logger as logger
+from app.startup import Startup
 
 def main():
     root = tk.Tk()
 
     _logger = logger.logger("MainApp")
 
-    bot = XBot()
+    # The browser and the database are started in the background, after the window is up
+    bot = XBot(start=False)
+    startup = Startup(root, bot)
 
     # Initialize the main window with bot and logger
-    app = main_window.MainWindow(root, _logger, bot)
+    app = main_window.MainWindow(root, _logger, bot, startup)
+    startup.start()
     root.mainloop()
 
+    # Close the worker Chrome sessions (and their chromedrivers), which would keep running otherwise
+    bot.close_sessions()
+
+    # Flush the writes that are still in the outbox
+    if bot.browser and bot.browser.db_manager:
+        bot.browser.db_manager.close()
+
 if __name__ == "__main__":
     main()
 
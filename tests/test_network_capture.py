@@ -0,0 +1,89 @@
+'''
+These test the GraphQL parsers of app/bot/network_capture.py against the recorded responses in fixtures/graphql
+(saved in the format of NETWORK_CAPTURE_RECORD_DIR) and the bounded caches of NetworkCapture.
+'''
+
+import os
+from datetime import datetime, timezone
+import pytest
+from app.bot.network_capture import NetworkCapture, load_recorded_responses, parse_tweets, parse_users
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'graphql')
+
+@pytest.fixture(autouse=True)
+def log_in_tmp_path(tmp_path, monkeypatch):
+    '''This runs every test in a temporary directory, so the log file isn't written to the repository'''
+    monkeypatch.chdir(tmp_path)
+
+def get_payload(endpoint: str):
+    '''This returns the payload of the recorded response of `endpoint`'''
+    for response in load_recorded_responses(FIXTURES_DIR):
+        if f'/{endpoint}?' in response['url']:
+            return response['payload']
+    raise LookupError(f"There is no recorded {endpoint} response")
+
+def test_parse_user_by_screen_name():
+    users = parse_users(get_payload('UserByScreenName'))
+    assert users == [{
+        'user_id': '11',
+        'username': 'alice',
+        'name': 'Alice A',
+        'link': 'https://x.com/alice',
+        'following_count': '1,234',
+        'followers_count': '56,789',
+        'bio': 'Hello there',
+        'location': 'Paris',
+        'website': 'https://alice.example',
+    }]
+
+def test_parse_timeline_users():
+    users = {user['username']: user for user in parse_users(get_payload('Following'))}
+    # The unavailable user has no profile and is skipped
+    assert sorted(users) == ['alice', 'bob', 'carol']
+    assert users['bob']['followers_count'] == '1,000,000'
+    # carol only has the legacy fields
+    assert users['carol']['name'] == 'Carol C'
+    assert users['carol']['link'] == 'https://x.com/carol'
+    assert users['carol']['following_count'] == '10'
+
+def test_parse_timeline_tweets():
+    tweets = {tweet['tweet_id']: tweet for tweet in parse_tweets(get_payload('UserTweets'))}
+    assert tweets['1600000000000000000']['is_pinned']
+    assert tweets['1800000000000000001']['is_retweet']
+    assert tweets['1900000000000000000']['is_promoted']
+    assert tweets['1900000000000000000']['username'] == 'brand'
+
+    newest = tweets['1800000000000000002']
+    assert newest['username'] == 'alice'
+    assert newest['text'] == 'Newest tweet'
+    assert newest['tweet_link'] == 'https://x.com/alice/status/1800000000000000002'
+    assert newest['created_at'] == datetime(2024, 6, 3, 10, 0, tzinfo=timezone.utc)
+    assert not (newest['is_pinned'] or newest['is_promoted'] or newest['is_retweet'])
+
+    # Tweets with visibility results are wrapped in a 'tweet' key
+    assert tweets['1700000000000000005']['username'] == 'alice'
+
+def test_latest_tweet_skips_pinned_promoted_and_retweets():
+    capture = NetworkCapture(None)
+    for response in load_recorded_responses(FIXTURES_DIR):
+        capture.add_response(response['url'], response['payload'])
+    assert capture.users['https://x.com/alice']['followers_count'] == '56,789'
+    assert capture.latest_tweet('Alice')['tweet_id'] == '1800000000000000002'
+    assert capture.latest_tweet('nobody') is None
+
+def test_caches_drop_the_least_recently_captured():
+    capture = NetworkCapture(None, max_users=2, max_tweets=2)
+    capture.add_response('https://x.com/i/api/graphql/x/Following', get_payload('Following'))
+    assert list(capture.users) == ['https://x.com/bob', 'https://x.com/carol']
+
+    capture.add_response('https://x.com/i/api/graphql/x/UserTweets', get_payload('UserTweets'))
+    assert len(capture.tweets) == 2
+    # The author index only has the tweets that are still kept
+    kept = {tweet_id for tweets in capture.tweets_by_author.values() for tweet_id in tweets}
+    assert kept == set(capture.tweets)
+
+def test_take_new_tweets():
+    capture = NetworkCapture(None)
+    capture.add_response('https://x.com/i/api/graphql/x/UserTweets', get_payload('UserTweets'))
+    assert len(capture.take_new_tweets()) == len(capture.tweets)
+    assert capture.take_new_tweets() == []
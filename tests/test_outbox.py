@@ -0,0 +1,88 @@
+'''
+These test how app/database/outbox.py merges the pending writes: merge_set, apply_pending, and flush against a fake
+MongoDB database that records the bulk writes.
+'''
+
+import pytest
+from pymongo import DeleteOne, UpdateOne
+from app.configuration.configuration import Config
+from app.database.outbox import MongoOutbox, merge_set
+
+class FakeCollection:
+    def __init__(self):
+        self.bulk_writes = [] # the operations of every bulk_write call
+
+    def bulk_write(self, operations, ordered=True):
+        self.bulk_writes.append(list(operations))
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    '''This returns an outbox in a temporary directory whose background flusher doesn't run during the test'''
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Config, 'OUTBOX_FLUSH_INTERVAL', 3600)
+    outbox = MongoOutbox(FakeDatabase(), str(tmp_path / 'outbox.db'))
+    yield outbox
+    outbox.stop_event.set()
+    outbox.flusher.join()
+
+def test_merge_set_folds_a_dotted_key_into_its_parent():
+    values = {'scraped_at': {'core': 1}}
+    merge_set(values, {'scraped_at.counts': 2})
+    assert values == {'scraped_at': {'core': 1, 'counts': 2}}
+
+def test_merge_set_parent_replaces_dotted_keys():
+    values = {'scraped_at.counts': 1, 'name': 'a'}
+    merge_set(values, {'scraped_at': {'core': 2}})
+    assert values == {'name': 'a', 'scraped_at': {'core': 2}}
+
+def test_merge_set_later_value_wins():
+    values = {'reply': True}
+    merge_set(values, {'reply': False, 'scraped_at.counts': 3})
+    assert values == {'reply': False, 'scraped_at.counts': 3}
+
+def test_apply_pending(outbox):
+    outbox.enqueue('following', {'link': 'a'}, {'scraped_at.counts': 1}, upsert=False)
+    outbox.enqueue('following', {'link': 'b'}, {'name': 'B'})
+    outbox.enqueue('following', {'link': 'c'}, {'name': 'C'}, upsert=False)
+    docs = outbox.apply_pending('following', [{'link': 'a', 'scraped_at': {'core': 0}}])
+    # c isn't in MongoDB and isn't upserted
+    assert docs == [{'link': 'a', 'scraped_at': {'core': 0, 'counts': 1}}, {'link': 'b', 'name': 'B'}]
+
+def test_apply_pending_delete(outbox):
+    outbox.enqueue('added', {'link': 'a'}, {'name': 'A'})
+    outbox.enqueue_delete('added', {'link': 'a'})
+    outbox.enqueue_delete('added', {'link': 'b'})
+    outbox.enqueue('added', {'link': 'b'}, {'name': 'B'})
+    docs = outbox.apply_pending('added', [{'link': 'a'}, {'link': 'b', 'reply': True}])
+    assert docs == [{'link': 'b', 'name': 'B'}]
+
+def test_flush_merges_the_updates_of_a_document(outbox):
+    outbox.enqueue('following', {'link': 'a'}, {'scraped_at': {'core': 1}})
+    outbox.enqueue('following', {'link': 'a'}, {'scraped_at.counts': 2}, upsert=False)
+    outbox.enqueue('following', {'link': 'b'}, {'reply': True}, upsert=False)
+    assert outbox.flush() == 3
+    assert outbox.db['following'].bulk_writes == [[
+        UpdateOne({'link': 'a'}, {'$set': {'scraped_at': {'core': 1, 'counts': 2}}}, upsert=True),
+        UpdateOne({'link': 'b'}, {'$set': {'reply': True}}, upsert=False),
+    ]]
+    assert outbox.pending_count() == 0
+
+def test_flush_drops_the_updates_before_a_delete(outbox):
+    outbox.enqueue('added', {'link': 'a'}, {'name': 'A'})
+    outbox.enqueue_delete('added', {'link': 'a'})
+    assert outbox.flush() == 2
+    assert outbox.db['added'].bulk_writes == [[DeleteOne({'link': 'a'})]]
+
+def test_flush_writes_a_delete_before_the_later_updates(outbox):
+    outbox.enqueue_delete('added', {'link': 'a'})
+    outbox.enqueue('added', {'link': 'a'}, {'name': 'A'})
+    outbox.flush()
+    assert outbox.db['added'].bulk_writes == [
+        [DeleteOne({'link': 'a'})],
+        [UpdateOne({'link': 'a'}, {'$set': {'name': 'A'}}, upsert=True)],
+    ]